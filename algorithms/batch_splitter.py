@@ -0,0 +1,398 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: batch_splitter.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from typing import List, Dict, Any, Optional, Sequence, Union
+
+import numpy as np
+
+from algorithms.cost_splitter import VacancyStrategy
+from models.establishment import SaaSBilledTo
+
+
+def _mode_str(mode) -> str:
+    # Same normalisation as CostCalculator.calculate (Enum or plain string)
+    return mode.value if hasattr(mode, 'value') else str(mode)
+
+
+def _to_cents_array(amounts: np.ndarray) -> np.ndarray:
+    # Vectorized utils.money.to_cents: both round(amount * 100) half-to-even
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _group_sum_int(index: np.ndarray, values: np.ndarray, size: int) -> np.ndarray:
+    # Exact int64 group sum (np.bincount would go through float64 weights)
+    out = np.zeros(size, dtype=np.int64)
+    np.add.at(out, index, values)
+    return out
+
+
+def _equal_shares(totals: np.ndarray, counts: np.ndarray, ranks: np.ndarray, group: np.ndarray) -> np.ndarray:
+    """
+    Vectorized largest-remainder split of `totals[g]` in `counts[g]` equal parts:
+    every member gets totals // counts, members whose rank is below the remainder get one more cent.
+    """
+    safe_counts = np.where(counts > 0, counts, 1)
+    base, remainder = np.divmod(totals, safe_counts)
+    return base[group] + (ranks < remainder[group])
+
+
+class BatchCostCalculator:
+    """
+    Portfolio-wide, vectorized version of CostCalculator.
+
+    Instead of one establishment at a time, it takes columnar arrays describing
+    every establishment and every room of a portfolio and computes all the
+    room shares in a handful of NumPy passes (bincount / gather).
+
+    The arithmetic mirrors CostCalculator operation by operation, so for the same
+    inputs `to_results()` returns the same dictionaries as `CostCalculator.calculate()`.
+
+    Establishment-level arrays (aligned, one entry per establishment):
+        establishment_ids, financial_modes, invoice_totals, syndic_costs, wifi_costs, saas_fees
+    Room-level arrays (aligned, one entry per room):
+        room_ids, room_establishment_ids, room_prices, room_vacant
+    """
+
+    def __init__(self,
+                 establishment_ids: Sequence[int],
+                 financial_modes: Sequence[Any],
+                 invoice_totals: Sequence[float],
+                 syndic_costs: Sequence[float],
+                 wifi_costs: Sequence[float],
+                 saas_fees: Sequence[float],
+                 room_ids: Sequence[int],
+                 room_establishment_ids: Sequence[int],
+                 room_prices: Sequence[float],
+                 room_vacant: Sequence[bool],
+                 vacancy_strategy: Union[VacancyStrategy, Sequence[VacancyStrategy]] = VacancyStrategy.REDISTRIBUTE,
+                 invoice_totals_cents: Optional[Sequence[int]] = None):
+        """
+        :param financial_modes: 'Egal' / 'Inegal' strings or FinancialMode values.
+        :param vacancy_strategy: A single strategy for the whole portfolio, or one per establishment.
+        :param invoice_totals_cents: Exact invoice sums in cents (sum of the rounded invoices).
+                                     Defaults to the rounded `invoice_totals`.
+        """
+        self.establishment_ids = np.asarray(establishment_ids, dtype=np.int64)
+        self.invoice_totals = np.asarray(invoice_totals, dtype=np.float64)
+        if invoice_totals_cents is None:
+            self.invoice_totals_cents = _to_cents_array(self.invoice_totals)
+        else:
+            self.invoice_totals_cents = np.asarray(invoice_totals_cents, dtype=np.int64)
+        self.syndic_costs = np.asarray(syndic_costs, dtype=np.float64)
+        self.wifi_costs = np.asarray(wifi_costs, dtype=np.float64)
+        self.saas_fees = np.asarray(saas_fees, dtype=np.float64)
+
+        self.room_ids = np.asarray(room_ids, dtype=np.int64)
+        self.room_establishment_ids = np.asarray(room_establishment_ids, dtype=np.int64)
+        self.room_prices = np.asarray(room_prices, dtype=np.float64)
+        self.room_vacant = np.asarray(room_vacant, dtype=bool)
+
+        n_est = len(self.establishment_ids)
+        self.is_equal_mode = np.fromiter((_mode_str(m) == 'Egal' for m in financial_modes), dtype=bool, count=n_est)
+
+        if isinstance(vacancy_strategy, VacancyStrategy):
+            self.strategies = [vacancy_strategy] * n_est
+        else:
+            self.strategies = list(vacancy_strategy)
+        self.owner_pays = np.fromiter((s == VacancyStrategy.OWNER_PAYS for s in self.strategies), dtype=bool, count=n_est)
+
+        # Map each room to the row of its establishment
+        order = np.argsort(self.establishment_ids, kind='stable')
+        positions = np.searchsorted(self.establishment_ids[order], self.room_establishment_ids)
+        positions = np.clip(positions, 0, max(n_est - 1, 0))
+        if n_est == 0 or not np.array_equal(self.establishment_ids[order][positions], self.room_establishment_ids):
+            if len(self.room_ids):
+                raise ValueError("Some rooms reference an unknown establishment")
+        self.room_est_index = order[positions] if n_est else np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_models(cls, establishments: List[Any], invoices: List[Any],
+                    vacancy_strategy: Union[VacancyStrategy, Sequence[VacancyStrategy]] = VacancyStrategy.REDISTRIBUTE) -> 'BatchCostCalculator':
+        """
+        Builds the columnar input from ORM objects (or duck-typed equivalents).
+        Rooms are read from `establishment.rooms`, invoices are matched through `invoice.establishment_id`.
+        """
+        est_ids, modes, syndic, wifi, saas = [], [], [], [], []
+        room_ids, room_est, prices, vacant = [], [], [], []
+
+        for est in establishments:
+            est_ids.append(est.id)
+            modes.append(getattr(est, 'config_financial_mode', 'Egal'))
+            syndic.append(est.syndic_cost or 0.0)
+            wifi.append(est.wifi_cost or 0.0)
+            fee = 0.0
+            if est.saas_billed_to == SaaSBilledTo.TENANTS and est.subscription_plan:
+                fee = est.subscription_plan.price_monthly or 0.0
+            saas.append(fee)
+
+            for room in est.rooms:
+                room_ids.append(room.id)
+                room_est.append(est.id)
+                prices.append(room.base_price)
+                vacant.append(bool(room.is_vacant))
+
+        est_ids_arr = np.asarray(est_ids, dtype=np.int64)
+        invoice_totals = np.zeros(len(est_ids_arr), dtype=np.float64)
+        invoice_totals_cents = np.zeros(len(est_ids_arr), dtype=np.int64)
+        if invoices and len(est_ids_arr):
+            inv_est = np.fromiter((inv.establishment_id for inv in invoices), dtype=np.int64, count=len(invoices))
+            inv_amount = np.fromiter((inv.amount for inv in invoices), dtype=np.float64, count=len(invoices))
+            order = np.argsort(est_ids_arr, kind='stable')
+            pos = np.clip(np.searchsorted(est_ids_arr[order], inv_est), 0, len(est_ids_arr) - 1)
+            known = est_ids_arr[order][pos] == inv_est
+            invoice_totals = np.bincount(order[pos[known]], weights=inv_amount[known], minlength=len(est_ids_arr))
+            invoice_totals_cents = _group_sum_int(order[pos[known]], _to_cents_array(inv_amount[known]), len(est_ids_arr))
+
+        return cls(est_ids, modes, invoice_totals, syndic, wifi, saas,
+                   room_ids, room_est, prices, vacant, vacancy_strategy=vacancy_strategy,
+                   invoice_totals_cents=invoice_totals_cents)
+
+    def calculate(self) -> Dict[str, np.ndarray]:
+        """
+        Computes every room share of every establishment.
+
+        :return: A dictionary of NumPy arrays:
+                 - establishment level: "occupied", "total_rooms", "total_rent", "grand_total",
+                   "per_person_share", "variable_share", "fixed_charges_share", "owner_absorbed"
+                 - room level: "room_rent", "room_charges", "room_total", "billed"
+                   (`billed` is False for vacant rooms and rooms of empty establishments)
+        """
+        n_est = len(self.establishment_ids)
+        idx = self.room_est_index
+        occupied_flags = ~self.room_vacant
+
+        total_rooms = np.bincount(idx, minlength=n_est).astype(np.int64)
+        occupied = np.bincount(idx, weights=occupied_flags.astype(np.float64), minlength=n_est).astype(np.int64)
+        total_rent = np.bincount(idx, weights=self.room_prices, minlength=n_est)
+
+        has_tenants = occupied > 0
+        occ_f = np.where(has_tenants, occupied, 1).astype(np.float64)
+        total_f = np.where(total_rooms > 0, total_rooms, 1).astype(np.float64)
+
+        inv = self.invoice_totals
+        # Egal: same operation order as _calculate_equal_split
+        grand_total = total_rent + inv + self.syndic_costs + self.wifi_costs + self.saas_fees
+        per_person_share = grand_total / occ_f
+        equal_rent_share = total_rent / occ_f
+        equal_charges_share = (inv + self.syndic_costs + self.wifi_costs + self.saas_fees) / occ_f
+
+        # Inegal: same operation order as _calculate_per_room
+        fixed_charges_share = (self.syndic_costs + self.wifi_costs + self.saas_fees) / occ_f
+        share_per_unit = inv / total_f
+        variable_share = np.where(self.owner_pays, share_per_unit, inv / occ_f)
+        owner_absorbed = np.where(self.owner_pays, share_per_unit * (total_rooms - occupied), 0.0)
+
+        equal_room = self.is_equal_mode[idx]
+        room_rent = np.where(equal_room, equal_rent_share[idx], self.room_prices)
+        room_charges = np.where(equal_room, equal_charges_share[idx], fixed_charges_share[idx] + variable_share[idx])
+        room_total = np.where(equal_room, per_person_share[idx], self.room_prices + room_charges)
+        billed = occupied_flags & has_tenants[idx]
+
+        return {
+            "occupied": occupied,
+            "total_rooms": total_rooms,
+            "total_rent": total_rent,
+            "grand_total": grand_total,
+            "per_person_share": per_person_share,
+            "fixed_charges_share": fixed_charges_share,
+            "variable_share": variable_share,
+            "owner_absorbed": owner_absorbed,
+            "room_rent": room_rent,
+            "room_charges": room_charges,
+            "room_total": room_total,
+            "billed": billed,
+        }
+
+    def to_results(self, arrays: Optional[Dict[str, np.ndarray]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Expands the arrays into the per-establishment dictionaries returned by CostCalculator.calculate().
+
+        :return: { establishment_id: calculation_result }
+        """
+        if arrays is None:
+            arrays = self.calculate()
+
+        rooms_by_est: Dict[int, List[int]] = {}
+        for pos in np.flatnonzero(arrays["billed"]).tolist():
+            rooms_by_est.setdefault(int(self.room_est_index[pos]), []).append(pos)
+
+        results = {}
+        for i, est_id in enumerate(self.establishment_ids.tolist()):
+            occupied = int(arrays["occupied"][i])
+            if occupied == 0:
+                results[est_id] = {
+                    "error": "No occupied rooms or no rooms available.",
+                    "breakdown_per_room": {}
+                }
+                continue
+
+            room_positions = rooms_by_est.get(i, [])
+            syndic = float(self.syndic_costs[i])
+            wifi = float(self.wifi_costs[i])
+            saas_fee = float(self.saas_fees[i])
+            total_invoices = float(self.invoice_totals[i])
+
+            if self.is_equal_mode[i]:
+                breakdown = {
+                    int(self.room_ids[p]): {
+                        "rent": float(arrays["room_rent"][p]),
+                        "charges": float(arrays["room_charges"][p]),
+                        "total": float(arrays["room_total"][p])
+                    }
+                    for p in room_positions
+                }
+                results[est_id] = {
+                    "mode": "Egal",
+                    "total_global_cost": float(arrays["grand_total"][i]),
+                    "per_person_share": float(arrays["per_person_share"][i]),
+                    "breakdown_per_room": breakdown,
+                    "details": {
+                        "comment": "Total cost (Rent + Charges + SaaS if applicable) divided equally among present tenants.",
+                        "total_rent": float(arrays["total_rent"][i]),
+                        "total_invoices": total_invoices,
+                        "syndic": syndic,
+                        "wifi": wifi,
+                        "saas_fee": saas_fee
+                    }
+                }
+            else:
+                strategy = self.strategies[i]
+                breakdown = {
+                    int(self.room_ids[p]): {
+                        "rent": float(arrays["room_rent"][p]),
+                        "charges": float(arrays["room_charges"][p]),
+                        "charges_breakdown": {
+                            "syndic_wifi": float(arrays["fixed_charges_share"][i]),
+                            "variable_invoices": float(arrays["variable_share"][i])
+                        },
+                        "total": float(arrays["room_total"][p])
+                    }
+                    for p in room_positions
+                }
+                results[est_id] = {
+                    "mode": "Inegal (Par Chambre)",
+                    "vacancy_strategy": strategy.value,
+                    "breakdown_per_room": breakdown,
+                    "details": {
+                        "comment": f"Rent is specific. Syndic/Wifi divided by {occupied}. Variable costs split using {strategy.value}.",
+                        "total_invoices": total_invoices,
+                        "owner_absorbed_vacancy_costs": float(arrays["owner_absorbed"][i])
+                    }
+                }
+
+        return results
+
+    def calculate_cents(self) -> Dict[str, np.ndarray]:
+        """
+        Exact integer-cents version of `calculate()`, running on int64 arrays.
+
+        Remainder cents are handed out with the largest-remainder rule, lowest room id first, exactly like
+        CostCalculator.calculate_cents(). For every establishment:
+        sum(room_total over billed rooms) + owner_absorbed == grand_total.
+
+        :return: A dictionary of int64 arrays: "occupied", "total_rooms", "grand_total", "owner_absorbed",
+                 "room_rent", "room_charges", "room_total" and the boolean "billed" mask.
+        """
+        n_est = len(self.establishment_ids)
+        n_rooms = len(self.room_ids)
+        idx = self.room_est_index
+
+        rent_c = _to_cents_array(self.room_prices)
+        fixed_c = _to_cents_array(self.syndic_costs) + _to_cents_array(self.wifi_costs) + _to_cents_array(self.saas_fees)
+        inv_c = self.invoice_totals_cents
+        occupied_flags = ~self.room_vacant
+
+        total_rooms = np.bincount(idx, minlength=n_est).astype(np.int64)
+        occupied = np.bincount(idx, weights=occupied_flags.astype(np.float64), minlength=n_est).astype(np.int64)
+
+        # Rank of each room inside its establishment (by room id), among all rooms and among occupied rooms
+        order = np.lexsort((self.room_ids, idx))
+        sorted_idx = idx[order]
+        sorted_occ = occupied_flags[order].astype(np.int64)
+        room_start = np.cumsum(total_rooms) - total_rooms
+        occ_start = np.cumsum(occupied) - occupied
+        rank_all = np.empty(n_rooms, dtype=np.int64)
+        rank_occ = np.empty(n_rooms, dtype=np.int64)
+        rank_all[order] = np.arange(n_rooms, dtype=np.int64) - room_start[sorted_idx]
+        rank_occ[order] = (np.cumsum(sorted_occ) - sorted_occ) - occ_start[sorted_idx]
+
+        equal_room = self.is_equal_mode[idx]
+        owner_pays_room = self.owner_pays[idx]
+
+        # Egal: pooled rent and pooled charges, each split equally among present tenants
+        rent_total_c = _group_sum_int(idx, rent_c, n_est)
+        equal_rent = _equal_shares(rent_total_c, occupied, rank_occ, idx)
+        equal_charges = _equal_shares(inv_c + fixed_c, occupied, rank_occ, idx)
+
+        # Inegal: own rent, fixed charges per present tenant, invoices per tenant or per room unit
+        fixed_share = _equal_shares(fixed_c, occupied, rank_occ, idx)
+        variable_share = np.where(owner_pays_room,
+                                  _equal_shares(inv_c, total_rooms, rank_all, idx),
+                                  _equal_shares(inv_c, occupied, rank_occ, idx))
+
+        billed = occupied_flags & (occupied[idx] > 0)
+        room_rent = np.where(equal_room, equal_rent, rent_c)
+        room_charges = np.where(equal_room, equal_charges, fixed_share + variable_share)
+        room_rent = np.where(billed, room_rent, 0)
+        room_charges = np.where(billed, room_charges, 0)
+        room_total = room_rent + room_charges
+
+        occupied_rent_c = _group_sum_int(idx, np.where(billed, rent_c, 0), n_est)
+        grand_total = np.where(self.is_equal_mode, rent_total_c, occupied_rent_c) + inv_c + fixed_c
+        grand_total = np.where(occupied > 0, grand_total, 0)
+        owner_absorbed = grand_total - _group_sum_int(idx, room_total, n_est)
+
+        return {
+            "occupied": occupied,
+            "total_rooms": total_rooms,
+            "grand_total": grand_total,
+            "owner_absorbed": owner_absorbed,
+            "room_rent": room_rent,
+            "room_charges": room_charges,
+            "room_total": room_total,
+            "billed": billed,
+        }
+
+    def to_cents_results(self, arrays: Optional[Dict[str, np.ndarray]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Expands `calculate_cents()` arrays into the dictionaries returned by CostCalculator.calculate_cents().
+
+        :return: { establishment_id: calculation_result }
+        """
+        if arrays is None:
+            arrays = self.calculate_cents()
+
+        rooms_by_est: Dict[int, List[int]] = {}
+        for pos in np.flatnonzero(arrays["billed"]).tolist():
+            rooms_by_est.setdefault(int(self.room_est_index[pos]), []).append(pos)
+
+        results = {}
+        for i, est_id in enumerate(self.establishment_ids.tolist()):
+            if int(arrays["occupied"][i]) == 0:
+                results[est_id] = {
+                    "error": "No occupied rooms or no rooms available.",
+                    "breakdown_per_room": {}
+                }
+                continue
+
+            if self.is_equal_mode[i]:
+                result = {"mode": "Egal"}
+            else:
+                result = {"mode": "Inegal (Par Chambre)", "vacancy_strategy": self.strategies[i].value}
+            result["grand_total"] = int(arrays["grand_total"][i])
+            result["owner_absorbed"] = int(arrays["owner_absorbed"][i])
+            result["breakdown_per_room"] = {
+                int(self.room_ids[p]): {
+                    "rent": int(arrays["room_rent"][p]),
+                    "charges": int(arrays["room_charges"][p]),
+                    "total": int(arrays["room_total"][p])
+                }
+                for p in sorted(rooms_by_est.get(i, []), key=lambda p: self.room_ids[p])
+            }
+            results[est_id] = result
+
+        return results
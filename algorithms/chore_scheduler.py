@@ -0,0 +1,89 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: chore_scheduler.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+Period = Tuple[date, Optional[date]]
+
+class FairChoreScheduler:
+    """
+    Assigns chore occurrences to tenants, balancing the accumulated chore weight.
+
+    Tenants sit in a min-heap keyed on (accumulated weight, last assignment order, user id):
+    each occurrence goes to the least loaded tenant who is active on its due date,
+    ties going to whoever has waited the longest. Tenants who are not active on that date
+    (lease not started yet / already ended) are skipped and stay in the heap.
+    """
+
+    def __init__(self, tenant_periods: Dict[int, List[Period]], initial_load: Optional[Dict[int, float]] = None,
+                 last_assigned: Optional[Iterable[int]] = None):
+        """
+        :param tenant_periods: {user_id: [(lease start, lease end or None), ...]}
+        :param initial_load: Weight already carried by each tenant (history). Tenants without
+                             history start at the lowest known load, not at 0, so a newcomer
+                             is not handed every chore until catching up.
+        :param last_assigned: User ids in the order of their past assignments (oldest first).
+        """
+        self.tenant_periods = tenant_periods
+        initial_load = initial_load or {}
+        known = [initial_load[u] for u in tenant_periods if u in initial_load]
+        floor = min(known) if known else 0
+
+        self._order = 0
+        last_seen = {}
+        for user_id in last_assigned or []:
+            self._order += 1
+            last_seen[user_id] = self._order
+
+        self.load = {u: initial_load.get(u, floor) for u in tenant_periods}
+        self._heap = [(self.load[u], last_seen.get(u, 0), u) for u in sorted(tenant_periods)]
+        heapq.heapify(self._heap)
+
+    def is_active(self, user_id: int, day: date) -> bool:
+        return covers(self.tenant_periods[user_id], day)
+
+    def assign(self, due_date: datetime, weight: float = 1) -> Optional[int]:
+        """
+        Picks the tenant for one occurrence and adds `weight` to their load.
+        :return: The user id, or None if nobody is active on that date.
+        """
+        day = due_date.date() if isinstance(due_date, datetime) else due_date
+        skipped = []
+        chosen = None
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if self.is_active(entry[2], day):
+                chosen = entry[2]
+                break
+            skipped.append(entry)
+
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        if chosen is None:
+            return None
+
+        self._order += 1
+        self.load[chosen] += weight
+        heapq.heappush(self._heap, (self.load[chosen], self._order, chosen))
+        return chosen
+
+def covers(periods: List[Period], day) -> bool:
+    """True if one of the lease periods includes `day` (a date or a datetime)."""
+    day = day.date() if isinstance(day, datetime) else day
+    return any(start <= day and (end is None or end >= day) for start, end in periods)
+
+def occurrences(first_due: datetime, frequency_days: int, horizon_end: datetime) -> List[datetime]:
+    """Due dates first_due, first_due + frequency, ... strictly before horizon_end."""
+    step = timedelta(days=max(frequency_days or 1, 1))
+    dates = []
+    due = first_due
+    while due < horizon_end:
+        dates.append(due)
+        due += step
+    return dates
@@ -18,6 +18,8 @@ class VacancyStrategy(enum.Enum):
     OWNER_PAYS = "owner_pays"      # Tenants only pay their 1/N share (based on total capacity), owner covers vacancy
 
 from models.establishment import SaaSBilledTo
+from utils.money import to_cents, from_cents, allocate_cents
+from algorithms.occupancy import occupancy_days, period_days
 
 class CostCalculator:
     """
@@ -32,17 +34,39 @@ class CostCalculator:
     - Vacancy Logic: Determines how variable costs (Invoices) are split when rooms are empty.
     """
 
-    def __init__(self, establishment, rooms: List[Any], invoices: List[Any], vacancy_strategy: VacancyStrategy = VacancyStrategy.REDISTRIBUTE):
+    def __init__(self, establishment, rooms: List[Any], invoices: List[Any], vacancy_strategy: VacancyStrategy = VacancyStrategy.REDISTRIBUTE,
+                 invoice_totals_cents: Optional[Dict[Any, int]] = None):
         """
         :param establishment: The Establishment object (contains syndic_cost, wifi_cost, config_financial_mode).
         :param rooms: List of Room objects (must have base_price, is_vacant).
         :param invoices: List of Invoice objects (must have amount, type).
         :param vacancy_strategy: Strategy to handle variable costs when rooms are empty.
+        :param invoice_totals_cents: Pre-aggregated invoice totals by ExpenseType, in cents (e.g. from the
+                                     ChargeLedger). When given, `invoices` is not scanned.
         """
         self.establishment = establishment
         self.rooms = rooms
         self.invoices = invoices
         self.vacancy_strategy = vacancy_strategy
+        self.invoice_totals_cents = invoice_totals_cents
+
+    @classmethod
+    def from_ledger(cls, establishment, rooms: List[Any], ledger_totals: Dict[Any, int],
+                    vacancy_strategy: VacancyStrategy = VacancyStrategy.REDISTRIBUTE) -> 'CostCalculator':
+        """
+        Builds a calculator reading the per-type totals of LedgerService.get_totals() instead of invoices.
+        """
+        return cls(establishment, rooms, [], vacancy_strategy=vacancy_strategy, invoice_totals_cents=ledger_totals)
+
+    def _total_invoices(self) -> float:
+        if self.invoice_totals_cents is not None:
+            return from_cents(sum(self.invoice_totals_cents.values()))
+        return sum(inv.amount for inv in self.invoices)
+
+    def _total_invoices_cents(self) -> int:
+        if self.invoice_totals_cents is not None:
+            return sum(self.invoice_totals_cents.values())
+        return sum(to_cents(inv.amount) for inv in self.invoices)
 
     def calculate(self) -> Dict[str, Any]:
         """
@@ -75,6 +99,148 @@ class CostCalculator:
         else:
             return self._calculate_per_room(occupied_rooms, occupied_count, total_rooms_count)
 
+    def calculate_cents(self) -> Dict[str, Any]:
+        """
+        Exact variant of `calculate()` working in integer cents.
+
+        Shares are distributed with the largest-remainder rule (see utils.money.allocate_cents):
+        remainder cents go to the rooms with the lowest ids first, so the split is deterministic and
+        sum(room totals) + owner_absorbed == grand_total, to the cent.
+
+        :return: {
+                     "mode": "Egal" | "Inegal (Par Chambre)",
+                     "grand_total": int,
+                     "owner_absorbed": int,
+                     "breakdown_per_room": { room_id: { "rent": int, "charges": int, "total": int } }
+                 }
+        """
+        occupied_rooms = sorted((r for r in self.rooms if not r.is_vacant), key=lambda r: r.id)
+        occupied_count = len(occupied_rooms)
+        if occupied_count == 0:
+            return self._empty_result()
+
+        mode = getattr(self.establishment, 'config_financial_mode', 'Egal')
+        mode_str = mode.value if hasattr(mode, 'value') else str(mode)
+
+        total_invoices = self._total_invoices_cents()
+        fixed_charges = (to_cents(self.establishment.syndic_cost) + to_cents(self.establishment.wifi_cost)
+                         + to_cents(self._saas_fee()))
+        equal_weights = [1] * occupied_count
+
+        owner_absorbed = 0
+        if mode_str == 'Egal':
+            total_rent = sum(to_cents(r.base_price) for r in self.rooms)
+            rents = allocate_cents(total_rent, equal_weights)
+            charges = allocate_cents(total_invoices + fixed_charges, equal_weights)
+            grand_total = total_rent + total_invoices + fixed_charges
+            result = {"mode": "Egal"}
+        else:
+            rents = [to_cents(r.base_price) for r in occupied_rooms]
+            fixed_shares = allocate_cents(fixed_charges, equal_weights)
+
+            if self.vacancy_strategy == VacancyStrategy.REDISTRIBUTE:
+                variable_shares = allocate_cents(total_invoices, equal_weights)
+            else:
+                # One unit per room (vacant or not), the vacant units are absorbed by the owner
+                all_rooms = sorted(self.rooms, key=lambda r: r.id)
+                unit_shares = dict(zip((r.id for r in all_rooms), allocate_cents(total_invoices, [1] * len(all_rooms))))
+                variable_shares = [unit_shares[r.id] for r in occupied_rooms]
+                owner_absorbed = total_invoices - sum(variable_shares)
+
+            charges = [f + v for f, v in zip(fixed_shares, variable_shares)]
+            grand_total = sum(rents) + total_invoices + fixed_charges
+            result = {"mode": "Inegal (Par Chambre)", "vacancy_strategy": self.vacancy_strategy.value}
+
+        result["grand_total"] = grand_total
+        result["owner_absorbed"] = owner_absorbed
+        result["breakdown_per_room"] = {
+            room.id: {"rent": rent, "charges": charge, "total": rent + charge}
+            for room, rent, charge in zip(occupied_rooms, rents, charges)
+        }
+        return result
+
+    def calculate_period_cents(self, period_start, period_end, leases: Optional[List[Any]] = None) -> Dict[str, Any]:
+        """
+        Pro-rata variant of `calculate_cents()` for a billing window [period_start, period_end].
+
+        Instead of the `is_vacant` flag, occupancy comes from the lease dates: each room is weighted by
+        the number of days it was occupied during the window (overlapping leases are merged).
+        - Egal: the whole bill is split among rooms proportionally to their occupancy-days.
+        - Inegal: rent is pro-rated (base_price * days / period_days), syndic/wifi/SaaS are split by
+          occupancy-days, invoices too (REDISTRIBUTE) or per room-day of capacity (OWNER_PAYS, the owner
+          absorbing the vacant room-days).
+        With every room occupied for the whole window, the result equals `calculate_cents()`.
+
+        :param leases: Lease objects of the rooms (room_id, start_date, end_date). Defaults to `room.leases`.
+        :return: Same structure as `calculate_cents()` plus "period_days" and "occupancy_days".
+        """
+        if leases is None:
+            leases = [lease for room in self.rooms for lease in room.leases]
+
+        total_days = period_days(period_start, period_end)
+        if total_days <= 0:
+            raise ValueError("period_end must not be before period_start")
+
+        room_ids = {r.id for r in self.rooms}
+        days = {room_id: d for room_id, d in occupancy_days(leases, period_start, period_end).items() if room_id in room_ids}
+        billed_rooms = sorted((r for r in self.rooms if days.get(r.id)), key=lambda r: r.id)
+        if not billed_rooms:
+            return self._empty_result()
+
+        mode = getattr(self.establishment, 'config_financial_mode', 'Egal')
+        mode_str = mode.value if hasattr(mode, 'value') else str(mode)
+
+        total_invoices = self._total_invoices_cents()
+        fixed_charges = (to_cents(self.establishment.syndic_cost) + to_cents(self.establishment.wifi_cost)
+                         + to_cents(self._saas_fee()))
+        day_weights = [days[r.id] for r in billed_rooms]
+
+        owner_absorbed = 0
+        if mode_str == 'Egal':
+            total_rent = sum(to_cents(r.base_price) for r in self.rooms)
+            rents = allocate_cents(total_rent, day_weights)
+            charges = allocate_cents(total_invoices + fixed_charges, day_weights)
+            grand_total = total_rent + total_invoices + fixed_charges
+            result = {"mode": "Egal"}
+        else:
+            # Rounded half-up to the cent, per room
+            rents = [(2 * to_cents(r.base_price) * days[r.id] + total_days) // (2 * total_days) for r in billed_rooms]
+            fixed_shares = allocate_cents(fixed_charges, day_weights)
+
+            if self.vacancy_strategy == VacancyStrategy.REDISTRIBUTE:
+                variable_shares = allocate_cents(total_invoices, day_weights)
+            else:
+                # Capacity = every room for every day; vacant room-days are absorbed by the owner
+                all_rooms = sorted(self.rooms, key=lambda r: r.id)
+                capacity_weights = []
+                for r in all_rooms:
+                    occupied = days.get(r.id, 0)
+                    capacity_weights.extend([occupied, total_days - occupied])
+                unit_shares = allocate_cents(total_invoices, capacity_weights)
+                occupied_shares = dict(zip((r.id for r in all_rooms), unit_shares[0::2]))
+                variable_shares = [occupied_shares[r.id] for r in billed_rooms]
+                owner_absorbed = total_invoices - sum(variable_shares)
+
+            charges = [f + v for f, v in zip(fixed_shares, variable_shares)]
+            grand_total = sum(rents) + total_invoices + fixed_charges
+            result = {"mode": "Inegal (Par Chambre)", "vacancy_strategy": self.vacancy_strategy.value}
+
+        result["grand_total"] = grand_total
+        result["owner_absorbed"] = owner_absorbed
+        result["period_days"] = total_days
+        result["occupancy_days"] = {r.id: days[r.id] for r in billed_rooms}
+        result["breakdown_per_room"] = {
+            room.id: {"rent": rent, "charges": charge, "total": rent + charge}
+            for room, rent, charge in zip(billed_rooms, rents, charges)
+        }
+        return result
+
+    def _saas_fee(self) -> float:
+        """SaaS plan price when it is billed to the tenants (Coloc-Only), 0 otherwise."""
+        if self.establishment.saas_billed_to == SaaSBilledTo.TENANTS and self.establishment.subscription_plan:
+            return self.establishment.subscription_plan.price_monthly or 0.0
+        return 0.0
+
     def _calculate_equal_split(self, occupied_rooms, occupied_count) -> Dict[str, Any]:
         """
         Strategy: EQUAL SPLIT
@@ -95,7 +261,7 @@ class CostCalculator:
              return self._empty_result()
 
         # 1. Calculate Total Expenses
-        total_invoices = sum(inv.amount for inv in self.invoices)
+        total_invoices = self._total_invoices()
         syndic = self.establishment.syndic_cost or 0.0
         wifi = self.establishment.wifi_cost or 0.0
 
@@ -163,7 +329,7 @@ class CostCalculator:
         fixed_charges_share = fixed_charges_total / occupied_count
 
         # 2. Variable Costs (Invoices)
-        total_invoices = sum(inv.amount for inv in self.invoices)
+        total_invoices = self._total_invoices()
 
         variable_share = 0.0
         vacancy_loss_absorbed_by_owner = 0.0
@@ -0,0 +1,50 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: occupancy.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from datetime import date
+from typing import Any, Dict, Iterable, List, Tuple
+
+def period_days(period_start: date, period_end: date) -> int:
+    """Number of days in the billing window, both bounds included."""
+    return (period_end - period_start).days + 1
+
+def merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Merges closed integer intervals [start, end] (day ordinals).
+    Overlapping or adjacent intervals are fused, so a day is never counted twice.
+    """
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def occupancy_days(leases: Iterable[Any], period_start: date, period_end: date) -> Dict[int, int]:
+    """
+    Computes how many days each room was occupied during [period_start, period_end].
+
+    :param leases: Lease objects (must have room_id, start_date, end_date; end_date None = open-ended).
+    :return: { room_id: occupied_days } (rooms without any day of occupancy are omitted)
+    """
+    window_start = period_start.toordinal()
+    window_end = period_end.toordinal()
+
+    intervals_per_room: Dict[int, List[Tuple[int, int]]] = {}
+    for lease in leases:
+        start = max(lease.start_date.toordinal(), window_start)
+        end = window_end if lease.end_date is None else min(lease.end_date.toordinal(), window_end)
+        if start > end:
+            continue
+        intervals_per_room.setdefault(lease.room_id, []).append((start, end))
+
+    days = {}
+    for room_id, intervals in intervals_per_room.items():
+        days[room_id] = sum(end - start + 1 for start, end in merge_intervals(intervals))
+    return days
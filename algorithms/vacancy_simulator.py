@@ -0,0 +1,132 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: vacancy_simulator.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import math
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+from algorithms.cost_splitter import VacancyStrategy
+from algorithms.batch_splitter import BatchCostCalculator
+from models.establishment import SaaSBilledTo
+
+FINANCIAL_MODES = ('Egal', 'Inegal')
+
+class VacancySimulator:
+    """
+    What-if simulator comparing vacancy strategies across occupancy levels.
+
+    For an establishment of N rooms, every scenario "k rooms occupied" (k = 0..N) is evaluated
+    for both financial modes and both vacancy strategies in a single BatchCostCalculator pass,
+    i.e. 4 * (N + 1) virtual establishments instead of as many CostCalculator.calculate() calls.
+
+    Rooms are filled in the order given: scenario k occupies the first k rooms of `room_prices`.
+    """
+
+    def __init__(self, room_prices: Sequence[float], invoice_total: float,
+                 syndic_cost: float = 0.0, wifi_cost: float = 0.0, saas_fee: float = 0.0):
+        """:raises ValueError: invoice_total is NaN or infinite (it would poison every curve)."""
+        self.room_prices = np.asarray(room_prices, dtype=np.float64)
+        self.invoice_total = float(invoice_total)
+        if not math.isfinite(self.invoice_total):
+            raise ValueError("invoice_total must be a finite number")
+        self.syndic_cost = float(syndic_cost or 0.0)
+        self.wifi_cost = float(wifi_cost or 0.0)
+        self.saas_fee = float(saas_fee or 0.0)
+
+    @classmethod
+    def from_establishment(cls, establishment: Any, invoice_total: float) -> 'VacancySimulator':
+        """Simulator for a real establishment; rooms are filled by ascending id."""
+        saas_fee = 0.0
+        if establishment.saas_billed_to == SaaSBilledTo.TENANTS and establishment.subscription_plan:
+            saas_fee = establishment.subscription_plan.price_monthly or 0.0
+        rooms = sorted(establishment.rooms, key=lambda r: r.id)
+        return cls([r.base_price for r in rooms], invoice_total,
+                   establishment.syndic_cost, establishment.wifi_cost, saas_fee)
+
+    def simulate(self) -> Dict[str, Any]:
+        """
+        :return: {
+                     "occupancy": array [0..N],
+                     "curves": {
+                         "Egal" | "Inegal": {
+                             "redistribute" | "owner_pays": {
+                                 "tenant_charges_share": charges paid by each tenant,
+                                 "tenant_mean_total": average total (rent + charges) per tenant,
+                                 "collected_total": everything paid by the tenants,
+                                 "owner_absorbed": variable costs left to the owner
+                             }
+                         }
+                     }
+                 }
+                 Tenant curves are NaN for k = 0 (nobody to pay); under OWNER_PAYS (Inegal) the owner
+                 then absorbs all the invoices. "owner_absorbed" is always 0 in Egal mode, which
+                 ignores the vacancy strategy.
+        """
+        n_rooms = len(self.room_prices)
+        occupancy = np.arange(n_rooms + 1)
+        scenarios = [(mode, strategy) for mode in FINANCIAL_MODES for strategy in VacancyStrategy]
+        n_levels = n_rooms + 1
+        n_est = len(scenarios) * n_levels
+
+        # Virtual establishment e = scenario_index * (N + 1) + k, with the first k rooms occupied
+        est_ids = np.arange(n_est)
+        level = np.tile(occupancy, len(scenarios))
+        room_est = np.repeat(est_ids, n_rooms)
+        room_rank = np.tile(np.arange(n_rooms), n_est)
+
+        batch = BatchCostCalculator(
+            establishment_ids=est_ids,
+            financial_modes=[mode for mode, _ in scenarios for _ in range(n_levels)],
+            invoice_totals=np.full(n_est, self.invoice_total),
+            syndic_costs=np.full(n_est, self.syndic_cost),
+            wifi_costs=np.full(n_est, self.wifi_cost),
+            saas_fees=np.full(n_est, self.saas_fee),
+            room_ids=np.arange(n_est * n_rooms),
+            room_establishment_ids=room_est,
+            room_prices=np.tile(self.room_prices, n_est),
+            room_vacant=room_rank >= level[room_est],
+            vacancy_strategy=[strategy for _, strategy in scenarios for _ in range(n_levels)]
+        )
+        arrays = batch.calculate()
+        # The batch arrays hold the OWNER_PAYS loss for every establishment; Egal ignores it
+        owner_absorbed = np.where(batch.is_equal_mode, 0.0, arrays["owner_absorbed"])
+
+        billed = arrays["billed"]
+        collected = np.bincount(room_est, weights=np.where(billed, arrays["room_total"], 0.0), minlength=n_est)
+        charges = np.bincount(room_est, weights=np.where(billed, arrays["room_charges"], 0.0), minlength=n_est)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            occupied = arrays["occupied"].astype(np.float64)
+            mean_total = np.where(occupied > 0, collected / occupied, np.nan)
+            charges_share = np.where(occupied > 0, charges / occupied, np.nan)
+
+        curves: Dict[str, Dict[str, Dict[str, np.ndarray]]] = {}
+        for i, (mode, strategy) in enumerate(scenarios):
+            rows = slice(i * n_levels, (i + 1) * n_levels)
+            curves.setdefault(mode, {})[strategy.value] = {
+                "tenant_charges_share": charges_share[rows],
+                "tenant_mean_total": mean_total[rows],
+                "collected_total": collected[rows],
+                "owner_absorbed": owner_absorbed[rows],
+            }
+
+        return {"occupancy": occupancy, "curves": curves}
+
+    @staticmethod
+    def to_json(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Converts the arrays to JSON-friendly lists (NaN -> None)."""
+        def clean(values):
+            return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
+        return {
+            "occupancy": result["occupancy"].tolist(),
+            "curves": {
+                mode: {strategy: {name: clean(values) for name, values in curve.items()}
+                       for strategy, curve in strategies.items()}
+                for mode, strategies in result["curves"].items()
+            }
+        }
@@ -10,6 +10,12 @@ from flask_login import LoginManager
 from config.settings import Config
 from config.extensions import db, configure_uploads, csrf # Security Fix: Import csrf
 from services.i18n_service import i18n
+from services.cost_split_cache import cost_split_cache
+from services.tenant_index import tenant_index
+from services.chat_hub import chat_hub
+from services.media_pipeline import media_pipeline
+from services.storage_backend import storage
+from services.receipt_batch_service import receipt_batch
 from routes.context_processors import register_context_processors
 
 # Import models for LoginManager and generally to ensure they are registered with SQLAlchemy
@@ -18,7 +24,7 @@ from models import User
 # Import Blueprints
 from routes import (
     auth_bp, dashboard_bp, establishment_bp, finance_bp,
-    chat_bp, ticket_bp, main_bp, super_admin_bp, public_bp, chore_bp, marketplace_bp
+    chat_bp, ticket_bp, main_bp, super_admin_bp, public_bp, chore_bp, marketplace_bp, media_bp
 )
 
 def create_app():
@@ -30,6 +36,12 @@ def create_app():
     db.init_app(app)
     csrf.init_app(app) # Security Fix: Enable CSRF Protection
     i18n.init_app(app)
+    cost_split_cache.init_app(app)
+    tenant_index.init_app(app)
+    chat_hub.init_app(app)
+    media_pipeline.init_app(app)
+    storage.init_app(app)
+    receipt_batch.init_app(app)
 
     register_context_processors(app)
 
@@ -54,6 +66,7 @@ def create_app():
     app.register_blueprint(public_bp)
     app.register_blueprint(chore_bp)
     app.register_blueprint(marketplace_bp)
+    app.register_blueprint(media_bp)
 
     @app.after_request
     def set_security_headers(response):
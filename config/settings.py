@@ -7,6 +7,7 @@
 * Auditer par : La CyberConfiance, www.cyberconfiance.com
 """
 import os
+import tempfile
 
 class Config:
     # Database
@@ -26,11 +27,48 @@ class Config:
     basedir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or os.path.join(basedir, 'statics', 'uploads')
     UPLOAD_FOLDER_CHAT = os.environ.get('UPLOAD_FOLDER_CHAT') or os.path.join(basedir, 'statics', 'uploads', 'chat')
+    # Files not checked yet (uploads being received, temporary copies): never under a served directory
+    UPLOAD_TMP_FOLDER = os.environ.get('UPLOAD_TMP_FOLDER') or os.path.join(tempfile.gettempdir(), 'rentpilot-uploads')
+    # Larger request bodies are refused (413) from their Content-Length, before being read
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 25 * 1024 * 1024))
+
+    # Upload storage: 'local' (UPLOAD_FOLDER), 's3' (any S3-compatible bucket) or 'memory' (emulator, dev/tests)
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    MEDIA_BASE_URL = os.environ.get('MEDIA_BASE_URL', '/media') # Where UPLOAD_FOLDER is served (local backend)
+    MEDIA_CDN_URL = os.environ.get('MEDIA_CDN_URL') # e.g. https://cdn.example.com, in front of the storage
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_PREFIX = os.environ.get('S3_PREFIX', '')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL') # MinIO / other providers; empty for AWS
+    S3_REGION = os.environ.get('S3_REGION')
+    S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL') # Public base URL of the bucket, if not the endpoint
+    # /media offload to the web server: Nginx internal location, or X-Sendfile (Apache, lighttpd)
+    MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT') # e.g. /_protected_media
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '0') == '1'
 
     # Super Admin (Env variables)
     # Audited: Moved default credentials to be clearly identified as fallbacks
     SUPER_ADMIN_ID = os.environ.get('SUPER_ADMIN_ID') or 'admin@rentpilot.com'
     SUPER_ADMIN_PASS = os.environ.get('SUPER_ADMIN_PASS') or 'SuperSecretPass123!'
 
+    # Caches
+    COST_SPLIT_CACHE_SIZE = int(os.environ.get('COST_SPLIT_CACHE_SIZE', 1024))
+    ACTIVE_TENANT_INDEX_SIZE = int(os.environ.get('ACTIVE_TENANT_INDEX_SIZE', 4096))
+    ACTIVE_TENANT_INDEX_TTL = float(os.environ.get('ACTIVE_TENANT_INDEX_TTL', 300))
+
+    # Chat live delivery (SSE)
+    CHAT_PUBSUB_URL = os.environ.get('CHAT_PUBSUB_URL') # tcp://host:port of scripts/chat_broker.py, shared by the workers
+    CHAT_STREAM_HEARTBEAT = float(os.environ.get('CHAT_STREAM_HEARTBEAT', 15))
+    CHAT_STREAM_MAX_DURATION = float(os.environ.get('CHAT_STREAM_MAX_DURATION', 300))
+    CHAT_STREAM_QUEUE_SIZE = int(os.environ.get('CHAT_STREAM_QUEUE_SIZE', 100))
+
+    # Background media processing (chat images)
+    MEDIA_WORKERS = int(os.environ.get('MEDIA_WORKERS', 2))
+    MEDIA_QUEUE_SIZE = int(os.environ.get('MEDIA_QUEUE_SIZE', 32))
+    MEDIA_PIPELINE_EAGER = os.environ.get('MEDIA_PIPELINE_EAGER', '0') == '1' # Synchronous processing (tests, debug)
+
+    # Batch receipts (ZIP): PDF rendering processes (default: one per CPU), receipts in flight
+    RECEIPT_WORKERS = int(os.environ['RECEIPT_WORKERS']) if os.environ.get('RECEIPT_WORKERS') else None
+    RECEIPT_BATCH_WINDOW = int(os.environ['RECEIPT_BATCH_WINDOW']) if os.environ.get('RECEIPT_BATCH_WINDOW') else None
+
     # APILayer / Geolocation
     GEO_API_KEY = os.environ.get('GEO_API_KEY')
@@ -19,9 +19,22 @@ from models import (
     Ad, Request, Ticket, ChoreType, ChoreEvent, ChoreValidation, ChoreStatus
 )
 from security.pwd_tools import hash_password
+from services.ledger_service import LedgerService
 from datetime import date
 from sqlalchemy import inspect, text
 
+# Aggregate tables filled from the rows that already exist when they are first created
+AGGREGATE_BACKFILLS = {
+    'charge_ledgers': LedgerService.rebuild,
+}
+
+def backfill_aggregates(created_tables):
+    """Fills newly created aggregate tables (e.g. the ledger of invoices entered before it existed)."""
+    for table_name, rebuild in AGGREGATE_BACKFILLS.items():
+        if table_name in created_tables:
+            rows = rebuild()
+            print(f"Backfilled '{table_name}': {rows} rows")
+
 def init_db():
     app = create_app()
     with app.app_context():
@@ -114,6 +127,16 @@ def init_db():
                             except Exception as e:
                                 print(f"Failed to add column '{column.name}' to '{table_name}': {e}")
 
+                    # Indexes declared on the model but missing from the existing table
+                    existing_indexes = {i['name'] for i in inspector.get_indexes(table_name)}
+                    for index in model_class.__table__.indexes:
+                        if index.name not in existing_indexes:
+                            print(f"Migrating: Creating index '{index.name}' on '{table_name}'")
+                            try:
+                                index.create(db.engine)
+                            except Exception as e:
+                                print(f"Failed to create index '{index.name}': {e}")
+
             # Specific migration for Ads room_id nullable (PostgreSQL only)
             try:
                 if 'ads' in existing_tables:
@@ -130,6 +153,7 @@ def init_db():
                 # If column doesn't exist or other error
                 print(f"Failed to alter 'ads.room_id' constraint: {e}")
 
+        backfill_aggregates(set(AGGREGATE_BACKFILLS) - set(existing_tables))
         print("Database schema check complete.")
 
         # Seed Platform Settings
@@ -8,9 +8,12 @@
 """
 from .users import User, UserRole
 from .establishment import Establishment, Room, Lease, FinancialMode, SaaSBilledTo, EstablishmentOwner, EstablishmentOwnerRole
-from .finance import Invoice, Transaction, PaymentProof, ExpenseType, ValidationStatus, SaaSInvoice, SaaSInvoiceStatus, PaymentMethod
-from .communication import ChatRoom, Message, ChannelType, MessageType, Announcement, AnnouncementSenderType, AnnouncementTargetAudience, AnnouncementPriority
+from .finance import Invoice, Transaction, PaymentProof, ExpenseType, ValidationStatus, SaaSInvoice, SaaSInvoiceStatus, PaymentMethod, ChargeLedger
+from .communication import ChatRoom, Message, MessageRead, ChatReadState, ChannelType, MessageType, MediaStatus, Announcement, AnnouncementSenderType, AnnouncementTargetAudience, AnnouncementPriority
 from .marketplace import Ad, Request, AdStatus
 from .maintenance import Ticket
 from .saas_config import PlatformSettings, SubscriptionPlan, ReceiptFormat
 from .chores import ChoreType, ChoreEvent, ChoreValidation, ChoreStatus
+from . import versioning
+from .portfolio import LandlordPortfolioSummary
+from .storage import StoredBlob, UploadSession
@@ -24,12 +24,16 @@ class ChoreType(db.Model):
     __tablename__ = 'chore_types'
 
     id = db.Column(db.Integer, primary_key=True)
-    establishment_id = db.Column(db.Integer, db.ForeignKey('establishments.id'), nullable=False)
+    establishment_id = db.Column(db.Integer, db.ForeignKey('establishments.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     icon = db.Column(db.String(50), nullable=True)
     frequency_days = db.Column(db.Integer, nullable=False, default=7)
     is_rotating = db.Column(db.Boolean, default=False)
+    # Relative effort, used by the horizon scheduler to balance the load between tenants
+    weight = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Calendar ETag (chore_service.calendar_version)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     events = db.relationship('ChoreEvent', backref='chore_type', lazy=True)
@@ -48,9 +52,20 @@ class ChoreEvent(db.Model):
     status = db.Column(SQLAlchemyEnum(ChoreStatus), default=ChoreStatus.PENDING, nullable=False)
     proof_image = db.Column(db.String(255), nullable=True)
 
+    # Consensus: validations received, and quorum snapshotted when the task is marked done
+    validation_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    required_validations = db.Column(db.Integer, nullable=True)
+    # Calendar ETag: also set by the bulk updates of the consensus counters (onupdate)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     # Relationships
     validations = db.relationship('ChoreValidation', backref='event', lazy=True)
 
+    # Calendar feed: range scan of an establishment's chore types over due_date
+    __table_args__ = (
+        db.Index('ix_chore_events_type_due_date', 'chore_type_id', 'due_date'),
+    )
+
 class ChoreValidation(db.Model):
     """
     SECURITY WARNING: data from this model should NEVER be returned in API calls made by a user with role 'Bailleur',
@@ -20,6 +20,12 @@ class MessageType(enum.Enum):
     IMAGE = 'image'
     VOICE = 'voice'
 
+class MediaStatus(enum.Enum):
+    PENDING = 'pending'         # Raw upload stored, waiting for the media pipeline
+    PROCESSING = 'processing'
+    READY = 'ready'             # Renditions available in media_variants
+    FAILED = 'failed'           # The raw upload is served as is
+
 class ChatRoom(db.Model):
     __tablename__ = 'chat_rooms'
 
@@ -42,11 +48,49 @@ class Message(db.Model):
     file_url = db.Column(db.String(255), nullable=True)
     duration = db.Column(db.Integer, nullable=True) # Seconds, for voice
 
+    # Images are processed in the background (services.media_pipeline); renditions from ImageVariantService
+    media_status = db.Column(SQLAlchemyEnum(MediaStatus), nullable=True)
+    media_variants = db.Column(db.JSON, nullable=True)
+
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
-    # JSON list of dicts: [{"user_id": 1, "read_at": "ISO_TIMESTAMP"}]
+    # Legacy JSON list of dicts: [{"user_id": 1, "read_at": "ISO_TIMESTAMP"}].
+    # Receipts now live in MessageRead; only read by ChatService.migrate_legacy_receipts.
     read_by_users = db.Column(db.JSON, default=list)
 
+    # History pagination: keyset on (timestamp, id) within a room
+    __table_args__ = (
+        db.Index('ix_messages_room_timestamp', 'chat_room_id', 'timestamp', 'id'),
+    )
+
+class MessageRead(db.Model):
+    """Read receipt of one message by one user."""
+    __tablename__ = 'message_reads'
+
+    id = db.Column(db.Integer, primary_key=True)
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    read_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('message_id', 'user_id', name='unique_read_per_message_user'),
+    )
+
+class ChatReadState(db.Model):
+    """
+    High-water mark of a user in a room: every message up to (last_read_timestamp, last_read_message_id),
+    in history order, has been read. Unread messages are the ones after it; unread_count keeps their
+    number (UnreadCounterService) so badges do not have to count the history.
+    """
+    __tablename__ = 'chat_read_states'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    chat_room_id = db.Column(db.Integer, db.ForeignKey('chat_rooms.id'), primary_key=True)
+    last_read_message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=True)
+    last_read_timestamp = db.Column(db.DateTime, nullable=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class AnnouncementSenderType(enum.Enum):
     SUPER_ADMIN = 'SuperAdmin'
     LANDLORD = 'Landlord'
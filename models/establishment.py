@@ -51,6 +51,10 @@ class Establishment(db.Model):
 
     expense_types_config = db.Column(db.JSON, default=list)
 
+    # Bumped whenever rooms, invoices or the financial configuration change (see models/versioning.py).
+    # Used as part of the cost-split cache key.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relationships
     subscription_plan = db.relationship('SubscriptionPlan', backref='establishments')
     rooms = db.relationship('Room', backref='establishment', lazy=True)
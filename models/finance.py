@@ -13,6 +13,7 @@ import enum
 from datetime import datetime
 import secrets
 import string
+from utils.money import Money
 
 def generate_trx_id():
     part1 = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(4))
@@ -50,6 +51,11 @@ class Invoice(db.Model):
     transactions = db.relationship('Transaction', backref='invoice', lazy=True)
     establishment = db.relationship('Establishment', backref='invoices')
 
+    @property
+    def amount_money(self) -> Money:
+        """Amount as exact integer cents (the float column is kept for compatibility)."""
+        return Money.from_float(self.amount)
+
 class Transaction(db.Model):
     """
     Represents a payment made by a user.
@@ -70,6 +76,11 @@ class Transaction(db.Model):
     # Relationship to Proof
     proof = db.relationship('PaymentProof', backref='transaction', uselist=False, lazy=True)
 
+    @property
+    def amount_money(self) -> Money:
+        """Amount as exact integer cents (the float column is kept for compatibility)."""
+        return Money.from_float(self.amount)
+
 class PaymentProof(db.Model):
     """
     Links to the uploaded proof file.
@@ -79,6 +90,7 @@ class PaymentProof(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), nullable=False)
     file_path = db.Column(db.String(255), nullable=False)
+    file_variants = db.Column(db.JSON, nullable=True) # Renditions from ImageVariantService (images only)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class SaaSInvoiceStatus(enum.Enum):
@@ -109,4 +121,30 @@ class SaaSInvoice(db.Model):
     paid_at = db.Column(db.DateTime, nullable=True)
 
     # Relationship
-    establishment = db.relationship('Establishment', backref='saas_invoices')
\ No newline at end of file
+    establishment = db.relationship('Establishment', backref='saas_invoices')
+
+    @property
+    def amount_money(self) -> Money:
+        """Amount as exact integer cents (the float column is kept for compatibility)."""
+        return Money.from_float(self.amount)
+
+
+class ChargeLedger(db.Model):
+    """
+    Running aggregate of the invoices of an establishment, per period (month) and expense type.
+    Maintained incrementally by LedgerService when invoices are added, edited or deleted, so the
+    cost splitter (tenant dashboard) reads the totals without scanning the invoice list.
+    """
+    __tablename__ = 'charge_ledgers'
+
+    id = db.Column(db.Integer, primary_key=True)
+    establishment_id = db.Column(db.Integer, db.ForeignKey('establishments.id'), nullable=False)
+    period = db.Column(db.Date, nullable=False) # First day of the month
+    type = db.Column(SQLAlchemyEnum(ExpenseType), nullable=False)
+    total_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('establishment_id', 'period', 'type', name='unique_ledger_per_period_type'),
+    )
@@ -20,6 +20,7 @@ class Ticket(db.Model):
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     photo_path = db.Column(db.String(255), nullable=True)
+    photo_variants = db.Column(db.JSON, nullable=True) # Renditions from ImageVariantService
     priority = db.Column(db.String(50), default='Normal')
     status = db.Column(db.String(50), nullable=False, default='Open')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
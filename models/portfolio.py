@@ -0,0 +1,103 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: portfolio.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from datetime import datetime
+from sqlalchemy import select, func, case
+from config.extensions import db
+from .establishment import Room, Lease, EstablishmentOwner
+from .maintenance import Ticket
+from .finance import Transaction, ValidationStatus
+
+class LandlordPortfolioSummary(db.Model):
+    """
+    Pre-aggregated counters of a landlord's portfolio, read by the landlord dashboard in a single row.
+
+    Kept up to date in the same transaction as the room, lease, ticket, transaction and ownership
+    changes: the code making them calls PortfolioSummaryService.apply() with the landlords
+    concerned, which recounts their rows (refresh_summaries()).
+    """
+    __tablename__ = 'landlord_portfolio_summaries'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    establishment_count = db.Column(db.Integer, nullable=False, default=0)
+    total_rooms = db.Column(db.Integer, nullable=False, default=0)
+    occupied_rooms = db.Column(db.Integer, nullable=False, default=0)
+    open_tickets = db.Column(db.Integer, nullable=False, default=0)
+    pending_payments = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+summaries_table = LandlordPortfolioSummary.__table__
+owners_table = EstablishmentOwner.__table__
+rooms_table = Room.__table__
+leases_table = Lease.__table__
+tickets_table = Ticket.__table__
+transactions_table = Transaction.__table__
+
+def _grouped(connection, query):
+    return {user_id: value for user_id, value in connection.execute(query)}
+
+def compute_summaries(connection, landlord_ids):
+    """Counters of the given landlords, recounted with aggregate queries: {user_id: {counter: value}}."""
+    ids = sorted({i for i in landlord_ids if i is not None})
+    if not ids:
+        return {}
+
+    owner = owners_table.c
+    establishments = _grouped(connection, select(owner.user_id, func.count())
+                              .where(owner.user_id.in_(ids)).group_by(owner.user_id))
+
+    room_rows = connection.execute(
+        select(owner.user_id, func.count(rooms_table.c.id),
+               func.sum(case((rooms_table.c.is_vacant.is_(False), 1), else_=0)))
+        .join(rooms_table, rooms_table.c.establishment_id == owner.establishment_id)
+        .where(owner.user_id.in_(ids)).group_by(owner.user_id)
+    )
+    rooms = {user_id: (total, int(occupied or 0)) for user_id, total, occupied in room_rows}
+
+    tickets = _grouped(connection, select(owner.user_id, func.count(tickets_table.c.id))
+                       .join(tickets_table, tickets_table.c.establishment_id == owner.establishment_id)
+                       .where(owner.user_id.in_(ids), tickets_table.c.status == 'Open')
+                       .group_by(owner.user_id))
+
+    # Same rule as the finance dashboard: pending transactions of anyone holding a lease
+    # in one of the landlord's establishments.
+    payments = _grouped(connection, select(owner.user_id, func.count(func.distinct(transactions_table.c.id)))
+                        .join(rooms_table, rooms_table.c.establishment_id == owner.establishment_id)
+                        .join(leases_table, leases_table.c.room_id == rooms_table.c.id)
+                        .join(transactions_table, transactions_table.c.user_id == leases_table.c.user_id)
+                        .where(owner.user_id.in_(ids),
+                               transactions_table.c.validation_status == ValidationStatus.PENDING)
+                        .group_by(owner.user_id))
+
+    summaries = {}
+    for user_id in ids:
+        total_rooms, occupied_rooms = rooms.get(user_id, (0, 0))
+        summaries[user_id] = {
+            'establishment_count': establishments.get(user_id, 0),
+            'total_rooms': total_rooms,
+            'occupied_rooms': occupied_rooms,
+            'open_tickets': tickets.get(user_id, 0),
+            'pending_payments': payments.get(user_id, 0)
+        }
+    return summaries
+
+def refresh_summaries(connection, landlord_ids):
+    """Recomputes and stores the summary rows of the given landlords."""
+    summaries = compute_summaries(connection, landlord_ids)
+    if not summaries:
+        return
+
+    now = datetime.utcnow()
+    existing = set(connection.execute(
+        select(summaries_table.c.user_id).where(summaries_table.c.user_id.in_(list(summaries)))
+    ).scalars())
+    for user_id, values in summaries.items():
+        if user_id in existing:
+            connection.execute(summaries_table.update().where(summaries_table.c.user_id == user_id)
+                               .values(updated_at=now, **values))
+        else:
+            connection.execute(summaries_table.insert().values(user_id=user_id, updated_at=now, **values))
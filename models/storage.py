@@ -0,0 +1,44 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: storage.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from config.extensions import db
+from datetime import datetime
+
+class StoredBlob(db.Model):
+    """
+    One uploaded file content, stored once under its SHA-256 (services.blob_store.BlobStore).
+    ref_count is the number of records (messages, proofs, tickets...) pointing to `path`.
+    """
+    __tablename__ = 'stored_blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False, unique=True) # Storage key (services.storage_backend)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UploadSession(db.Model):
+    """
+    Resumable chunked upload in progress (services.chunked_upload_service.ChunkedUploadService).
+    The chunks received so far are stored under the `part_path` key prefix; `received` is the
+    offset of the next chunk.
+    """
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.String(32), primary_key=True) # uuid4 hex, handed to the client
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    chat_room_id = db.Column(db.Integer, db.ForeignKey('chat_rooms.id'), nullable=True)
+    filename = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    part_path = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @property
+    def ext(self) -> str:
+        return self.filename.rsplit('.', 1)[1].lower()
@@ -0,0 +1,57 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: versioning.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import object_session
+from .establishment import Establishment, Room
+from .finance import Invoice
+from .saas_config import SubscriptionPlan
+
+# Establishment.data_version is bumped in the same transaction as the change, with an
+# atomic "data_version = data_version + 1" so that concurrent workers never reuse a version.
+# Note: bulk Query.update()/delete() bypass mapper events and must bump the version themselves.
+
+establishments_table = Establishment.__table__
+
+def bump_data_version(connection, establishment_ids):
+    ids = {i for i in establishment_ids if i is not None}
+    if not ids:
+        return
+    connection.execute(
+        establishments_table.update()
+        .where(establishments_table.c.id.in_(ids))
+        .values(data_version=establishments_table.c.data_version + 1)
+    )
+
+def _establishment_ids(target):
+    # Current and previous establishment (if the row was moved)
+    ids = [target.establishment_id]
+    history = inspect(target).attrs.establishment_id.history
+    ids.extend(history.deleted or [])
+    return ids
+
+def _bump_from_child(mapper, connection, target):
+    bump_data_version(connection, _establishment_ids(target))
+
+for model in (Room, Invoice):
+    event.listen(model, 'after_insert', _bump_from_child)
+    event.listen(model, 'after_update', _bump_from_child)
+    event.listen(model, 'after_delete', _bump_from_child)
+
+@event.listens_for(Establishment, 'before_update')
+def _bump_establishment(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and session.is_modified(target, include_collections=False):
+        target.data_version = establishments_table.c.data_version + 1
+
+@event.listens_for(SubscriptionPlan, 'after_update')
+def _bump_plan_establishments(mapper, connection, target):
+    connection.execute(
+        establishments_table.update()
+        .where(establishments_table.c.subscription_plan_id == target.id)
+        .values(data_version=establishments_table.c.data_version + 1)
+    )
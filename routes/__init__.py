@@ -17,3 +17,4 @@ from .super_admin_routes import super_admin_bp
 from .public_routes import public_bp
 from .chore_routes import chore_bp
 from .marketplace_routes import marketplace_bp
+from .media_routes import media_bp
@@ -6,13 +6,19 @@
 * Fait par : Aisance KALONJI, www.aisancekalonji.com
 * Auditer par : La CyberConfiance, www.cyberconfiance.com
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, Response, current_app, stream_with_context
 from flask_login import login_required, current_user
-from models import ChatRoom, Message, ChannelType, MessageType, UserRole, Establishment, Lease, Room
+from models import ChatRoom, Message, ChannelType, MessageType, MediaStatus, User, UserRole, UploadSession
 from config.extensions import db
 from datetime import datetime
+from types import SimpleNamespace
+import time
 from services.chat_media_service import ChatMediaService
+from services.chunked_upload_service import ChunkedUploadService
 from services.chat_service import ChatService
+from services.unread_counter_service import UnreadCounterService
+from services.chat_hub import chat_hub, format_sse
+from services.media_pipeline import media_pipeline
 
 chat_bp = Blueprint('chat', __name__)
 
@@ -22,9 +28,7 @@ def index():
     # In a real scenario, fetch available rooms for the user
     return render_template('chat.html', messages=[], user_map={}, total_participants=0)
 
-@chat_bp.route('/chat/<int:room_id>', methods=['GET'])
-@login_required
-def view_chat(room_id):
+def _get_accessible_room(room_id):
     chat_room = ChatRoom.query.get_or_404(room_id)
 
     # Permission Check
@@ -33,41 +37,140 @@ def view_chat(room_id):
         if current_user.role == UserRole.BAILLEUR:
             abort(403)
 
-    # Additional check: ensure user belongs to the establishment.
-    # (Skipped for brevity, but implied by context)
+    # Members only: tenants living in the establishment, plus its landlords for GENERAL rooms
+    if current_user.id not in ChatService.participant_ids(chat_room):
+        abort(403)
+    return chat_room
 
-    messages = Message.query.filter_by(chat_room_id=room_id).order_by(Message.timestamp).all()
+def _get_participants(chat_room):
+    """(user_map, total_participants) used to render senders and read receipts."""
+    participant_ids = ChatService.participant_ids(chat_room)
+    participants = User.query.filter(User.id.in_(participant_ids)).all() if participant_ids else []
 
-    # Get participants to build user map and count
-    est = Establishment.query.get(chat_room.establishment_id)
-    participants = []
-    if est:
-        # Tenants
-        active_leases = Lease.query.join(Room).filter(Room.establishment_id == est.id).all()
-        tenants = [l.tenant for l in active_leases]
-        participants.extend(tenants)
+    user_map = {p.id: p.email.split('@')[0] for p in participants}
+    return user_map, len(participants)
 
-        # Landlord (if General)
-        if chat_room.type == ChannelType.GENERAL:
-            participants.append(est.landlord)
+@chat_bp.route('/chat/<int:room_id>', methods=['GET'])
+@login_required
+def view_chat(room_id):
+    chat_room = _get_accessible_room(room_id)
 
-    # Remove duplicates if any
-    participants = list({p.id: p for p in participants}.values())
+    # Only the latest page; older messages come from message_history on demand
+    messages, next_cursor = ChatService.get_messages_page(room_id)
+    read_receipts = ChatService.read_receipts([msg.id for msg in messages])
+    user_map, total_participants = _get_participants(chat_room)
 
-    user_map = {p.id: p.email.split('@')[0] for p in participants}
-    total_participants = len(participants)
+    return render_template('chat.html', chat_room=chat_room, messages=messages, next_cursor=next_cursor,
+                           read_receipts=read_receipts, user_map=user_map, total_participants=total_participants)
+
+@chat_bp.route('/chat/<int:room_id>/messages', methods=['GET'])
+@login_required
+def message_history(room_id):
+    """
+    History API: ?before=<cursor>&limit=<n>, newest page when no cursor is given.
+    Returns the messages (chronological order), their rendered HTML and the cursor of the next older page.
+    """
+    chat_room = _get_accessible_room(room_id)
+    try:
+        messages, next_cursor = ChatService.get_messages_page(
+            room_id, before=request.args.get('before'), limit=request.args.get('limit', type=int)
+        )
+    except ValueError:
+        return jsonify({'error': 'Curseur invalide'}), 400
+
+    read_receipts = ChatService.read_receipts([msg.id for msg in messages])
+    user_map, total_participants = _get_participants(chat_room)
+    html = ''.join(render_template('partials/chat_message.html', msg=msg, read_receipts=read_receipts,
+                                   user_map=user_map, total_participants=total_participants) for msg in messages)
+    return jsonify({
+        'messages': [ChatService.serialize_message(msg, read_receipts.get(msg.id)) for msg in messages],
+        'next_cursor': next_cursor,
+        'html': html
+    })
+
+def _message_view(payload):
+    """Message-like object rebuilt from a published payload, to render the partial without the DB."""
+    return SimpleNamespace(
+        id=payload['id'],
+        sender_id=payload['sender_id'],
+        type=MessageType(payload['type']),
+        content=payload['content'],
+        file_url=payload['file_url'],
+        duration=payload['duration'],
+        media_status=MediaStatus(payload['media_status']) if payload['media_status'] else None,
+        media_variants=payload['media_variants'],
+        timestamp=datetime.fromisoformat(payload['timestamp'])
+    )
 
-    return render_template('chat.html', chat_room=chat_room, messages=messages, user_map=user_map, total_participants=total_participants)
+@chat_bp.route('/chat/unread', methods=['GET'])
+@login_required
+def unread_counts():
+    """Badges: {"rooms": {room_id: count}, "total": n} for every room of the current user, in one query."""
+    counts = UnreadCounterService.counts_for_user(current_user.id)
+    return jsonify({'rooms': {str(room_id): count for room_id, count in counts.items()}, 'total': sum(counts.values())})
+
+@chat_bp.route('/chat/<int:room_id>/stream', methods=['GET'])
+@login_required
+def stream(room_id):
+    """
+    Server-Sent Events: one `message` event per new message of the room, with its rendered HTML.
+    The stream ends after CHAT_STREAM_MAX_DURATION seconds; the browser reconnects with
+    Last-Event-ID and receives the messages it missed in between.
+    """
+    chat_room = _get_accessible_room(room_id)
+    user_map, total_participants = _get_participants(chat_room)
+
+    # Subscribe before reading the backlog so nothing falls in between (duplicates are skipped by id)
+    subscription = chat_hub.subscribe(room_id)
+    backlog = []
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    if last_event_id:
+        missed = Message.query.filter(Message.chat_room_id == room_id, Message.id > last_event_id)\
+            .order_by(Message.timestamp, Message.id).limit(ChatService.MAX_PAGE_SIZE).all()
+        read_receipts = ChatService.read_receipts([msg.id for msg in missed])
+        backlog = [ChatService.serialize_message(msg, read_receipts.get(msg.id)) for msg in missed]
+    # The stream may stay open for minutes: give the connection back to the pool now
+    db.session.close()
+
+    heartbeat = current_app.config.get('CHAT_STREAM_HEARTBEAT', 15)
+    max_duration = current_app.config.get('CHAT_STREAM_MAX_DURATION', 300)
+
+    def render(payload, event='message'):
+        html = render_template('partials/chat_message.html', msg=_message_view(payload),
+                               read_receipts={payload['id']: payload['read_by']}, user_map=user_map,
+                               total_participants=total_participants)
+        # Media updates carry no id: Last-Event-ID must keep pointing at the newest message
+        return format_sse({'message': payload, 'html': html}, event=event,
+                          event_id=payload['id'] if event == 'message' else None)
+
+    def events():
+        sent = set()
+        with subscription:
+            yield "retry: 3000\n\n"
+            for payload in backlog:
+                sent.add(payload['id'])
+                yield render(payload)
+
+            deadline = time.monotonic() + max_duration
+            while not subscription.closed and time.monotonic() < deadline:
+                event = subscription.get(timeout=heartbeat)
+                if event is None:
+                    yield ": keepalive\n\n"
+                elif event['type'] == 'message' and event['message']['id'] not in sent:
+                    sent.add(event['message']['id'])
+                    yield render(event['message'])
+                elif event['type'] == 'media':
+                    yield render(event['message'], event='media')
+
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Nginx must not buffer the stream
+    return response
 
 @chat_bp.route('/chat/<int:room_id>/send', methods=['POST'])
 @login_required
 def send_message(room_id):
-    chat_room = ChatRoom.query.get_or_404(room_id)
-
-    # Permission Check
-    if chat_room.type == ChannelType.COLOC_ONLY:
-        if current_user.role == UserRole.BAILLEUR:
-            abort(403)
+    chat_room = _get_accessible_room(room_id)
 
     content = request.form.get('content')
     file = request.files.get('file')
@@ -81,47 +184,160 @@ def send_message(room_id):
     msg_type = MessageType.TEXT
     file_url = None
     duration = None
+    media_status = None
 
     if file and file.filename:
         try:
-            file_url = ChatMediaService.process_and_save(file)
-
-            # Determine type based on extension
-            ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-
-            if ext in ChatMediaService.ALLOWED_EXTENSIONS_AUDIO:
-                msg_type = MessageType.VOICE
-                # If client sends duration (e.g. from recording JS), use it
-                try:
-                    duration = int(request.form.get('duration', 0))
-                except ValueError:
-                    duration = 0
-            elif ext in ChatMediaService.ALLOWED_EXTENSIONS_IMG:
-                msg_type = MessageType.IMAGE
-
+            # Stored as received; images are compressed by the media pipeline after the response
+            file_url = ChatMediaService.save_raw(file)
+            msg_type, media_status = _media_fields(file.filename)
+            if msg_type == MessageType.VOICE:
+                duration = _form_duration(request.form)
         except ValueError as e:
             flash(str(e), 'error')
             return redirect(url_for('chat.view_chat', room_id=room_id))
 
+    _post_message(chat_room, content, msg_type, file_url, duration, media_status)
+    return redirect(url_for('chat.view_chat', room_id=room_id))
+
+def _media_fields(filename):
+    """Message type and initial media status of an uploaded file."""
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    media_status = MediaStatus.PENDING if ChatMediaService.needs_processing(filename) else None
+    if ext in ChatMediaService.ALLOWED_EXTENSIONS_AUDIO:
+        return MessageType.VOICE, media_status
+    if ext in ChatMediaService.ALLOWED_EXTENSIONS_IMG:
+        return MessageType.IMAGE, media_status
+    return MessageType.TEXT, media_status
+
+def _form_duration(form):
+    # If client sends duration (e.g. from recording JS), use it
+    try:
+        return int(form.get('duration', 0))
+    except (TypeError, ValueError):
+        return 0
+
+def _post_message(chat_room, content, msg_type, file_url=None, duration=None, media_status=None):
     msg = Message(
-        chat_room_id=room_id,
+        chat_room_id=chat_room.id,
         sender_id=current_user.id,
         content=content,
         type=msg_type,
         file_url=file_url,
         duration=duration,
+        media_status=media_status,
         timestamp=datetime.utcnow()
     )
     db.session.add(msg)
+    UnreadCounterService.on_message_sent(msg, ChatService.participant_ids(chat_room))
     db.session.commit()
 
-    return redirect(url_for('chat.view_chat', room_id=room_id))
+    # Live delivery to the open streams of the room (every worker with a shared broker)
+    chat_hub.publish(chat_room.id, {'type': 'message', 'message': ChatService.serialize_message(msg)})
+    if media_status == MediaStatus.PENDING:
+        media_pipeline.submit(ChatMediaService.process_message_media, msg.id)
+    return msg
+
+def _upload_error(e, **extra):
+    return jsonify({'error': str(e), **extra}), getattr(e, 'status_code', 400)
+
+def _get_upload_session(upload_id):
+    session = db.session.get(UploadSession, upload_id)
+    if session is None or session.user_id != current_user.id:
+        abort(404)
+    if session.chat_room_id is not None:
+        # Still a member of the room the file will be posted to
+        _get_accessible_room(session.chat_room_id)
+    return session
+
+@chat_bp.route('/chat/<int:room_id>/uploads', methods=['POST'])
+@login_required
+def start_upload(room_id):
+    """
+    Starts a resumable upload of a voice note or an image: {"filename", "size"}.
+    The file is then sent with PUT /chat/uploads/<upload_id> (raw chunks, Upload-Offset header).
+    """
+    chat_room = _get_accessible_room(room_id)
+    data = request.get_json(silent=True) or {}
+    try:
+        session = ChunkedUploadService.start(current_user.id, data.get('filename'),
+                                             int(data.get('size') or 0), chat_room.id)
+    except ValueError as e:
+        return _upload_error(e)
+    return jsonify({
+        'upload_id': session.id,
+        'offset': 0,
+        'chunk_size': ChunkedUploadService.CHUNK_SIZE
+    }), 201
+
+@chat_bp.route('/chat/uploads/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    """Offset to resume from after an interrupted transfer."""
+    session = _get_upload_session(upload_id)
+    return jsonify({'offset': session.received, 'size': session.total_size})
+
+@chat_bp.route('/chat/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    """
+    Appends the raw request body at the Upload-Offset header. The body is read from the WSGI
+    stream in fixed-size chunks: nothing is buffered and a bad first chunk stops the transfer.
+    """
+    session = _get_upload_session(upload_id)
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Missing Upload-Offset header'}), 400
+    try:
+        received = ChunkedUploadService.append(session, request.stream, offset)
+    except ValueError as e:
+        # 409: the client resumes from the returned offset
+        return _upload_error(e, offset=session.received)
+    return jsonify({'offset': received, 'size': session.total_size})
+
+@chat_bp.route('/chat/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_upload(upload_id):
+    """Posts the uploaded file as a message of its room, with the optional content and duration."""
+    session = _get_upload_session(upload_id)
+    chat_room = _get_accessible_room(session.chat_room_id)
+    data = request.get_json(silent=True) or request.form
+    msg_type, media_status = _media_fields(session.filename)
+    duration = _form_duration(data) if msg_type == MessageType.VOICE else None
+    try:
+        file_url = ChunkedUploadService.complete(session)
+    except ValueError as e:
+        return _upload_error(e)
+
+    msg = _post_message(chat_room, data.get('content') or None, msg_type, file_url, duration, media_status)
+    return jsonify({'success': True, 'message': ChatService.serialize_message(msg)})
 
 @chat_bp.route('/chat/read/<int:msg_id>', methods=['POST'])
 @login_required
 def mark_read(msg_id):
     """
-    Mark a specific message as read by the current user.
+    Mark a specific message (and the earlier ones of its room) as read by the current user.
     """
+    _get_accessible_room(Message.query.get_or_404(msg_id).chat_room_id)
     success = ChatService.mark_message_as_read(msg_id, current_user.id)
-    return jsonify({'success': success})
\ No newline at end of file
+    return jsonify({'success': success})
+
+@chat_bp.route('/chat/<int:room_id>/read', methods=['POST'])
+@login_required
+def mark_room_read(room_id):
+    """
+    Marks every message of the room up to {"up_to": message_id} as read, in one transaction.
+    Returns the receipts created and the remaining unread count.
+    """
+    _get_accessible_room(room_id)
+    data = request.get_json(silent=True) or {}
+    try:
+        up_to = int(data.get('up_to'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'up_to requis'}), 400
+
+    marked = ChatService.mark_read_up_to(room_id, current_user.id, up_to)
+    if marked is None:
+        return jsonify({'error': 'Message introuvable'}), 404
+    return jsonify({'success': True, 'marked': marked, 'unread': ChatService.unread_count(room_id, current_user.id)})
\ No newline at end of file
@@ -6,13 +6,13 @@
 * Fait par : Aisance KALONJI, www.aisancekalonji.com
 * Auditer par : La CyberConfiance, www.cyberconfiance.com
 """
-from flask import Blueprint, jsonify, request, abort, render_template, redirect, url_for, flash
+from flask import Blueprint, jsonify, request, abort, render_template, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 from models.users import UserRole
 from models.chores import ChoreEvent, ChoreType, ChoreValidation, ChoreStatus
 from models.establishment import Lease, Room, Establishment
 from config.extensions import db
-from services.chore_service import mark_task_done, validate_task, get_active_tenants
+from services.chore_service import mark_task_done, validate_task, validate_tasks, calendar_feed, calendar_version, chore_weight
 from datetime import datetime
 
 chore_bp = Blueprint('chore', __name__)
@@ -84,48 +84,31 @@ def get_calendar_events():
     start_str = request.args.get('start')
     end_str = request.args.get('end')
 
-    query = ChoreEvent.query.join(ChoreType).filter(ChoreType.establishment_id == est_id)
-
+    start_date = end_date = None
     if start_str:
         try:
             # FullCalendar sends ISO strings like '2023-10-01T00:00:00-05:00'
             # We might need to handle timezone or just slice date
             start_date = datetime.fromisoformat(start_str.replace('Z', '+00:00')).date() # approximate
-            query = query.filter(ChoreEvent.due_date >= start_date)
         except ValueError:
             pass # Ignore invalid date format
 
     if end_str:
         try:
             end_date = datetime.fromisoformat(end_str.replace('Z', '+00:00')).date()
-            query = query.filter(ChoreEvent.due_date <= end_date)
         except ValueError:
             pass
 
-    events = query.all()
-
-    # Calculate total active tenants for validation ratio
-    active_tenants = get_active_tenants(est_id)
-    total_tenants = len(active_tenants)
-
-    result = []
-    for event in events:
-        nb_validations = len([v for v in event.validations if v.is_validated])
-        validation_status = f"{nb_validations}/{total_tenants} validations"
-
-        result.append({
-            'id': event.id,
-            'title': event.chore_type.name,
-            'start': event.due_date.isoformat(),
-            'allDay': True,
-            'extendedProps': {
-                'validation_status': validation_status,
-                'status': event.status.value,
-                'assigned_user_id': event.assigned_user_id
-            }
-        })
-
-    return jsonify(result)
+    # FullCalendar refetches on every navigation: answer 304 when the range did not change,
+    # checked on an aggregate of the range before the feed is built
+    etag = calendar_version(est_id, start_date, end_date)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(calendar_feed(est_id, start_date, end_date))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @chore_bp.route('/chores/type', methods=['POST'])
 def create_chore_type():
@@ -145,6 +128,10 @@ def create_chore_type():
     icon = data.get('icon')
     frequency = data.get('frequency_days', 7)
     is_rotating = data.get('is_rotating', False)
+    try:
+        weight = chore_weight(data.get('weight'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     new_chore = ChoreType(
         establishment_id=est_id,
@@ -152,7 +139,8 @@ def create_chore_type():
         description=description,
         icon=icon,
         frequency_days=frequency,
-        is_rotating=is_rotating
+        is_rotating=is_rotating,
+        weight=weight
     )
     db.session.add(new_chore)
     db.session.commit()
@@ -171,4 +159,26 @@ def confirm_task(id):
     success, msg = validate_task(id, current_user.id)
     if not success:
         return jsonify({'error': msg}), 400
-    return jsonify({'message': msg})
\ No newline at end of file
+    return jsonify({'message': msg})
+
+@chore_bp.route('/chores/confirm', methods=['POST'])
+def confirm_tasks():
+    """Bulk confirmation: {"event_ids": [1, 2, 3]} -> per-event result, in one round trip."""
+    est_id = get_user_establishment_id()
+    if not est_id:
+        abort(400, "User not associated with an establishment")
+
+    data = request.get_json(silent=True) or {}
+    event_ids = data.get('event_ids')
+    if not isinstance(event_ids, list) or not event_ids:
+        return jsonify({'error': 'event_ids requis'}), 400
+    try:
+        event_ids = [int(event_id) for event_id in event_ids]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'event_ids invalides'}), 400
+
+    results = validate_tasks(event_ids, current_user.id, establishment_id=est_id)
+    return jsonify({
+        'validated': sum(1 for success, _ in results.values() if success),
+        'results': {str(event_id): {'success': success, 'message': msg} for event_id, (success, msg) in results.items()}
+    })
\ No newline at end of file
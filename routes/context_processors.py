@@ -7,6 +7,8 @@
 * Auditer par : La CyberConfiance, www.cyberconfiance.com
 """
 from services.branding_service import BrandingService
+from services.image_variant_service import ImageVariantService
+from services.storage_backend import storage
 from models import Announcement, AnnouncementTargetAudience
 from flask_login import current_user
 from sqlalchemy import or_
@@ -39,8 +41,15 @@ def inject_site_settings():
 
     return context
 
+def image_variant_url(variants, size='medium', fmt='jpeg', fallback=None):
+    return storage.url(ImageVariantService.url(variants, size, fmt, fallback))
+
 def register_context_processors(app):
     """
     Registers context processors on the Flask app.
     """
-    app.context_processor(inject_site_settings)
\ No newline at end of file
+    app.context_processor(inject_site_settings)
+    # {{ media_url(record.file_path) }}: storage key -> public URL (CDN when configured)
+    app.add_template_global(storage.url, name='media_url')
+    # {{ image_variant(record.photo_variants, 'thumb', fallback=record.photo_path) }}
+    app.add_template_global(image_variant_url, name='image_variant')
\ No newline at end of file
@@ -9,10 +9,10 @@
 from flask import Blueprint, render_template
 from flask_login import login_required, current_user
 from models.users import UserRole
-from models.establishment import Establishment, Lease, EstablishmentOwner
-from models.maintenance import Ticket
-from models.finance import Transaction, Invoice
 from algorithms.cost_splitter import CostCalculator
+from services.cost_split_cache import cost_split_cache
+from services.dashboard_service import DashboardService
+from services.ledger_service import LedgerService
 from datetime import datetime
 
 dashboard_bp = Blueprint('dashboard', __name__)
@@ -30,61 +30,39 @@ def dashboard():
     context['now_month_prev'] = f"{prev_month:02d}"
 
     if current_user.role == UserRole.BAILLEUR:
-        # Bailleur logic
-        establishments = Establishment.query.join(EstablishmentOwner).filter(EstablishmentOwner.user_id == current_user.id).all()
-
-        total_tenants = 0
-        est_ids = []
-        for est in establishments:
-            est_ids.append(est.id)
-            for room in est.rooms:
-                if not room.is_vacant:
-                    total_tenants += 1
-
-        open_tickets = 0
-        if est_ids:
-            open_tickets = Ticket.query.filter(
-                Ticket.establishment_id.in_(est_ids),
-                Ticket.status == 'Open'
-            ).count()
+        # Bailleur logic: counters come from the pre-aggregated portfolio summary row
+        overview = DashboardService.landlord_summary(current_user.id)
 
         context = {
             'role': 'Bailleur',
-            'establishments': establishments,
-            'total_tenants': total_tenants,
-            'open_tickets': open_tickets
+            'establishments': overview['establishments'],
+            'total_rooms': overview['total_rooms'],
+            'total_tenants': overview['total_tenants'],
+            'open_tickets': overview['open_tickets']
         }
 
     elif current_user.role in [UserRole.COLOCATAIRE, UserRole.TENANT_RESPONSABLE]:
         # Tenant logic
         # Find active lease (assuming one active lease for simplicity)
-        active_lease = Lease.query.filter_by(user_id=current_user.id).first()
+        active_lease = DashboardService.tenant_lease(current_user.id)
 
         if active_lease:
             room = active_lease.room
             establishment = room.establishment
-            roommates = []
-
-            # Find roommates in same establishment
-            # We iterate through rooms of the establishment
-            for r in establishment.rooms:
-                if not r.is_vacant and r.id != room.id:
-                    # Find lease for this room
-                    # This is a simplification, as there might be historical leases.
-                    # Ideally we filter by date or an 'active' flag.
-                    # Here we take the last one or similar.
-                    l = Lease.query.filter_by(room_id=r.id).order_by(Lease.start_date.desc()).first()
-                    if l and l.tenant:
-                        roommates.append(l.tenant)
+            # Tenants of the other occupied rooms (latest lease of each room)
+            roommates = DashboardService.roommates(room)
 
             # Calculate Amount Due
             # Get invoices for current month? Or all pending?
             # For showcase simplicity, we take all invoices of the establishment (or filtered by date in a real app)
             # Here we assume the setup has created relevant invoices for the period.
-            invoices = Invoice.query.filter_by(establishment_id=establishment.id).all()
+            # The result is shared by all tenants of the house until rooms/invoices/config change.
+            # Invoice totals come from the charge ledger (one row per period and type), not the invoice list.
+            def compute_split():
+                totals = LedgerService.get_establishment_totals(establishment.id)
+                return CostCalculator.from_ledger(establishment, establishment.rooms, totals).calculate()
 
-            calculator = CostCalculator(establishment, establishment.rooms, invoices)
-            calculation_result = calculator.calculate()
+            calculation_result = cost_split_cache.get_or_compute(establishment, compute_split)
 
             amount_to_pay = 0.0
             if 'breakdown_per_room' in calculation_result:
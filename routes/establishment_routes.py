@@ -15,7 +15,13 @@ from config.extensions import db
 from datetime import datetime
 from services.permission_service import add_co_landlord
 from services.pdf_service import PDFService
+from services.ledger_service import LedgerService
+from services.chore_service import on_lease_change
+from services.portfolio_summary_service import PortfolioSummaryService
+from algorithms.vacancy_simulator import VacancySimulator
+from utils.money import from_cents
 import io
+import math
 
 establishment_bp = Blueprint('establishment', __name__)
 
@@ -46,6 +52,7 @@ def create_establishment():
             role=EstablishmentOwnerRole.PRIMARY
         )
         db.session.add(owner)
+        PortfolioSummaryService.apply([current_user.id])
         db.session.commit()
         flash('Establishment created', 'success')
         return redirect(url_for('dashboard.dashboard'))
@@ -91,6 +98,7 @@ def add_room(id):
 
     room = Room(establishment_id=est.id, name=name, base_price=base_price)
     db.session.add(room)
+    PortfolioSummaryService.apply(PortfolioSummaryService.establishment_landlords([est.id]))
     db.session.commit()
 
     flash('Room added', 'success')
@@ -129,8 +137,14 @@ def assign_tenant(id):
     room.is_vacant = False
 
     db.session.add(lease)
+    # Occupancy of this establishment, pending payments of the tenant's establishments
+    PortfolioSummaryService.apply(PortfolioSummaryService.establishment_landlords([est.id])
+                                  | PortfolioSummaryService.tenant_landlords([user.id]))
     db.session.commit()
 
+    # Rebalance the already planned chores with the new tenant
+    on_lease_change(lease)
+
     flash('Tenant assigned', 'success')
     return redirect(url_for('establishment.update_establishment', id=id))
 
@@ -163,6 +177,7 @@ def setup():
                 role=EstablishmentOwnerRole.PRIMARY
             )
             db.session.add(owner)
+            PortfolioSummaryService.apply([current_user.id])
 
         # Update fields
         custom_expenses = data.get('custom_expenses')
@@ -202,6 +217,35 @@ def setup():
 
     return render_template('establishment_setup.html')
 
+@establishment_bp.route('/establishment/<int:id>/vacancy-simulation', methods=['GET'])
+@login_required
+@bailleur_required
+def vacancy_simulation(id):
+    """
+    What-if curves for every occupancy level, both vacancy strategies and both financial modes.
+    Invoices default to the ledger total of the current month (?invoice_total= overrides it).
+    """
+    est = Establishment.query.get_or_404(id)
+    owner = EstablishmentOwner.query.filter_by(user_id=current_user.id, establishment_id=est.id).first()
+    if not owner:
+        abort(403)
+
+    invoice_total = request.args.get('invoice_total')
+    if invoice_total is None:
+        invoice_total = from_cents(sum(LedgerService.get_totals(est.id, datetime.utcnow().date()).values()))
+    else:
+        try:
+            invoice_total = float(invoice_total)
+        except ValueError:
+            return jsonify({'error': 'invoice_total invalide'}), 400
+        if not math.isfinite(invoice_total):
+            return jsonify({'error': 'invoice_total invalide'}), 400
+
+    result = VacancySimulator.from_establishment(est, invoice_total).simulate()
+    payload = VacancySimulator.to_json(result)
+    payload['invoice_total'] = invoice_total
+    return jsonify(payload)
+
 @establishment_bp.route('/establishment/<int:id>/co-owners', methods=['POST'])
 @login_required
 @bailleur_required
@@ -256,10 +300,51 @@ def remove_co_owner(id, user_id):
         return jsonify({'error': 'Co-bailleur introuvable.'}), 404
 
     db.session.delete(target_owner)
+    PortfolioSummaryService.apply([user_id])
     db.session.commit()
 
     return jsonify({'message': 'Co-bailleur supprimé.'})
 
+@establishment_bp.route('/lease/<int:lease_id>/end', methods=['POST'])
+@login_required
+@bailleur_required
+def end_lease(lease_id):
+    lease = Lease.query.get_or_404(lease_id)
+    room = lease.room
+    establishment_id = room.establishment_id
+
+    is_owner = EstablishmentOwner.query.filter_by(
+        user_id=current_user.id,
+        establishment_id=establishment_id
+    ).first()
+
+    if not is_owner:
+        abort(403)
+
+    end_date_str = request.form.get('end_date')
+    try:
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else datetime.now().date()
+    except ValueError:
+        flash('Invalid date format', 'error')
+        return redirect(url_for('establishment.update_establishment', id=establishment_id))
+
+    if end_date < lease.start_date:
+        flash('End date is before the lease start', 'error')
+        return redirect(url_for('establishment.update_establishment', id=establishment_id))
+
+    lease.end_date = end_date
+    # A future end date frees the room once it has passed (LeaseService.release_ended_leases, daily)
+    if end_date <= datetime.now().date():
+        room.is_vacant = True
+        PortfolioSummaryService.apply(PortfolioSummaryService.establishment_landlords([establishment_id]))
+    db.session.commit()
+
+    # Future chores of the departing tenant go to the remaining ones
+    on_lease_change(lease)
+
+    flash('Lease ended', 'success')
+    return redirect(url_for('establishment.update_establishment', id=establishment_id))
+
 @establishment_bp.route('/lease/<int:lease_id>/generate', methods=['GET'])
 @login_required
 @bailleur_required
@@ -6,7 +6,7 @@
 * Fait par : Aisance KALONJI, www.aisancekalonji.com
 * Auditer par : La CyberConfiance, www.cyberconfiance.com
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, send_file, Response
 from flask_login import login_required, current_user
 from security.auth import bailleur_required, tenant_required
 from models.users import UserRole
@@ -15,8 +15,14 @@ from models.establishment import Lease, Establishment, EstablishmentOwner
 from config.extensions import db
 from services.upload_service import UploadService
 from services.pdf_service import PDFService
+from services.receipt_batch_service import ReceiptBatchService, receipt_batch
+from services.ledger_service import LedgerService
+from services.portfolio_summary_service import PortfolioSummaryService
+from services.image_variant_service import ImageVariantService
+from services.media_pipeline import media_pipeline
 from datetime import datetime
 import io
+import math
 
 finance_bp = Blueprint('finance', __name__)
 
@@ -84,6 +90,7 @@ def add_expense():
             date=datetime.utcnow().date()
         )
         db.session.add(invoice)
+        LedgerService.record_invoice(invoice)
         db.session.commit()
 
         flash('Expense added', 'success')
@@ -91,6 +98,62 @@ def add_expense():
 
     return render_template('finance/add_expense.html')
 
+def _get_editable_expense(invoice_id):
+    """Invoice of the current tenant responsable's establishment (same rule as add_expense)."""
+    if current_user.role != UserRole.TENANT_RESPONSABLE:
+        abort(403)
+    invoice = Invoice.query.get_or_404(invoice_id)
+    lease = Lease.query.filter_by(user_id=current_user.id).first()
+    if not lease or lease.room.establishment_id != invoice.establishment_id:
+        abort(403)
+    # Platform invoices are managed by the billing run
+    if invoice.type == ExpenseType.SAAS:
+        abort(403)
+    return invoice
+
+@finance_bp.route('/finance/expense/<int:invoice_id>/edit', methods=['POST'])
+@login_required
+def edit_expense(invoice_id):
+    invoice = _get_editable_expense(invoice_id)
+    old_amount, old_type, old_date = invoice.amount, invoice.type, invoice.date
+
+    try:
+        amount = float(request.form.get('amount', invoice.amount))
+        expense_type = ExpenseType(request.form['type']) if request.form.get('type') else invoice.type
+        expense_date = datetime.strptime(request.form['date'], '%Y-%m-%d').date() if request.form.get('date') else invoice.date
+    except ValueError:
+        flash('Invalid expense', 'error')
+        return redirect(url_for('dashboard.dashboard'))
+    if not math.isfinite(amount) or amount < 0 or expense_type == ExpenseType.SAAS:
+        flash('Invalid expense', 'error')
+        return redirect(url_for('dashboard.dashboard'))
+
+    invoice.amount = amount
+    invoice.type = expense_type
+    invoice.date = expense_date
+    if 'description' in request.form:
+        invoice.description = request.form.get('description')
+    LedgerService.record_invoice_change(invoice, old_amount, old_type, old_date)
+    db.session.commit()
+
+    flash('Expense updated', 'success')
+    return redirect(url_for('dashboard.dashboard'))
+
+@finance_bp.route('/finance/expense/<int:invoice_id>/delete', methods=['POST'])
+@login_required
+def delete_expense(invoice_id):
+    invoice = _get_editable_expense(invoice_id)
+    if invoice.transactions:
+        flash('Expense already has payments', 'error')
+        return redirect(url_for('dashboard.dashboard'))
+
+    LedgerService.remove_invoice(invoice)
+    db.session.delete(invoice)
+    db.session.commit()
+
+    flash('Expense deleted', 'success')
+    return redirect(url_for('dashboard.dashboard'))
+
 @finance_bp.route('/finance/upload-proof', methods=['POST'])
 @login_required
 @tenant_required
@@ -120,6 +183,8 @@ def upload_proof():
         validation_status=ValidationStatus.PENDING
     )
     db.session.add(transaction)
+    landlord_ids = PortfolioSummaryService.tenant_landlords([current_user.id])
+    PortfolioSummaryService.apply(landlord_ids)
     db.session.commit()
 
     # Upload File
@@ -132,10 +197,13 @@ def upload_proof():
         )
         db.session.add(proof)
         db.session.commit()
+        if ImageVariantService.is_image(file_path):
+            media_pipeline.submit(ImageVariantService.process, PaymentProof, proof.id, 'file_path', 'file_variants')
         flash('Payment proof uploaded', 'success')
 
     except Exception as e:
         db.session.delete(transaction)
+        PortfolioSummaryService.apply(landlord_ids)
         db.session.commit()
         flash(f'Upload failed: {str(e)}', 'error')
 
@@ -157,6 +225,7 @@ def validate_payment(transaction_id):
     elif action == 'reject':
         transaction.validation_status = ValidationStatus.REJECTED
 
+    PortfolioSummaryService.apply(PortfolioSummaryService.tenant_landlords([transaction.user_id]))
     db.session.commit()
     flash(f'Payment {action}d', 'success')
     return redirect(url_for('dashboard.dashboard'))
@@ -196,4 +265,52 @@ def get_receipt(transaction_id):
         as_attachment=True,
         download_name=f'receipt_{transaction.id}.pdf',
         mimetype='application/pdf'
-    )
\ No newline at end of file
+    )
+
+@finance_bp.route('/finance/receipts/batch', methods=['GET'])
+@login_required
+@bailleur_required
+def batch_receipts():
+    """
+    ZIP of receipts, streamed while the PDFs are drawn: ?ids=1,2,3 or ?month=YYYY-MM.
+    Only validated payments get a receipt, limited to the establishments of the current landlord.
+    """
+    owned_ids = [eo.establishment_id for eo in EstablishmentOwner.query.filter_by(user_id=current_user.id).all()]
+    query = db.session.query(Transaction.id)\
+        .join(Invoice, Transaction.invoice_id == Invoice.id)\
+        .filter(Invoice.establishment_id.in_(owned_ids),
+                Transaction.validation_status == ValidationStatus.VALIDATED)
+
+    month = request.args.get('month')
+    if month:
+        try:
+            start = datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            abort(400)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        query = query.filter(Transaction.date >= start, Transaction.date < end)\
+            .order_by(Transaction.date, Transaction.id)
+        label = month
+    else:
+        try:
+            ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+        except ValueError:
+            abort(400)
+        query = query.filter(Transaction.id.in_(ids)).order_by(Transaction.id)
+        label = 'selection'
+
+    transaction_ids = [trx_id for trx_id, in query.all()]
+    if not transaction_ids:
+        abort(404)
+
+    # Everything the PDFs need is loaded here: the stream below never touches the database
+    jobs = ReceiptBatchService.load_jobs(transaction_ids)
+    db.session.close()
+    return Response(
+        receipt_batch.zip_stream(jobs),
+        mimetype='application/zip',
+        headers={
+            'Content-Disposition': f'attachment; filename=recus_{label}.zip',
+            'X-Accel-Buffering': 'no'
+        }
+    )
@@ -0,0 +1,81 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Routes for media module.
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import mimetypes
+import os
+import re
+from flask import Blueprint, Response, request, redirect, send_file, abort, current_app
+from services.storage_backend import storage
+
+media_bp = Blueprint('media', __name__)
+
+# Blobs and their renditions are named after the SHA-256 of their content: the name is the ETag
+HASHED_KEY = re.compile(r'^blobs/[0-9a-f]{2}/[0-9a-f]{2}/(?P<tag>[0-9a-f]{64}(?:_[a-z]+)?)\.[a-z0-9]+$')
+# Work areas (upload chunks kept in the bucket by the S3 backend): never served
+PRIVATE_PREFIXES = ('tmp/', 'parts/')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+@media_bp.route('/media/<path:key>', methods=['GET', 'HEAD'])
+def serve(key):
+    """
+    Uploaded files (storage keys). Hashed names are cached for a year as immutable with a strong
+    ETag; Range requests (seeking in voice notes) are answered with 206. The bytes are sent by
+    the web server when an offload is configured (MEDIA_ACCEL_REDIRECT for Nginx, USE_X_SENDFILE
+    for Apache / lighttpd), otherwise through the WSGI file wrapper (sendfile under Gunicorn).
+    Objects in a bucket are served by the bucket (or its CDN): the route redirects there.
+    """
+    if key.startswith(PRIVATE_PREFIXES) or '..' in key.split('/'):
+        abort(404)
+    try:
+        path = storage.local_path(key)
+    except ValueError:
+        abort(404)
+
+    hashed = HASHED_KEY.match(key)
+    mimetype = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+    if path is None:
+        if not storage.exists(key):
+            abort(404)
+        target = storage.url(key)
+        if target != request.path:
+            response = redirect(target, code=301 if hashed else 302)
+            if hashed:
+                response.cache_control.public = True
+                response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            return response
+        # Backend without a public URL of its own (emulator): the bytes go through this route
+        response = send_file(storage.open(key), mimetype=mimetype, conditional=True,
+                             etag=hashed.group('tag') if hashed else False)
+    elif not os.path.isfile(path):
+        abort(404)
+    elif current_app.config.get('MEDIA_ACCEL_REDIRECT'):
+        response = _accel_redirect(key, path, mimetype, current_app.config['MEDIA_ACCEL_REDIRECT'], hashed)
+    else:
+        response = send_file(path, mimetype=mimetype, conditional=True,
+                             etag=hashed.group('tag') if hashed else True)
+
+    if hashed:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+def _accel_redirect(key, path, mimetype, prefix, hashed):
+    """
+    Nginx serves the file from its internal location `prefix` (alias of UPLOAD_FOLDER) and
+    handles Range itself; Python only answers the headers, or 304 when the ETag still matches.
+    """
+    response = Response(mimetype=mimetype)
+    response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + key
+    if hashed:
+        response.set_etag(hashed.group('tag'))
+    else:
+        stat = os.stat(path)
+        response.set_etag(f"{int(stat.st_mtime)}-{stat.st_size}")
+    return response.make_conditional(request)
@@ -14,6 +14,8 @@ from models import Ad, AdStatus
 from models.saas_config import ReceiptFormat
 from services.pdf_service import PDFService
 from services.upload_service import UploadService
+from services.blob_store import BlobStore
+from services.storage_backend import storage
 from config.extensions import db
 from datetime import datetime
 import json
@@ -97,14 +99,11 @@ def update_settings():
     # General Branding
     settings.app_name = request.form.get('app_name', settings.app_name)
 
+    # Images replaced by this update: their blobs are released once the new ones are committed
+    replaced = []
+
     # Logo Upload
-    logo_file = request.files.get('logo_file')
-    if logo_file and logo_file.filename != '':
-        try:
-            saved_path = UploadService.save_file(logo_file, subfolder='branding')
-            settings.logo_url = '/' + saved_path
-        except ValueError as e:
-            flash(f"Error uploading Logo: {e}", 'error')
+    _save_branding_image(settings, 'logo_url', request.files.get('logo_file'), "Logo", replaced)
 
     settings.primary_color_hex = request.form.get('primary_color_hex', settings.primary_color_hex)
     settings.secondary_color_hex = request.form.get('secondary_color_hex', settings.secondary_color_hex)
@@ -123,34 +122,13 @@ def update_settings():
     settings.pwa_custom_name = request.form.get('pwa_custom_name')
 
     # PWA Icon Upload
-    pwa_icon_file = request.files.get('pwa_custom_icon_file')
-    if pwa_icon_file and pwa_icon_file.filename != '':
-        try:
-            # Reusing UploadService
-            saved_path = UploadService.save_file(pwa_icon_file, subfolder='branding')
-            settings.pwa_custom_icon_url = '/' + saved_path
-        except ValueError as e:
-            flash(f"Error uploading PWA Icon: {e}", 'error')
+    _save_branding_image(settings, 'pwa_custom_icon_url', request.files.get('pwa_custom_icon_file'), "PWA Icon", replaced)
 
     # --- New Interface Config ---
 
     # Hero Image Upload
-    hero_file = request.files.get('landing_hero_background_file')
-    if hero_file and hero_file.filename != '':
-        try:
-            # Save file using UploadService
-            saved_path = UploadService.save_file(hero_file, subfolder='branding')
-            # Assuming 'statics/' is root for web access, path returned is relative like 'statics/uploads/branding/...'
-            # We want URL path, usually relative to static folder or root.
-            # Flask `url_for('static', filename=...)` expects path relative to static folder.
-            # UploadService returns relative path from project root 'statics/uploads/branding/...'
-            # We need to store it so it can be used. If we serve via static route, we need to know the prefix.
-            # Assuming standard structure, let's just store the full relative path for now,
-            # and in template we'll prepend '/' if needed or use `url_for` carefully.
-            # Actually, let's normalize to web path: '/statics/uploads/branding/...'
-            settings.landing_hero_background_url = '/' + saved_path
-        except ValueError as e:
-            flash(f"Error uploading Hero Image: {e}", 'error')
+    _save_branding_image(settings, 'landing_hero_background_url', request.files.get('landing_hero_background_file'),
+                         "Hero Image", replaced)
 
     # Footer Config
     settings.footer_text = request.form.get('footer_text', settings.footer_text)
@@ -180,9 +158,28 @@ def update_settings():
             flash("Invalid JSON for Footer Links.", "warning")
 
     db.session.commit()
+    if replaced:
+        for previous_url in replaced:
+            BlobStore.release(previous_url)
+        db.session.commit()
     flash('Settings updated successfully.', 'success')
     return redirect(url_for('super_admin.settings_view'))
 
+def _save_branding_image(settings, attr, file_storage, label, replaced):
+    """Stores a branding upload in `settings.<attr>`; the previous image goes to `replaced`."""
+    if not file_storage or file_storage.filename == '':
+        return
+    try:
+        saved_path = UploadService.save_file(file_storage, subfolder='branding')
+    except ValueError as e:
+        flash(f"Error uploading {label}: {e}", 'error')
+        return
+    previous_url = getattr(settings, attr)
+    # Branding settings hold URLs: the storage key is resolved once, at upload time
+    setattr(settings, attr, storage.url(saved_path))
+    if previous_url:
+        replaced.append(previous_url)
+
 @super_admin_bp.route('/plans', methods=['GET'])
 def plans_view():
     plans = SubscriptionPlan.query.all()
@@ -12,6 +12,10 @@ from models.maintenance import Ticket
 from models.users import UserRole
 from models.establishment import Establishment, Lease, EstablishmentOwner
 from config.extensions import db
+from services.upload_service import UploadService
+from services.image_variant_service import ImageVariantService
+from services.media_pipeline import media_pipeline
+from services.portfolio_summary_service import PortfolioSummaryService
 from datetime import datetime
 
 ticket_bp = Blueprint('ticket', __name__)
@@ -19,6 +23,7 @@ ticket_bp = Blueprint('ticket', __name__)
 @ticket_bp.route('/tickets', methods=['GET'])
 @login_required
 def list_tickets():
+    establishments = []
     if current_user.role == UserRole.BAILLEUR:
         # Bailleur sees all tickets for his establishments
         establishments = Establishment.query.join(EstablishmentOwner).filter(EstablishmentOwner.user_id == current_user.id).all()
@@ -31,7 +36,7 @@ def list_tickets():
         # Tenant sees tickets they created
         tickets = Ticket.query.filter_by(requester_id=current_user.id).all()
 
-    return render_template('tickets.html', tickets=tickets)
+    return render_template('tickets.html', tickets=tickets, establishments=establishments)
 
 @ticket_bp.route('/tickets/create', methods=['GET', 'POST'])
 @login_required
@@ -55,18 +60,33 @@ def create_ticket():
             if lease and lease.room:
                 establishment_id = lease.room.establishment_id
 
+        photo_path = None
+        photo = request.files.get('photo')
+        if photo and photo.filename:
+            try:
+                photo_path = UploadService.save_file(photo, 'tickets')
+            except ValueError as e:
+                flash(str(e), 'error')
+                return redirect(url_for('ticket.list_tickets'))
+
         ticket = Ticket(
             requester_id=current_user.id,
             establishment_id=establishment_id,
             title=title,
             description=description,
+            photo_path=photo_path,
             priority=priority,
             status='Open',
             created_at=datetime.utcnow()
         )
         db.session.add(ticket)
+        PortfolioSummaryService.apply(PortfolioSummaryService.establishment_landlords([establishment_id]))
         db.session.commit()
 
+        if photo_path and ImageVariantService.is_image(photo_path):
+            # Thumbnails for the ticket list, generated after the response
+            media_pipeline.submit(ImageVariantService.process, Ticket, ticket.id, 'photo_path', 'photo_variants')
+
         flash('Ticket created', 'success')
         return redirect(url_for('ticket.list_tickets'))
 
@@ -0,0 +1,315 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: benchmark.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+# Benchmark suite for the cost splitter and the month-close pipeline.
+#
+# Generates synthetic portfolios (10 to 100k establishments) and measures:
+#   - scalar CostCalculator.calculate() per establishment
+#   - BatchCostCalculator over the whole portfolio (float and cents)
+#   - the tenant /dashboard request path (SQLite in memory by default)
+#   - SaaS billing (BillingService.generate_monthly_invoices)
+#
+# Results (throughput, p50/p99 latency, peak memory) are printed as JSON so that
+# two releases can be compared by a script.
+#
+# Usage:
+#     python scripts/benchmark.py --sizes 10,100,1000 --output bench.json
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime
+from types import SimpleNamespace
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+BENCH_DB_URI = 'sqlite:///:memory:'
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(int(round(q / 100.0 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def summarize(latencies, total_seconds, items, peak_bytes):
+    return {
+        'items': items,
+        'total_seconds': total_seconds,
+        'throughput_per_second': (items / total_seconds) if total_seconds > 0 else None,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+        'peak_memory_bytes': peak_bytes,
+    }
+
+
+def measure_peak_memory(fn):
+    """Runs `fn` once more under tracemalloc and returns the peak allocated size."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def generate_portfolio(n_establishments, seed=0):
+    """
+    Synthetic portfolio of duck-typed establishments (no database):
+    1 to 12 rooms, 0 to 60% vacancy, 0 to 20 invoices per establishment.
+    """
+    from models.establishment import FinancialMode, SaaSBilledTo
+
+    rng = random.Random(seed)
+    establishments, invoices = [], []
+    room_id = 1
+    for est_id in range(1, n_establishments + 1):
+        vacancy_rate = rng.uniform(0.0, 0.6)
+        rooms = []
+        for _ in range(rng.randint(1, 12)):
+            rooms.append(SimpleNamespace(id=room_id, base_price=round(rng.uniform(250, 900), 2),
+                                         is_vacant=rng.random() < vacancy_rate))
+            room_id += 1
+        establishments.append(SimpleNamespace(
+            id=est_id,
+            config_financial_mode=rng.choice([FinancialMode.EGAL, FinancialMode.INEGAL]),
+            saas_billed_to=rng.choice([SaaSBilledTo.LANDLORD, SaaSBilledTo.TENANTS]),
+            subscription_plan=SimpleNamespace(price_monthly=rng.choice([9.99, 19.99, 49.0])),
+            syndic_cost=rng.choice([0.0, 35.0, 80.0]),
+            wifi_cost=rng.choice([0.0, 29.99]),
+            rooms=rooms
+        ))
+        for _ in range(rng.randint(0, 20)):
+            invoices.append(SimpleNamespace(establishment_id=est_id, amount=round(rng.uniform(5, 400), 2)))
+    return establishments, invoices
+
+
+def bench_scalar(establishments, invoices, with_memory):
+    from algorithms.cost_splitter import CostCalculator
+
+    invoices_by_est = {}
+    for inv in invoices:
+        invoices_by_est.setdefault(inv.establishment_id, []).append(inv)
+
+    def run(latencies=None):
+        for est in establishments:
+            start = time.perf_counter()
+            CostCalculator(est, est.rooms, invoices_by_est.get(est.id, [])).calculate()
+            if latencies is not None:
+                latencies.append(time.perf_counter() - start)
+
+    latencies = []
+    start = time.perf_counter()
+    run(latencies)
+    total = time.perf_counter() - start
+    peak = measure_peak_memory(run) if with_memory else None
+    return summarize(latencies, total, len(establishments), peak)
+
+
+def bench_batch(establishments, invoices, with_memory, repeat):
+    from algorithms.batch_splitter import BatchCostCalculator
+
+    def run():
+        batch = BatchCostCalculator.from_models(establishments, invoices)
+        batch.calculate()
+        batch.calculate_cents()
+
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    peak = measure_peak_memory(run) if with_memory else None
+    return summarize(latencies, total, len(establishments) * repeat, peak)
+
+
+def populate_database(db, portfolio):
+    """Bulk-inserts the synthetic portfolio, one tenant per occupied room. Returns tenant ids."""
+    from models import (Establishment, Room, Lease, User, UserRole, Invoice, ExpenseType,
+                        SubscriptionPlan, EstablishmentOwner, EstablishmentOwnerRole)
+    from services.ledger_service import LedgerService
+
+    establishments, invoices = portfolio
+    plans = {}
+    for price in sorted({est.subscription_plan.price_monthly for est in establishments}):
+        plan = SubscriptionPlan(name=f"Bench {price}", price_monthly=price)
+        db.session.add(plan)
+        plans[price] = plan
+    landlord = User(email="bench-landlord@rentpilot.test", password_hash="x", role=UserRole.BAILLEUR)
+    db.session.add(landlord)
+    db.session.flush()
+
+    db.session.execute(Establishment.__table__.insert(), [{
+        'id': est.id, 'address': f"{est.id} Bench Street",
+        'config_financial_mode': est.config_financial_mode.name, 'saas_billed_to': est.saas_billed_to.name,
+        'subscription_plan_id': plans[est.subscription_plan.price_monthly].id,
+        'syndic_cost': est.syndic_cost, 'wifi_cost': est.wifi_cost, 'data_version': 0,
+    } for est in establishments])
+    db.session.execute(EstablishmentOwner.__table__.insert(), [{
+        'user_id': landlord.id, 'establishment_id': est.id, 'role': EstablishmentOwnerRole.PRIMARY.name,
+    } for est in establishments])
+
+    rooms = [room for est in establishments for room in est.rooms]
+    room_est = {room.id: est.id for est in establishments for room in est.rooms}
+    db.session.execute(Room.__table__.insert(), [{
+        'id': room.id, 'establishment_id': room_est[room.id], 'name': f"Room {room.id}",
+        'base_price': room.base_price, 'is_vacant': room.is_vacant,
+    } for room in rooms])
+
+    occupied = [room for room in rooms if not room.is_vacant]
+    first_tenant_id = landlord.id + 1
+    db.session.execute(User.__table__.insert(), [{
+        'id': first_tenant_id + i, 'email': f"tenant{room.id}@rentpilot.test", 'password_hash': 'x',
+        'role': UserRole.COLOCATAIRE.name, 'created_at': datetime.utcnow(),
+    } for i, room in enumerate(occupied)])
+    db.session.execute(Lease.__table__.insert(), [{
+        'user_id': first_tenant_id + i, 'room_id': room.id, 'start_date': date(2026, 1, 1),
+    } for i, room in enumerate(occupied)])
+    db.session.execute(Invoice.__table__.insert(), [{
+        'establishment_id': inv.establishment_id, 'type': ExpenseType.ELEC.name,
+        'amount': inv.amount, 'date': date(2026, 1, 15),
+    } for inv in invoices])
+    db.session.commit()
+    # Bulk inserts bypass LedgerService: the dashboard reads the invoice totals from the ledger
+    LedgerService.rebuild()
+    return list(range(first_tenant_id, first_tenant_id + len(occupied)))
+
+
+def bench_database(n_establishments, seed, samples, with_memory, repeat):
+    from config.settings import Config
+    # drop_all() below would wipe a real database: checked before create_app() binds the engine
+    if not Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        raise RuntimeError("The database benchmark only runs on a throwaway SQLite database "
+                           f"(DB_URI={BENCH_DB_URI}), not {Config.SQLALCHEMY_DATABASE_URI}")
+    from config.init_app import create_app
+    from config.extensions import db
+    from models import SaaSInvoice, Invoice, ExpenseType
+    from services.billing_service import BillingService
+    from services.cost_split_cache import cost_split_cache
+
+    app = create_app()
+    app.config['TESTING'] = True
+    results = {}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        tenant_ids = populate_database(db, generate_portfolio(n_establishments, seed))
+        client = app.test_client()
+        rng = random.Random(seed)
+        sampled = [rng.choice(tenant_ids) for _ in range(min(samples, len(tenant_ids)))]
+
+        def dashboard(latencies=None):
+            for user_id in sampled:
+                with client.session_transaction() as session:
+                    session['_user_id'] = str(user_id)
+                    session['_fresh'] = True
+                start = time.perf_counter()
+                response = client.get('/dashboard')
+                if latencies is not None:
+                    latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"/dashboard returned {response.status_code}")
+
+        # Cold (empty cost-split cache) then warm
+        for label in ('dashboard_cold', 'dashboard_warm'):
+            if label == 'dashboard_cold':
+                cost_split_cache.clear()
+            latencies = []
+            start = time.perf_counter()
+            dashboard(latencies)
+            results[label] = summarize(latencies, time.perf_counter() - start, len(sampled), None)
+        if with_memory:
+            cost_split_cache.clear()
+            results['dashboard_cold']['peak_memory_bytes'] = measure_peak_memory(dashboard)
+
+        def reset_billing():
+            SaaSInvoice.query.delete()
+            Invoice.query.filter_by(type=ExpenseType.SAAS).delete()
+            db.session.commit()
+
+        latencies = []
+        for _ in range(repeat):
+            reset_billing()
+            start = time.perf_counter()
+            BillingService.generate_monthly_invoices()
+            latencies.append(time.perf_counter() - start)
+        results['saas_billing'] = summarize(latencies, sum(latencies), n_establishments * repeat, None)
+        if with_memory:
+            reset_billing()
+            results['saas_billing']['peak_memory_bytes'] = measure_peak_memory(BillingService.generate_monthly_invoices)
+
+        db.session.remove()
+        db.drop_all()
+    return results
+
+
+def run(sizes, seed=0, db_limit=2000, samples=200, repeat=3, with_memory=True):
+    report = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'results': [],
+    }
+    for size in sizes:
+        establishments, invoices = generate_portfolio(size, seed)
+        entry = {
+            'establishments': size,
+            'rooms': sum(len(est.rooms) for est in establishments),
+            'invoices': len(invoices),
+            'scalar_calculate': bench_scalar(establishments, invoices, with_memory),
+            'batch_calculate': bench_batch(establishments, invoices, with_memory, repeat),
+        }
+        if size <= db_limit:
+            entry.update(bench_database(size, seed, samples, with_memory, repeat))
+        report['results'].append(entry)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RentPilot cost splitter / month-close benchmarks")
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma separated portfolio sizes (number of establishments)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--db-limit', type=int, default=2000,
+                        help="Largest portfolio loaded in the database for the dashboard/billing benchmarks")
+    parser.add_argument('--samples', type=int, default=200, help="Dashboard requests per size")
+    parser.add_argument('--repeat', type=int, default=3, help="Repetitions for the batch and billing benchmarks")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc peak memory pass")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    # The dashboard benchmark drops and recreates its tables: always a throwaway SQLite database,
+    # whatever DB_URI the shell exports (read when config.settings is imported).
+    os.environ['DB_URI'] = BENCH_DB_URI
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    report = run(sizes, seed=args.seed, db_limit=args.db_limit, samples=args.samples,
+                 repeat=args.repeat, with_memory=not args.no_memory)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == '__main__':
+    main()
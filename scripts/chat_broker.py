@@ -0,0 +1,42 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: chat_broker.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+# Local relay shared by the web workers for live chat delivery (SSE).
+# Every worker started with CHAT_PUBSUB_URL=tcp://host:port connects to it; a message published
+# by one worker is relayed to all of them.
+#
+# The relay has no authentication: it listens on 127.0.0.1 unless --host says otherwise, which
+# should only ever be an address of a private network shared with the workers.
+#
+# Usage:
+#     python scripts/chat_broker.py                       # tcp://127.0.0.1:7878
+#     python scripts/chat_broker.py --port 7900 --queue-size 5000
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RentPilot chat pub/sub relay")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7878)
+    parser.add_argument('--queue-size', type=int, default=1000,
+                        help="Frames buffered per worker before a lagging worker is disconnected")
+    args = parser.parse_args(argv)
+
+    from services.chat_hub import ChatBroker
+
+    with ChatBroker((args.host, args.port), queue_size=args.queue_size) as broker:
+        print(f"Chat broker listening on {broker.url}")
+        try:
+            broker.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: plan_chores.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+# Weekly cron: plans the rotating chores of every establishment in one batch.
+# With --horizon-weeks, pre-generates several weeks at once with load balancing
+# (services.chore_service.plan_horizon), so the cron can run less often.
+#
+# Usage:
+#     python scripts/plan_chores.py                   # all establishments
+#     python scripts/plan_chores.py --establishment 3 --establishment 7
+#     python scripts/plan_chores.py --horizon-weeks 6
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Weekly chore planning for all establishments")
+    parser.add_argument('--establishment', type=int, action='append', help="Limit the run to these establishments")
+    parser.add_argument('--chunk-size', type=int, default=1000, help="Rows per bulk insert")
+    parser.add_argument('--horizon-weeks', type=int, help="Pre-generate this many weeks (fairness balanced)")
+    args = parser.parse_args(argv)
+
+    from config.init_app import create_app
+    from config.extensions import db
+    from models.chores import ChoreType
+    from services.chore_service import generate_planning_batch, plan_horizon
+
+    app = create_app()
+    with app.app_context():
+        if args.horizon_weeks:
+            est_ids = args.establishment or [row[0] for row in db.session.query(ChoreType.establishment_id)
+                                             .filter(ChoreType.is_rotating == True).distinct()]
+            created = sum(plan_horizon(est_id, weeks=args.horizon_weeks) for est_id in est_ids)
+        else:
+            created = generate_planning_batch(args.establishment, chunk_size=args.chunk_size)
+        print(f"Created {created} events.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: process_pending_media.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+# Recovery for the chat media pipeline: the worker pool lives in the web process, so images
+# still pending after a restart (or failed) are processed here, synchronously.
+#
+# Usage:
+#     python scripts/process_pending_media.py
+#     python scripts/process_pending_media.py --retry-failed
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process chat images left pending by the media pipeline")
+    parser.add_argument('--retry-failed', action='store_true', help="Also retry the images that failed")
+    args = parser.parse_args(argv)
+
+    from config.init_app import create_app
+    from config.extensions import db
+    from models.communication import Message, MediaStatus
+    from services.chat_media_service import ChatMediaService
+
+    app = create_app()
+    with app.app_context():
+        statuses = [MediaStatus.PENDING, MediaStatus.PROCESSING]
+        if args.retry_failed:
+            statuses.append(MediaStatus.FAILED)
+        ids = [msg_id for (msg_id,) in db.session.query(Message.id).filter(Message.media_status.in_(statuses))]
+        # Interrupted runs are restarted from scratch
+        Message.query.filter(Message.id.in_(ids), Message.media_status == MediaStatus.PROCESSING)\
+            .update({Message.media_status: MediaStatus.PENDING}, synchronize_session=False)
+        db.session.commit()
+
+        for msg_id in ids:
+            ChatMediaService.process_message_media(msg_id)
+        print(f"Processed {len(ids)} images.")
+
+if __name__ == '__main__':
+    main()
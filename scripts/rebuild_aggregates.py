@@ -0,0 +1,59 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: rebuild_aggregates.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+# Repair command for the pre-aggregated tables, which are normally maintained incrementally:
+#   - charge_ledgers (LedgerService)
+#   - landlord_portfolio_summaries (PortfolioSummaryService)
+#   - chore_events.validation_count (chore consensus counters)
+#   - message_reads / chat_read_states, from the legacy messages.read_by_users JSON receipts
+#   - chat_read_states.unread_count (chat unread badges)
+#
+# Run it after the first deployment of these tables, or after bulk SQL edits that
+# bypassed the application.
+#
+# Usage:
+#     python scripts/rebuild_aggregates.py                  # everything
+#     python scripts/rebuild_aggregates.py --only portfolio --landlord 12
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild RentPilot aggregate tables")
+    parser.add_argument('--only', choices=['ledger', 'portfolio', 'chores', 'chat'], help="Rebuild a single aggregate")
+    parser.add_argument('--establishment', type=int, help="Limit the ledger rebuild to one establishment")
+    parser.add_argument('--landlord', type=int, action='append', help="Limit the portfolio rebuild to these landlords")
+    args = parser.parse_args(argv)
+
+    from config.init_app import create_app
+    from services.ledger_service import LedgerService
+    from services.portfolio_summary_service import PortfolioSummaryService
+    from services.chore_service import recount_validations
+    from services.chat_service import ChatService
+    from services.unread_counter_service import UnreadCounterService
+
+    app = create_app()
+    with app.app_context():
+        if args.only in (None, 'ledger'):
+            rows = LedgerService.rebuild(args.establishment)
+            print(f"charge_ledgers: {rows} rows rebuilt")
+        if args.only in (None, 'portfolio'):
+            rows = PortfolioSummaryService.rebuild(args.landlord)
+            print(f"landlord_portfolio_summaries: {rows} rows rebuilt")
+        if args.only in (None, 'chores'):
+            rows = recount_validations()
+            print(f"chore_events: {rows} validation counters recomputed")
+        if args.only in (None, 'chat'):
+            rows = ChatService.migrate_legacy_receipts()
+            print(f"message_reads: {rows} legacy receipts migrated")
+            rows = UnreadCounterService.rebuild()
+            print(f"chat_read_states: {rows} unread counters recomputed")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: release_ended_leases.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+# Daily cron: frees the rooms of leases ended with a future date once that date has passed
+# (services.lease_service.LeaseService.release_ended_leases).
+#
+# Usage:
+#     python scripts/release_ended_leases.py
+#     python scripts/release_ended_leases.py --date 2026-11-01
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mark vacant the rooms whose leases have ended")
+    parser.add_argument('--date', help="Reference day (YYYY-MM-DD), default today")
+    args = parser.parse_args(argv)
+    today = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else None
+
+    from config.init_app import create_app
+    from services.lease_service import LeaseService
+
+    app = create_app()
+    with app.app_context():
+        freed = LeaseService.release_ended_leases(today)
+        print(f"Freed {freed} rooms.")
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ from models.establishment import Establishment, SaaSBilledTo
 from models.finance import SaaSInvoice, SaaSInvoiceStatus, Invoice, ExpenseType, PaymentMethod
 from models.saas_config import SubscriptionPlan
 from services.upload_service import UploadService
+from services.ledger_service import LedgerService
 
 class BillingService:
     @staticmethod
@@ -58,6 +59,7 @@ class BillingService:
                     description=f"Abonnement RentPilot ({plan.name})"
                 )
                 db.session.add(internal_invoice)
+                LedgerService.record_invoice(internal_invoice)
 
             generated_count += 1
 
@@ -0,0 +1,109 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: blob_store.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import hashlib
+import os
+import re
+import tempfile
+from sqlalchemy.exc import IntegrityError
+from config.extensions import db
+from models.storage import StoredBlob
+from services.storage_backend import storage
+
+class BlobStore:
+    """
+    Content-addressed upload storage: key `blobs/ab/cd/<sha256>.<ext>`, one object per distinct content,
+    in the configured storage backend (local directory or bucket).
+
+    The SHA-256 is computed while the upload streams to a temporary file, so the content is read
+    once and never held in memory. Storing a content that already exists drops the temporary file
+    and adds a reference to the existing blob; release() removes a reference and deletes the object
+    with the last one. Changes are flushed, not committed: they belong to the caller's transaction.
+    """
+    CHUNK_SIZE = 64 * 1024
+    # Blob key at the end of a key or of a URL built from it (storage.url, CDN, bucket)
+    KEY_PATTERN = re.compile(r'blobs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+
+    @staticmethod
+    def key_for(sha256: str, ext: str) -> str:
+        return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}"
+
+    @staticmethod
+    def put(stream, ext: str) -> StoredBlob:
+        """Stores the content of a binary stream (from its current position); returns its blob."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=storage.scratch_dir())
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: stream.read(BlobStore.CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            return BlobStore._commit_file(tmp_path, digest.hexdigest(), size, ext.lower())
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def _commit_file(tmp_path, sha256, size, ext):
+        blob = db.session.get(StoredBlob, sha256)
+        if blob is not None and storage.exists(blob.path):
+            BlobStore._add_reference(sha256)
+            return blob
+
+        if blob is not None:
+            # Row without its object (deleted by hand, failed restore): put the content back
+            storage.save_file(blob.path, tmp_path)
+            BlobStore._add_reference(sha256)
+            return blob
+
+        key = BlobStore.key_for(sha256, ext)
+        # Same content -> same key: replacing an orphan object left by a rolled back upload is harmless
+        storage.save_file(key, tmp_path)
+        try:
+            with db.session.begin_nested():
+                blob = StoredBlob(sha256=sha256, path=key, size=size, ref_count=1)
+                db.session.add(blob)
+        except IntegrityError:
+            # Stored concurrently by another request
+            BlobStore._add_reference(sha256)
+            blob = db.session.get(StoredBlob, sha256)
+        return blob
+
+    @staticmethod
+    def _add_reference(sha256):
+        StoredBlob.query.filter(StoredBlob.sha256 == sha256)\
+            .update({StoredBlob.ref_count: StoredBlob.ref_count + 1}, synchronize_session=False)
+        blob = db.session.get(StoredBlob, sha256)
+        if blob is not None:
+            db.session.refresh(blob, ['ref_count'])
+
+    @staticmethod
+    def release(path: str) -> bool:
+        """
+        Drops one reference to the blob stored at `path` (its key, or a URL built from it); the object
+        and its row go with the last one. Returns True if the object was deleted. Keys that are not
+        blobs (legacy uploads, external URLs) are ignored.
+        """
+        match = BlobStore.KEY_PATTERN.search(path or '')
+        if match is None:
+            return False
+        path = match.group(0)
+        blob = StoredBlob.query.filter_by(path=path).first()
+        if blob is None:
+            return False
+        StoredBlob.query.filter(StoredBlob.sha256 == blob.sha256)\
+            .update({StoredBlob.ref_count: StoredBlob.ref_count - 1}, synchronize_session=False)
+        db.session.refresh(blob, ['ref_count'])
+        if blob.ref_count > 0:
+            return False
+
+        db.session.delete(blob)
+        db.session.flush()
+        storage.delete(path)
+        return True
@@ -0,0 +1,303 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: chat_hub.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import json
+import queue
+import socket
+import socketserver
+import threading
+from typing import Dict, Optional, Set
+from urllib.parse import urlparse
+
+class Subscription:
+    """Bounded mailbox of one SSE client for one chat room."""
+
+    def __init__(self, hub, room_id: int, maxsize: int):
+        self.hub = hub
+        self.room_id = room_id
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.closed = False
+
+    def put(self, event: dict):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Slow client: drop it, the browser reconnects and catches up with Last-Event-ID
+            self.close()
+
+    def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.hub._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class InProcessBackend:
+    """Delivers the events to the subscribers of this process only (single worker, tests)."""
+
+    def start(self, dispatch):
+        self._dispatch = dispatch
+
+    def publish(self, room_id: int, event: dict):
+        self._dispatch(room_id, event)
+
+    def close(self):
+        pass
+
+class SocketBrokerBackend:
+    """
+    Shares the events between worker processes through a ChatBroker (tcp://host:port).
+    Every published frame is relayed by the broker to all the connected workers, the publisher
+    included, so local delivery always goes through the same path.
+    """
+
+    def __init__(self, url: str, reconnect_delay: float = 1.0):
+        parsed = urlparse(url)
+        if parsed.scheme != 'tcp' or not parsed.hostname or not parsed.port:
+            raise ValueError(f"Unsupported CHAT_PUBSUB_URL: {url} (expected tcp://host:port)")
+        self.address = (parsed.hostname, parsed.port)
+        self.reconnect_delay = reconnect_delay
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self, dispatch):
+        self._dispatch = dispatch
+        self._reader = threading.Thread(target=self._read_loop, name='chat-hub-reader', daemon=True)
+        self._reader.start()
+
+    def wait_connected(self, timeout: float = None) -> bool:
+        return self._connected.wait(timeout)
+
+    def publish(self, room_id: int, event: dict):
+        frame = (json.dumps({'room_id': room_id, 'event': event}) + '\n').encode('utf-8')
+        with self._send_lock:
+            sock = self._sock
+            if sock is not None:
+                try:
+                    sock.sendall(frame)
+                    return
+                except OSError as e:
+                    print(f"Chat broker send failed: {e}")
+        # Broker unreachable: at least the clients of this worker get the message
+        self._dispatch(room_id, event)
+
+    def close(self):
+        self._stopped.set()
+        with self._send_lock:
+            if self._sock is not None:
+                try:
+                    self._sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                self._sock.close()
+                self._sock = None
+        self._connected.clear()
+
+    def _read_loop(self):
+        while not self._stopped.is_set():
+            try:
+                sock = socket.create_connection(self.address)
+            except OSError as e:
+                print(f"Chat broker unreachable at {self.address}: {e}")
+                self._stopped.wait(self.reconnect_delay)
+                continue
+
+            with self._send_lock:
+                self._sock = sock
+            self._connected.set()
+            try:
+                for line in sock.makefile('rb'):
+                    frame = json.loads(line)
+                    self._dispatch(frame['room_id'], frame['event'])
+            except (OSError, ValueError) as e:
+                if not self._stopped.is_set():
+                    print(f"Chat broker connection lost: {e}")
+            finally:
+                self._connected.clear()
+                with self._send_lock:
+                    if self._sock is sock:
+                        self._sock = None
+                sock.close()
+            self._stopped.wait(self.reconnect_delay)
+
+class ChatHub:
+    """
+    In-process pub/sub feeding the chat SSE streams: `send_message` publishes, each open stream
+    holds a Subscription. The backend decides how far an event travels (this process, or every
+    worker connected to the same broker).
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.backend = None
+        self.set_backend(InProcessBackend())
+
+    def init_app(self, app):
+        self.queue_size = app.config.get('CHAT_STREAM_QUEUE_SIZE', self.queue_size)
+        url = app.config.get('CHAT_PUBSUB_URL')
+        self.set_backend(SocketBrokerBackend(url) if url else InProcessBackend())
+
+    def set_backend(self, backend):
+        if self.backend is not None:
+            self.backend.close()
+        self.backend = backend
+        backend.start(self._dispatch)
+
+    def subscribe(self, room_id: int) -> Subscription:
+        subscription = Subscription(self, room_id, self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(room_id, set()).add(subscription)
+        return subscription
+
+    def publish(self, room_id: int, event: dict):
+        self.backend.publish(room_id, event)
+
+    def subscriber_count(self, room_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(room_id, ()))
+
+    def _unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.room_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.room_id]
+
+    def _dispatch(self, room_id: int, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(room_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+chat_hub = ChatHub()
+
+class _BrokerClient:
+    """One connected worker: frames are queued by the relay and written by its own thread."""
+
+    def __init__(self, broker, connection, wfile, maxsize: int):
+        self.broker = broker
+        self.connection = connection
+        self.wfile = wfile
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def put(self, line: bytes) -> bool:
+        try:
+            self._queue.put_nowait(line)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _write_loop(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                return
+            try:
+                self.wfile.write(line)
+                self.wfile.flush()
+            except OSError:
+                self.broker._remove(self)
+                return
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        broker = self.server
+        client = _BrokerClient(broker, self.connection, self.wfile, broker.queue_size)
+        broker._add(client)
+        try:
+            for line in self.rfile:
+                broker._relay(line)
+        finally:
+            broker._remove(client)
+            client._writer.join(timeout=1)
+
+class ChatBroker(socketserver.ThreadingTCPServer):
+    """
+    Minimal stand-in for an external broker: relays every newline-delimited frame it receives to
+    all the connected workers. Run it with scripts/chat_broker.py.
+
+    Each worker has its own bounded queue and writer thread: a worker that stops reading only
+    fills its own queue, and is disconnected when it is full (it reconnects by itself), instead
+    of stalling the relay for everybody. The relay has no authentication: keep it on 127.0.0.1
+    or a private network.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 7878), queue_size: int = 1000):
+        super().__init__(address, _BrokerHandler)
+        self.queue_size = queue_size
+        self._clients = set()
+        self._clients_lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"tcp://{host}:{port}"
+
+    @property
+    def client_count(self) -> int:
+        with self._clients_lock:
+            return len(self._clients)
+
+    def _add(self, client):
+        with self._clients_lock:
+            self._clients.add(client)
+
+    def _remove(self, client):
+        with self._clients_lock:
+            self._clients.discard(client)
+        client.close()
+
+    def _relay(self, line: bytes):
+        # Only enqueues under the lock: each frame lands whole, in order, in every client's queue
+        with self._clients_lock:
+            lagging = [client for client in self._clients if not client.put(line)]
+        for client in lagging:
+            self._drop(client)
+
+    def _drop(self, client):
+        """Disconnects a worker that no longer reads; its backend reconnects."""
+        self._remove(client)
+        try:
+            # Also ends its handler, blocked on the read side
+            client.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+def format_sse(data: dict, event: str = None, event_id: int = None) -> str:
+    """One Server-Sent Events frame."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
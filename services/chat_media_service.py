@@ -6,16 +6,25 @@
 * Fait par : Aisance KALONJI, www.aisancekalonji.com
 * Auditer par : La CyberConfiance, www.cyberconfiance.com
 """
-import os
-import uuid
-from datetime import datetime
+import io
 from PIL import Image
 from werkzeug.datastructures import FileStorage
+from config.extensions import db
+from models.communication import Message, MediaStatus
 from services.upload_service import UploadService
+from services.blob_store import BlobStore
+from services.image_variant_service import ImageVariantService
+from services.chat_hub import chat_hub
+from services.chat_service import ChatService
 
 class ChatMediaService:
     ALLOWED_EXTENSIONS_IMG = {'png', 'jpg', 'jpeg', 'heic'}
-    ALLOWED_EXTENSIONS_AUDIO = {'mp3', 'wav'}
+    # webm / ogg: what MediaRecorder produces for browser voice notes
+    ALLOWED_EXTENSIONS_AUDIO = {'mp3', 'wav', 'webm', 'ogg'}
+    MAX_FILE_SIZE_IMG = 15 * 1024 * 1024
+    MAX_FILE_SIZE_AUDIO = 20 * 1024 * 1024
+    # Decodable with Pillow alone (HEIC requires extra libs not guaranteed)
+    PROCESSABLE_EXTENSIONS_IMG = {'png', 'jpg', 'jpeg'}
 
     @staticmethod
     def allowed_file(filename: str) -> bool:
@@ -26,10 +35,16 @@ class ChatMediaService:
                ext in ChatMediaService.ALLOWED_EXTENSIONS_AUDIO
 
     @staticmethod
-    def process_and_save(file_storage: FileStorage, subfolder: str = 'chat') -> str:
+    def max_size(ext: str) -> int:
+        if ext.lower() in ChatMediaService.ALLOWED_EXTENSIONS_AUDIO:
+            return ChatMediaService.MAX_FILE_SIZE_AUDIO
+        return ChatMediaService.MAX_FILE_SIZE_IMG
+
+    @staticmethod
+    def process_and_save(file_storage: FileStorage) -> str:
         """
         Saves a file. Compresses if it's an image.
-        Returns the relative path to the saved file.
+        Returns the storage key of the saved file.
         """
         if not file_storage or not file_storage.filename:
             raise ValueError("No file provided")
@@ -38,13 +53,7 @@ class ChatMediaService:
             raise ValueError("File type not allowed")
 
         ext = file_storage.filename.rsplit('.', 1)[1].lower()
-
-        # Directory setup using UploadService configuration
-        target_dir = os.path.join(UploadService.UPLOAD_FOLDER, subfolder)
-        os.makedirs(target_dir, exist_ok=True)
-
-        unique_name = f"{uuid.uuid4().hex}_{int(datetime.now().timestamp())}.{ext}"
-        file_path = os.path.join(target_dir, unique_name)
+        UploadService.validate_file(file_storage, ext, ChatMediaService.max_size(ext))
 
         if ext in ChatMediaService.ALLOWED_EXTENSIONS_IMG and ext != 'heic':
             # Compress Image (Skip HEIC as it requires extra libs not guaranteed)
@@ -57,14 +66,71 @@ class ChatMediaService:
                     img = img.convert('RGB')
 
                 # Save with compression
-                img.save(file_path, optimize=True, quality=70)
+                compressed = io.BytesIO()
+                img.save(compressed, format=img.format or ext.upper(), optimize=True, quality=70)
+                compressed.seek(0)
+                return BlobStore.put(compressed, ext).path
             except Exception as e:
                 print(f"Image compression failed: {e}. Saving original.")
-                file_storage.seek(0)
-                file_storage.save(file_path)
+
+        # Audio or HEIC - just save
+        file_storage.seek(0) # Ensure we are at start
+        return BlobStore.put(file_storage.stream, ext).path
+
+    @staticmethod
+    def save_raw(file_storage: FileStorage) -> str:
+        """
+        Stores the upload as received (no decoding, content-addressed), for the media pipeline to
+        process later. Returns the storage key of the raw file. Size and type are checked while it streams.
+        """
+        if not file_storage or not file_storage.filename:
+            raise ValueError("No file provided")
+
+        if not ChatMediaService.allowed_file(file_storage.filename):
+            raise ValueError("File type not allowed")
+
+        ext = file_storage.filename.rsplit('.', 1)[1].lower()
+        file_storage.seek(0)
+        stream = UploadService.checked_stream(file_storage.stream, ext, ChatMediaService.max_size(ext))
+        return BlobStore.put(stream, ext).path
+
+    @staticmethod
+    def needs_processing(filename: str) -> bool:
+        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        return ext in ChatMediaService.PROCESSABLE_EXTENSIONS_IMG
+
+    @staticmethod
+    def process_message_media(message_id: int):
+        """
+        Media pipeline task: builds the renditions of a message image (the full JPEG one becomes the
+        message file) and publishes the update to the chat stream. On failure the raw upload stays.
+        """
+        msg = db.session.get(Message, message_id)
+        if msg is None or msg.media_status not in (MediaStatus.PENDING, MediaStatus.FAILED):
+            return
+        msg.media_status = MediaStatus.PROCESSING
+        db.session.commit()
+
+        raw_path = msg.file_url
+        try:
+            # Renditions are blobs too: a duplicate upload references the same files
+            variants = ImageVariantService.generate(raw_path)
+        except Exception as e:
+            print(f"Image processing failed for message {message_id}: {e}. Keeping original.")
+            db.session.rollback()
+            msg.media_status = MediaStatus.FAILED
         else:
-            # Audio or HEIC - just save
-            file_storage.seek(0) # Ensure we are at start
-            file_storage.save(file_path)
+            msg.media_variants = variants
+            msg.file_url = variants['full']['jpeg']
+            msg.media_status = MediaStatus.READY
+        db.session.commit()
+
+        if msg.media_status == MediaStatus.READY:
+            # The message no longer points to the raw upload
+            BlobStore.release(raw_path)
+            db.session.commit()
 
-        return file_path
\ No newline at end of file
+        chat_hub.publish(msg.chat_room_id, {
+            'type': 'media',
+            'message': ChatService.serialize_message(msg, ChatService.read_receipts([msg.id]).get(msg.id))
+        })
@@ -7,41 +7,210 @@
 * Auditer par : La CyberConfiance, www.cyberconfiance.com
 """
 from config.extensions import db
-from models.communication import Message
+from models.communication import Message, MessageRead, ChatReadState, ChannelType
+from models.establishment import EstablishmentOwner
+from services.tenant_index import tenant_index
 from datetime import datetime
+from sqlalchemy import and_, or_, func, insert, literal
+from sqlalchemy.exc import IntegrityError
 
 class ChatService:
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 100
+
+    @staticmethod
+    def encode_cursor(msg: Message) -> str:
+        return f"{msg.timestamp.isoformat()}_{msg.id}"
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        """(timestamp, id) from a cursor; raises ValueError if it is malformed."""
+        timestamp, _, msg_id = cursor.rpartition('_')
+        return datetime.fromisoformat(timestamp), int(msg_id)
+
+    @staticmethod
+    def get_messages_page(room_id: int, before: str = None, limit: int = None):
+        """
+        Keyset pagination of a room's history, newest first.
+        Returns (messages in chronological order, cursor of the next older page or None).
+        """
+        limit = min(limit or ChatService.PAGE_SIZE, ChatService.MAX_PAGE_SIZE)
+        query = Message.query.filter(Message.chat_room_id == room_id)
+        if before:
+            timestamp, msg_id = ChatService.decode_cursor(before)
+            query = query.filter(or_(
+                Message.timestamp < timestamp,
+                and_(Message.timestamp == timestamp, Message.id < msg_id)
+            ))
+
+        # One extra row tells whether an older page exists
+        rows = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        messages = rows[:limit][::-1]
+        next_cursor = ChatService.encode_cursor(messages[0]) if has_more else None
+        return messages, next_cursor
+
+    @staticmethod
+    def serialize_message(msg: Message, read_by=None) -> dict:
+        return {
+            'id': msg.id,
+            'sender_id': msg.sender_id,
+            'type': msg.type.value,
+            'content': msg.content,
+            'file_url': msg.file_url,
+            'duration': msg.duration,
+            'timestamp': msg.timestamp.isoformat(),
+            'media_status': msg.media_status.value if msg.media_status else None,
+            'media_variants': msg.media_variants or {},
+            'read_by': list(read_by or [])
+        }
+
+    @staticmethod
+    def participant_ids(chat_room) -> set:
+        """Users of a room: tenants living in the establishment today, plus the landlords for GENERAL rooms."""
+        participant_ids = set()
+        if chat_room.establishment_id:
+            # Tenants living there today (cached active-tenant index)
+            participant_ids.update(tenant_index.get(chat_room.establishment_id))
+
+            # Landlords (if General)
+            if chat_room.type == ChannelType.GENERAL:
+                owners = db.session.query(EstablishmentOwner.user_id)\
+                    .filter(EstablishmentOwner.establishment_id == chat_room.establishment_id)
+                participant_ids.update(user_id for (user_id,) in owners)
+        return participant_ids
+
+    @staticmethod
+    def read_receipts(message_ids) -> dict:
+        """{message_id: [reader ids, in reading order]} for a page of messages, in one query."""
+        receipts = {}
+        if not message_ids:
+            return receipts
+        rows = db.session.query(MessageRead.message_id, MessageRead.user_id)\
+            .filter(MessageRead.message_id.in_(message_ids)).order_by(MessageRead.read_at, MessageRead.id)
+        for message_id, user_id in rows:
+            receipts.setdefault(message_id, []).append(user_id)
+        return receipts
+
     @staticmethod
     def mark_message_as_read(msg_id: int, user_id: int) -> bool:
         """
-        Marks a message as read by a specific user.
-        Adds the user ID and timestamp to the read_by_users JSON field.
+        Marks a message as read by a specific user, through mark_read_up_to so that the
+        room high-water mark and unread counter follow (earlier messages count as seen).
+        Returns False if the message does not exist or nothing was left to mark.
         """
-        msg = Message.query.get(msg_id)
-        if not msg:
+        room_id = db.session.query(Message.chat_room_id).filter(Message.id == msg_id).scalar()
+        if room_id is None:
             return False
+        return bool(ChatService.mark_read_up_to(room_id, user_id, msg_id))
 
-        # read_by_users is a list of dicts
-        current_reads = msg.read_by_users
-        if current_reads is None:
-            current_reads = []
+    @staticmethod
+    def mark_read_up_to(room_id: int, user_id: int, message_id: int):
+        """
+        Marks every message of the room up to `message_id` (history order) as read by the user:
+        one INSERT ... SELECT for the missing receipts and a move of the high-water mark.
+        Returns the number of receipts created, or None if the message is not in the room.
+        """
+        target = db.session.query(Message.id, Message.timestamp)\
+            .filter(Message.id == message_id, Message.chat_room_id == room_id).first()
+        if target is None:
+            return None
 
-        # Check if user already read
-        for entry in current_reads:
-            if isinstance(entry, dict) and entry.get('user_id') == user_id:
-                return False # Already read
+        for attempt in range(2):
+            try:
+                with db.session.begin_nested():
+                    created = ChatService._insert_receipts_up_to(room_id, user_id, target)
+                    state = db.session.get(ChatReadState, (user_id, room_id))
+                    if state is None:
+                        state = ChatReadState(user_id=user_id, chat_room_id=room_id)
+                        db.session.add(state)
+                    if state.last_read_message_id is None or \
+                            (target.timestamp, target.id) > (state.last_read_timestamp, state.last_read_message_id):
+                        state.last_read_message_id = target.id
+                        state.last_read_timestamp = target.timestamp
+                        # Exact recount from the new mark (badge counter)
+                        state.unread_count = ChatService.unread_count(room_id, user_id)
+                break
+            except IntegrityError:
+                # A concurrent call inserted the same receipts: what is left is visible now
+                if attempt:
+                    raise
+        db.session.commit()
+        return created
 
-        # Append new read entry
-        new_entry = {
-            "user_id": user_id,
-            "read_at": datetime.utcnow().isoformat()
-        }
+    @staticmethod
+    def _insert_receipts_up_to(room_id, user_id, target):
+        state = ChatReadState.__table__.c
+        already_read = db.session.query(MessageRead.id).filter(
+            MessageRead.message_id == Message.id, MessageRead.user_id == user_id
+        ).exists()
+        pending = db.session.query(Message.id, literal(user_id), literal(datetime.utcnow())).filter(
+            Message.chat_room_id == room_id,
+            Message.sender_id != user_id,
+            or_(Message.timestamp < target.timestamp,
+                and_(Message.timestamp == target.timestamp, Message.id <= target.id)),
+            ~already_read
+        )
+        # Messages before the current high-water mark are already covered
+        mark = db.session.query(state.last_read_timestamp, state.last_read_message_id)\
+            .filter(state.user_id == user_id, state.chat_room_id == room_id).first()
+        if mark and mark[1] is not None:
+            pending = pending.filter(ChatService._after(*mark))
 
-        # Create a new list to ensure SQLAlchemy detects the change
-        updated_reads = list(current_reads)
-        updated_reads.append(new_entry)
+        result = db.session.execute(
+            insert(MessageRead).from_select(['message_id', 'user_id', 'read_at'], pending)
+        )
+        return result.rowcount
 
-        msg.read_by_users = updated_reads
-        db.session.commit()
+    @staticmethod
+    def _after(timestamp, msg_id):
+        """Messages after (timestamp, id) in history order."""
+        return or_(Message.timestamp > timestamp, and_(Message.timestamp == timestamp, Message.id > msg_id))
+
+    @staticmethod
+    def unread_count(room_id: int, user_id: int) -> int:
+        """Messages of others after the user's high-water mark: one query on the room's history index."""
+        return db.session.query(func.count(Message.id)).outerjoin(
+            ChatReadState, and_(ChatReadState.chat_room_id == Message.chat_room_id, ChatReadState.user_id == user_id)
+        ).filter(
+            Message.chat_room_id == room_id,
+            Message.sender_id != user_id,
+            or_(ChatReadState.last_read_message_id.is_(None),
+                Message.timestamp > ChatReadState.last_read_timestamp,
+                and_(Message.timestamp == ChatReadState.last_read_timestamp,
+                     Message.id > ChatReadState.last_read_message_id))
+        ).scalar()
+
+    @staticmethod
+    def migrate_legacy_receipts() -> int:
+        """
+        One-off: copies the legacy Message.read_by_users JSON receipts into MessageRead and sets each
+        user's high-water mark to the newest message they had read. Returns the receipts created.
+        """
+        existing = set(db.session.query(MessageRead.message_id, MessageRead.user_id))
+        marks = {}
+        created = 0
+        rows = db.session.query(Message.id, Message.chat_room_id, Message.timestamp, Message.read_by_users)\
+            .filter(Message.read_by_users.isnot(None))
+        for msg_id, room_id, timestamp, read_by in rows:
+            for entry in read_by or []:
+                if not isinstance(entry, dict) or entry.get('user_id') is None:
+                    continue
+                user_id = entry['user_id']
+                if (msg_id, user_id) not in existing:
+                    read_at = entry.get('read_at')
+                    db.session.add(MessageRead(message_id=msg_id, user_id=user_id,
+                                               read_at=datetime.fromisoformat(read_at) if read_at else timestamp))
+                    existing.add((msg_id, user_id))
+                    created += 1
+                key = (user_id, room_id)
+                if key not in marks or (timestamp, msg_id) > marks[key]:
+                    marks[key] = (timestamp, msg_id)
 
-        return True
\ No newline at end of file
+        for (user_id, room_id), (timestamp, msg_id) in marks.items():
+            state = db.session.get(ChatReadState, (user_id, room_id))
+            if state is None:
+                db.session.add(ChatReadState(user_id=user_id, chat_room_id=room_id,
+                                             last_read_message_id=msg_id, last_read_timestamp=timestamp))
+        db.session.commit()
+        return created
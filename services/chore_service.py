@@ -11,35 +11,21 @@ from config.extensions import db
 from models.chores import ChoreType, ChoreEvent, ChoreValidation, ChoreStatus
 from models.establishment import Establishment, Lease, Room
 from models.users import User
-from sqlalchemy import func
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from algorithms.chore_scheduler import FairChoreScheduler, covers, occurrences
+from services.tenant_index import tenant_index
 
 def get_active_tenants(establishment_id):
     """
-    Returns a list of active tenants (Users) for the given establishment.
-    Checks for active leases.
+    Returns a list of active tenants (Users) for the given establishment, sorted by id.
+    Tenant ids come from the cached active-tenant index (services/tenant_index.py);
+    callers that only need ids or a count should use tenant_index.get() directly.
     """
-    # Find rooms in the establishment
-    rooms = Room.query.filter_by(establishment_id=establishment_id).all()
-    room_ids = [r.id for r in rooms]
-
-    if not room_ids:
+    tenant_ids = tenant_index.get(establishment_id)
+    if not tenant_ids:
         return []
-
-    # Find active leases for these rooms
-    # Active means start_date <= today and (end_date is None or end_date >= today)
-    today = datetime.now().date()
-
-    active_leases = Lease.query.filter(
-        Lease.room_id.in_(room_ids),
-        Lease.start_date <= today,
-        (Lease.end_date == None) | (Lease.end_date >= today)
-    ).all()
-
-    tenants = [lease.tenant for lease in active_leases]
-    # Sort by ID to ensure consistent order for rotation
-    tenants.sort(key=lambda u: u.id)
-
-    return tenants
+    return User.query.filter(User.id.in_(tenant_ids)).order_by(User.id).all()
 
 def generate_planning(establishment_id):
     """
@@ -63,30 +49,7 @@ def generate_planning(establishment_id):
             last_event = ChoreEvent.query.filter_by(chore_type_id=chore.id)\
                 .order_by(ChoreEvent.due_date.desc()).first()
 
-            next_assignee = None
-
-            if not last_event:
-                # First time: assign to the first tenant in the list
-                next_assignee = active_tenants[0]
-            else:
-                # Find the index of the last assignee in the current active list
-                last_assignee_id = last_event.assigned_user_id
-
-                try:
-                    # Find index of user with this ID
-                    current_idx = next((i for i, u in enumerate(active_tenants) if u.id == last_assignee_id), -1)
-
-                    if current_idx == -1:
-                        # Last assignee is no longer active. Start from beginning? Or random?
-                        # Start from beginning seems safest.
-                        next_assignee = active_tenants[0]
-                    else:
-                        # Next index
-                        next_idx = (current_idx + 1) % len(active_tenants)
-                        next_assignee = active_tenants[next_idx]
-
-                except ValueError:
-                    next_assignee = active_tenants[0]
+            next_assignee = _next_assignee(active_tenants, last_event.assigned_user_id if last_event else None)
 
             # Create the event
             # Due date: For simplicity, let's say due in 'frequency_days' from now, or align with weeks.
@@ -111,9 +74,234 @@ def generate_planning(establishment_id):
     db.session.commit()
     return f"Created {len(events_created)} events."
 
+def _next_assignee(active_tenants, last_assignee_id):
+    """
+    Rotation rule: the tenant after the last assignee in the (id sorted) active list.
+    First time, or when the last assignee is no longer active, start from the beginning.
+    Works on User objects or on plain user ids.
+    """
+    if last_assignee_id is None:
+        return active_tenants[0]
+    ids = [getattr(t, 'id', t) for t in active_tenants]
+    current_idx = next((i for i, user_id in enumerate(ids) if user_id == last_assignee_id), -1)
+    if current_idx == -1:
+        return active_tenants[0]
+    return active_tenants[(current_idx + 1) % len(active_tenants)]
+
+def generate_planning_batch(establishment_ids=None, chunk_size=1000):
+    """
+    Weekly planning of every establishment (or of `establishment_ids`) in one run.
+    Same rotation as generate_planning(), with a fixed number of queries:
+    rotating chore types, active tenants (bulk tenant index lookup) and the latest event of
+    every chore type (ROW_NUMBER window) are each read once, the rotations are computed in memory and
+    the new ChoreEvents are bulk-inserted `chunk_size` rows at a time.
+
+    :return: Number of events created.
+    """
+    now = datetime.now()
+
+    # 1. Rotating chores
+    chore_query = db.session.query(ChoreType.id, ChoreType.establishment_id, ChoreType.frequency_days).filter(
+        ChoreType.is_rotating == True
+    )
+    if establishment_ids is not None:
+        chore_query = chore_query.filter(ChoreType.establishment_id.in_(establishment_ids))
+    chores = chore_query.order_by(ChoreType.id).all()
+
+    # 2. Active tenants of their establishments (bulk index lookup), sorted by user id
+    tenant_sets = tenant_index.get_many({chore.establishment_id for chore in chores})
+    tenants_by_est = {est_id: sorted(ids) for est_id, ids in tenant_sets.items() if ids}
+    chores = [chore for chore in chores if chore.establishment_id in tenants_by_est]
+    if not chores:
+        return 0
+
+    # 3. Latest event of every chore type, in a single window query
+    ranked = db.session.query(
+        ChoreEvent.chore_type_id.label('chore_type_id'),
+        ChoreEvent.assigned_user_id.label('assigned_user_id'),
+        func.row_number().over(
+            partition_by=ChoreEvent.chore_type_id,
+            order_by=(ChoreEvent.due_date.desc(), ChoreEvent.id.desc())
+        ).label('rank')
+    ).join(ChoreType, ChoreType.id == ChoreEvent.chore_type_id).filter(ChoreType.is_rotating == True)
+    if establishment_ids is not None:
+        ranked = ranked.filter(ChoreType.establishment_id.in_(establishment_ids))
+    ranked = ranked.subquery()
+    last_assignees = dict(db.session.query(ranked.c.chore_type_id, ranked.c.assigned_user_id).filter(ranked.c.rank == 1))
+
+    # 4. Rotations in memory, then chunked bulk inserts
+    rows = [{
+        'chore_type_id': chore.id,
+        'assigned_user_id': _next_assignee(tenants_by_est[chore.establishment_id], last_assignees.get(chore.id)),
+        'due_date': now + timedelta(days=chore.frequency_days),
+        'status': ChoreStatus.PENDING
+    } for chore in chores]
+
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(insert(ChoreEvent), rows[start:start + chunk_size])
+    db.session.commit()
+    return len(rows)
+
+def _tenant_periods(establishment_id):
+    """{user_id: [(start_date, end_date), ...]} for every lease of the establishment (past and future)."""
+    rows = db.session.query(Lease.user_id, Lease.start_date, Lease.end_date).join(Room, Room.id == Lease.room_id)\
+        .filter(Room.establishment_id == establishment_id).all()
+    periods = {}
+    for user_id, start, end in rows:
+        periods.setdefault(user_id, []).append((start, end))
+    return periods
+
+def _scheduler(periods, history, weights):
+    """FairChoreScheduler seeded with past assignments [(chore_type_id, user_id), ...] in due date order."""
+    load = {}
+    for chore_type_id, user_id in history:
+        load[user_id] = load.get(user_id, 0) + weights.get(chore_type_id, 1)
+    return FairChoreScheduler(periods, load, [user_id for _, user_id in history])
+
+def plan_horizon(establishment_id, weeks=4, now=None):
+    """
+    Pre-generates the rotating ChoreEvents of the next `weeks` weeks.
+    Each chore keeps its own rhythm (last due date + frequency_days, or now + frequency_days the
+    first time) and every occurrence goes to the least loaded active tenant (ChoreType.weight
+    accumulated over the last `weeks` weeks and the already planned events).
+    Safe to run again: planning resumes after the last existing event of each chore.
+
+    :return: Number of events created.
+    """
+    now = now or datetime.now()
+    horizon_end = now + timedelta(weeks=weeks)
+
+    periods = _tenant_periods(establishment_id)
+    chores = ChoreType.query.filter_by(establishment_id=establishment_id, is_rotating=True).order_by(ChoreType.id).all()
+    if not periods or not chores:
+        return 0
+    weights = {chore.id: chore.weight or 1 for chore in chores}
+
+    last_due = dict(db.session.query(ChoreEvent.chore_type_id, func.max(ChoreEvent.due_date))
+                    .filter(ChoreEvent.chore_type_id.in_(weights)).group_by(ChoreEvent.chore_type_id).all())
+    history = db.session.query(ChoreEvent.chore_type_id, ChoreEvent.assigned_user_id).filter(
+        ChoreEvent.chore_type_id.in_(weights),
+        ChoreEvent.due_date >= now - timedelta(weeks=weeks)
+    ).order_by(ChoreEvent.due_date, ChoreEvent.id).all()
+    scheduler = _scheduler(periods, history, weights)
+
+    planned = []
+    for chore in chores:
+        step = timedelta(days=max(chore.frequency_days or 1, 1))
+        first_due = last_due[chore.id] + step if chore.id in last_due else now + step
+        while first_due < now:
+            first_due += step
+        planned.extend((due, chore.id) for due in occurrences(first_due, chore.frequency_days, horizon_end))
+    planned.sort()
+
+    rows = []
+    for due, chore_type_id in planned:
+        user_id = scheduler.assign(due, weights[chore_type_id])
+        if user_id is not None:
+            rows.append({'chore_type_id': chore_type_id, 'assigned_user_id': user_id,
+                         'due_date': due, 'status': ChoreStatus.PENDING})
+
+    if rows:
+        db.session.execute(insert(ChoreEvent), rows)
+    db.session.commit()
+    return len(rows)
+
+def chore_weight(value):
+    """
+    Validated ChoreType.weight: a positive whole number (1 if missing).
+    :raises ValueError: Anything else (0, negative, fractional, non-numeric, boolean).
+    """
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        raise ValueError("weight must be a positive number")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("weight must be a positive number")
+    if not number.is_integer() or number < 1:
+        raise ValueError("weight must be a positive number")
+    return int(number)
+
+def replan_future_events(establishment_id, from_date, user_id, joined=False, weeks=4):
+    """
+    Re-balances the pending rotating events due on or after `from_date` after the lease of
+    `user_id` started or ended. Only that tenant's events move: the ones they are no longer there
+    for go to the least loaded active tenants, and a newcomer (`joined`) takes over events from
+    the most loaded ones as long as it evens out the load. Every other assignment is kept, swaps
+    agreed between tenants included; dates never change.
+
+    :return: Number of events reassigned.
+    """
+    from_dt = datetime.combine(from_date, datetime.min.time()) if not isinstance(from_date, datetime) else from_date
+    chores = dict(db.session.query(ChoreType.id, ChoreType.weight).filter_by(
+        establishment_id=establishment_id, is_rotating=True).all())
+    if not chores:
+        return 0
+    weights = {chore_id: weight or 1 for chore_id, weight in chores.items()}
+
+    events = ChoreEvent.query.filter(
+        ChoreEvent.chore_type_id.in_(weights),
+        ChoreEvent.status == ChoreStatus.PENDING,
+        ChoreEvent.due_date >= from_dt
+    ).order_by(ChoreEvent.due_date, ChoreEvent.id).all()
+    if not events:
+        return 0
+
+    periods = _tenant_periods(establishment_id)
+    user_periods = periods.get(user_id, [])
+    orphaned = [event for event in events
+                if event.assigned_user_id == user_id and not covers(user_periods, event.due_date)]
+
+    changed = 0
+    if orphaned:
+        skipped = {event.id for event in orphaned}
+        history = [(chore_type_id, assignee) for event_id, chore_type_id, assignee in db.session.query(
+            ChoreEvent.id, ChoreEvent.chore_type_id, ChoreEvent.assigned_user_id
+        ).filter(
+            ChoreEvent.chore_type_id.in_(weights),
+            ChoreEvent.due_date >= from_dt - timedelta(weeks=weeks)
+        ).order_by(ChoreEvent.due_date, ChoreEvent.id) if event_id not in skipped]
+        scheduler = _scheduler(periods, history, weights)
+        for event in orphaned:
+            assignee = scheduler.assign(event.due_date, weights[event.chore_type_id])
+            if assignee is not None and assignee != user_id:
+                event.assigned_user_id = assignee
+                changed += 1
+
+    if joined and user_periods:
+        # The newcomer's share of the events still to come, taken from whoever carries the most
+        load = {}
+        for event in events:
+            load[event.assigned_user_id] = load.get(event.assigned_user_id, 0) + weights[event.chore_type_id]
+        load.setdefault(user_id, 0)
+        for event in events:
+            holder, weight = event.assigned_user_id, weights[event.chore_type_id]
+            if holder != user_id and covers(user_periods, event.due_date) \
+                    and load[user_id] + weight <= load[holder] - weight:
+                load[holder] -= weight
+                load[user_id] += weight
+                event.assigned_user_id = user_id
+                changed += 1
+
+    db.session.commit()
+    return changed
+
+def on_lease_change(lease):
+    """Re-plans the future chores of the lease's establishment when it starts or ends."""
+    today = datetime.now().date()
+    changed_on = lease.end_date + timedelta(days=1) if lease.end_date else lease.start_date
+    return replan_future_events(lease.room.establishment_id, max(changed_on, today), lease.user_id,
+                                joined=lease.end_date is None)
+
+def _required_validations(establishment_id):
+    """Quorum: every other active tenant (total_colocs - 1, at least 0)."""
+    return max(len(tenant_index.get(establishment_id)) - 1, 0)
+
 def mark_task_done(event_id, user_id):
     """
     Passes the status to Done_Waiting_Validation.
+    The quorum is snapshotted at this point, so later lease changes do not move the goalposts.
     """
     event = ChoreEvent.query.get(event_id)
     if not event:
@@ -123,68 +311,143 @@ def mark_task_done(event_id, user_id):
         return False, "Ce n'est pas votre tâche."
 
     event.status = ChoreStatus.DONE_WAITING_VALIDATION
+    event.required_validations = _required_validations(event.chore_type.establishment_id)
     db.session.commit()
     return True, "Tâche marquée comme terminée."
 
-def validate_task(event_id, validator_user_id):
+def _register_validation(event, validator_user_id):
     """
-    Registers validation.
-    Checks consensus: if nb_validations == (total_colocs - 1), set status to Completed.
+    Adds one validation to the current transaction (no commit).
+    Consensus is reached when validation_count >= required_validations; both the increment and
+    the completion are single atomic UPDATEs, so concurrent validators cannot lose a vote.
     """
-    event = ChoreEvent.query.get(event_id)
-    if not event:
-        return False, "Tâche introuvable."
-
     if event.assigned_user_id == validator_user_id:
         return False, "Vous ne pouvez pas valider votre propre tâche."
 
-    # Check if already validated by this user
-    existing_validation = ChoreValidation.query.filter_by(
-        event_id=event_id,
-        validator_user_id=validator_user_id
-    ).first()
-
-    if existing_validation:
+    if event.required_validations is None:
+        # Validated before being marked done (or created before the quorum snapshot existed)
+        event.required_validations = _required_validations(event.chore_type.establishment_id)
+
+    # The unique constraint (event, validator) rejects a second validation
+    try:
+        with db.session.begin_nested():
+            db.session.add(ChoreValidation(
+                event_id=event.id,
+                validator_user_id=validator_user_id,
+                is_validated=True
+            ))
+    except IntegrityError:
         return False, "Vous avez déjà validé cette tâche."
 
-    # Create validation
-    validation = ChoreValidation(
-        event_id=event_id,
-        validator_user_id=validator_user_id,
-        is_validated=True
-    )
-    db.session.add(validation)
-
-    # We need to commit here to count correctly? Or just flush.
-    db.session.flush()
-
-    # Consensus Logic
-    # 1. Get total active tenants in the establishment
-    # We can get establishment from chore_type
-    establishment_id = event.chore_type.establishment_id
-    active_tenants = get_active_tenants(establishment_id)
-    total_colocs = len(active_tenants)
-
-    # 2. Count validations
-    nb_validations = ChoreValidation.query.filter_by(event_id=event_id, is_validated=True).count()
-    # Note: The current session add might not be reflected in count() if not committed,
-    # but flush() should make it visible to the transaction.
-    # Actually, count() does a DB query. If we flushed, it *should* see it in the transaction
-    # depending on isolation level, but simpler is to use len(event.validations) if backref is updated,
-    # or just trust the increment.
+    ChoreEvent.query.filter(ChoreEvent.id == event.id).update(
+        {ChoreEvent.validation_count: ChoreEvent.validation_count + 1}, synchronize_session=False)
+    ChoreEvent.query.filter(
+        ChoreEvent.id == event.id,
+        ChoreEvent.validation_count >= ChoreEvent.required_validations,
+        ChoreEvent.status != ChoreStatus.COMPLETED
+    ).update({ChoreEvent.status: ChoreStatus.COMPLETED}, synchronize_session=False)
+    db.session.expire(event, ['validation_count', 'status'])
+    return True, "Validation enregistrée."
 
-    # Let's rely on the query.
-    # If the user performing the task is one of the active tenants, then we need (N-1) validations.
+def validate_task(event_id, validator_user_id):
+    """
+    Registers validation.
+    Checks consensus: if nb_validations == (total_colocs - 1), set status to Completed.
+    """
+    event = ChoreEvent.query.get(event_id)
+    if not event:
+        return False, "Tâche introuvable."
 
-    needed_validations = total_colocs - 1
-    if needed_validations < 1:
-        needed_validations = 0 # Single tenant case?
+    success, msg = _register_validation(event, validator_user_id)
+    db.session.commit()
+    return success, msg
 
-    if nb_validations >= needed_validations:
-        event.status = ChoreStatus.COMPLETED
+def validate_tasks(event_ids, validator_user_id, establishment_id=None):
+    """
+    Bulk variant of validate_task(): one query to load the events, one commit.
+    Events of other establishments (when `establishment_id` is given) are reported as not found.
 
+    :return: {event_id: (success, message)}
+    """
+    query = ChoreEvent.query.filter(ChoreEvent.id.in_(event_ids))
+    if establishment_id is not None:
+        query = query.join(ChoreType).filter(ChoreType.establishment_id == establishment_id)
+    events = {event.id: event for event in query}
+
+    results = {}
+    for event_id in dict.fromkeys(event_ids):
+        event = events.get(event_id)
+        results[event_id] = _register_validation(event, validator_user_id) if event else (False, "Tâche introuvable.")
     db.session.commit()
-    return True, "Validation enregistrée."
+    return results
+
+def recount_validations():
+    """Repair / first deployment: recomputes ChoreEvent.validation_count from the validations."""
+    counts = db.session.query(func.count(ChoreValidation.id)).filter(
+        ChoreValidation.event_id == ChoreEvent.id,
+        ChoreValidation.is_validated == True
+    ).scalar_subquery()
+    updated = ChoreEvent.query.update({ChoreEvent.validation_count: counts}, synchronize_session=False)
+    db.session.commit()
+    return updated
+
+def calendar_version(establishment_id, start_date=None, end_date=None):
+    """
+    ETag of calendar_feed() for the same arguments, from one aggregate over the same index
+    range (event count and latest change) and the cached tenant count: a client with an
+    up-to-date calendar gets its 304 without the feed being built.
+    """
+    query = db.session.query(func.count(ChoreEvent.id), func.max(ChoreEvent.updated_at), func.max(ChoreType.updated_at))\
+        .join(ChoreType, ChoreEvent.chore_type_id == ChoreType.id).filter(ChoreType.establishment_id == establishment_id)
+    query = _calendar_range(query, start_date, end_date)
+    count, events_changed, types_changed = query.one()
+    tenants = len(tenant_index.get(establishment_id))
+    return f"chores-{establishment_id}-{count}-{tenants}-{_stamp(events_changed)}-{_stamp(types_changed)}"
+
+def _stamp(moment):
+    return moment.strftime('%Y%m%d%H%M%S%f') if moment else '0'
+
+def _calendar_range(query, start_date, end_date):
+    if start_date:
+        query = query.filter(ChoreEvent.due_date >= start_date)
+    if end_date:
+        # due_date is a DateTime: include the whole last day
+        query = query.filter(ChoreEvent.due_date < end_date + timedelta(days=1))
+    return query
+
+def calendar_feed(establishment_id, start_date=None, end_date=None):
+    """
+    FullCalendar events of an establishment between two dates (inclusive), in one column query:
+    chore name and validation counter come with the event row, no lazy loads per event.
+    `validation_status` counts the validations against the active tenants (as before the
+    quorum rework), `quorum_status` against the quorum of the event.
+    """
+    query = db.session.query(
+        ChoreEvent.id, ChoreType.name, ChoreEvent.due_date, ChoreEvent.status, ChoreEvent.assigned_user_id,
+        ChoreEvent.validation_count, ChoreEvent.required_validations
+    ).join(ChoreType, ChoreEvent.chore_type_id == ChoreType.id).filter(ChoreType.establishment_id == establishment_id)
+    query = _calendar_range(query, start_date, end_date)
+
+    total_tenants = len(tenant_index.get(establishment_id))
+    default_quorum = max(total_tenants - 1, 0)
+    result = []
+    for event_id, name, due_date, status, assigned_user_id, count, required in query.order_by(ChoreEvent.due_date, ChoreEvent.id):
+        if required is None:
+            # Not marked done yet: quorum it would get today (cached tenant index)
+            required = default_quorum
+        result.append({
+            'id': event_id,
+            'title': name,
+            'start': due_date.isoformat(),
+            'allDay': True,
+            'extendedProps': {
+                'validation_status': f"{count}/{total_tenants} validations",
+                'quorum_status': f"{count}/{required} validations",
+                'status': status.value,
+                'assigned_user_id': assigned_user_id
+            }
+        })
+    return result
 
 def get_chore_finance_link(chore_type_id):
     """
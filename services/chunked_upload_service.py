@@ -0,0 +1,151 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Service logic for chunked upload module.
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from config.extensions import db
+from models.storage import UploadSession
+from services.upload_service import UploadService, UploadRejected
+from services.chat_media_service import ChatMediaService
+from services.blob_store import BlobStore
+from services.storage_backend import storage
+
+class _ChunkReader:
+    """Reads the stored chunks of an upload one after the other, as a single stream."""
+
+    def __init__(self, backend, keys):
+        self._backend = backend
+        self._keys = iter(keys)
+        self._current = None
+
+    def read(self, size: int = -1) -> bytes:
+        while True:
+            if self._current is None:
+                key = next(self._keys, None)
+                if key is None:
+                    return b''
+                self._current = self._backend.open(key)
+            data = self._current.read(size)
+            if data:
+                return data
+            self._current.close()
+            self._current = None
+
+class ChunkedUploadService:
+    """
+    Resumable uploads for chat voice notes and images, sent as a series of raw chunks:
+        start (name, size) -> append chunk at offset ... -> complete -> blob key
+    Each chunk is stored as its own object `<part_path>/<offset>` in the storage work area (never
+    served, see storage.work_area()), so any web node can receive any chunk, and resending a chunk
+    after a dropped connection is harmless; a chunk at any other offset than the current one is
+    refused with the offset to resume from.
+    The first chunk is checked against the magic bytes of the file type and every chunk against
+    the declared size, so a bad upload stops at its first chunk. On completion the chunks are
+    streamed, in order, into the blob store (hashed on the way) and deleted.
+    """
+    CHUNK_SIZE = 1024 * 1024
+    SESSION_TTL = timedelta(hours=24)
+
+    @staticmethod
+    def start(user_id: int, filename: str, total_size: int, chat_room_id: int = None) -> UploadSession:
+        if not filename or not ChatMediaService.allowed_file(filename):
+            raise UploadRejected("File type not allowed", 415)
+        ext = filename.rsplit('.', 1)[1].lower()
+        if total_size <= 0:
+            raise UploadRejected("Empty file")
+        if total_size > ChatMediaService.max_size(ext):
+            raise UploadRejected("File too large", 413)
+
+        ChunkedUploadService.purge_expired()
+        upload_id = uuid.uuid4().hex
+        session = UploadSession(id=upload_id, user_id=user_id, chat_room_id=chat_room_id, filename=filename,
+                                total_size=total_size, received=0, part_path=f"parts/{upload_id}")
+        db.session.add(session)
+        db.session.commit()
+        return session
+
+    @staticmethod
+    def _chunk_key(session: UploadSession, offset: int) -> str:
+        return f"{session.part_path}/{offset:012d}"
+
+    @staticmethod
+    def append(session: UploadSession, stream, offset: int) -> int:
+        """
+        Stores the chunk read from `stream` at `offset`; returns the new offset.
+        Raises UploadRejected (409) if `offset` is not where the upload stands or if every byte
+        has already been received.
+        """
+        if session.received >= session.total_size:
+            raise UploadRejected("Upload already received, complete it", 409)
+        if offset != session.received:
+            raise UploadRejected("Unexpected offset", 409)
+
+        max_bytes = min(session.total_size - offset, ChunkedUploadService.CHUNK_SIZE)
+        checked = UploadService.checked_stream(stream, session.ext, max_bytes, sniff=(offset == 0))
+        written = 0
+        fd, tmp_path = tempfile.mkstemp(dir=storage.scratch_dir())
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in iter(lambda: checked.read(BlobStore.CHUNK_SIZE), b''):
+                    tmp.write(chunk)
+                    written += len(chunk)
+            if written:
+                storage.work_area().save_file(ChunkedUploadService._chunk_key(session, offset), tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        # Only the request that finds the expected offset moves it (duplicate chunks store the same bytes)
+        moved = UploadSession.query\
+            .filter(UploadSession.id == session.id, UploadSession.received == offset)\
+            .update({UploadSession.received: offset + written, UploadSession.updated_at: datetime.utcnow()},
+                    synchronize_session=False)
+        db.session.commit()
+        db.session.refresh(session)
+        if not moved:
+            raise UploadRejected("Unexpected offset", 409)
+        return session.received
+
+    @staticmethod
+    def complete(session: UploadSession) -> str:
+        """
+        Moves the assembled file into the blob store and drops the session; returns the blob key.
+        Flushed, not committed: the message created with the key belongs to the same transaction.
+        """
+        if session.received != session.total_size:
+            raise UploadRejected("Upload incomplete", 409)
+
+        work = storage.work_area()
+        keys = work.list(session.part_path + '/')
+        expected = 0
+        for key in keys:
+            if int(key.rsplit('/', 1)[1]) != expected:
+                raise UploadRejected("Upload chunks are missing", 409)
+            expected += work.size(key)
+        if expected != session.total_size:
+            raise UploadRejected("Upload chunks are missing", 409)
+
+        key = BlobStore.put(_ChunkReader(work, keys), session.ext).path
+        work.delete_prefix(session.part_path)
+        db.session.delete(session)
+        db.session.flush()
+        return key
+
+    @staticmethod
+    def purge_expired(now: datetime = None) -> int:
+        """Deletes the sessions abandoned for longer than SESSION_TTL and their chunks."""
+        cutoff = (now or datetime.utcnow()) - ChunkedUploadService.SESSION_TTL
+        expired = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+        work = storage.work_area()
+        for session in expired:
+            work.delete_prefix(session.part_path)
+            db.session.delete(session)
+        if expired:
+            db.session.commit()
+        return len(expired)
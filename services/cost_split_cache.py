@@ -0,0 +1,76 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: cost_split_cache.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+from algorithms.cost_splitter import VacancyStrategy
+
+class CostSplitCache:
+    """
+    In-process LRU cache of CostCalculator results.
+
+    Entries are keyed by (establishment id, establishment.data_version, vacancy strategy).
+    The version is bumped in the database whenever rooms, invoices or the establishment
+    configuration change (models/versioning.py), so a stale entry is simply never asked
+    for again and ends up evicted. Every tenant of a house shares the same entry.
+
+    Cached results are shared between requests: callers must not mutate them.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('COST_SPLIT_CACHE_SIZE', self.maxsize)
+
+    def get_or_compute(self, establishment, compute: Callable[[], Dict[str, Any]],
+                       vacancy_strategy: VacancyStrategy = VacancyStrategy.REDISTRIBUTE) -> Dict[str, Any]:
+        """
+        Returns the cached result for the establishment's current data version,
+        or calls `compute()` and stores its result.
+        """
+        key = (establishment.id, establishment.data_version or 0, vacancy_strategy.value)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Computed outside the lock: two concurrent misses may both compute, which is harmless.
+        result = compute()
+
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+cost_split_cache = CostSplitCache()
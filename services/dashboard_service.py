@@ -0,0 +1,129 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Service logic for dashboard module.
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, case
+from sqlalchemy.orm import joinedload
+from config.extensions import db
+from models.establishment import Establishment, Room, Lease, EstablishmentOwner
+from models.maintenance import Ticket
+from models.users import User
+from services.portfolio_summary_service import PortfolioSummaryService
+
+class DashboardService:
+    """
+    Data access for the dashboard, with a fixed number of queries whatever the portfolio size:
+    counts are aggregated in SQL (GROUP BY) and relationships are loaded eagerly,
+    instead of walking est.rooms / room leases one row at a time. The portfolio totals of
+    the landlord dashboard come from the pre-aggregated LandlordPortfolioSummary row.
+    """
+
+    @staticmethod
+    def landlord_overview(user_id: int) -> Dict[str, Any]:
+        """
+        Establishments of a landlord with occupancy and open ticket counts (3 queries).
+        :return: {"establishments", "total_tenants", "open_tickets",
+                  "occupancy": {est_id: {"occupied", "total_rooms"}}, "open_tickets_per_establishment": {est_id: int}}
+        """
+        establishments = Establishment.query.join(EstablishmentOwner).filter(
+            EstablishmentOwner.user_id == user_id
+        ).all()
+        est_ids = [est.id for est in establishments]
+
+        occupancy = DashboardService.occupancy_counts(est_ids)
+        tickets = DashboardService.open_ticket_counts(est_ids)
+
+        return {
+            'establishments': establishments,
+            'occupancy': occupancy,
+            'total_tenants': sum(counts['occupied'] for counts in occupancy.values()),
+            'open_tickets_per_establishment': tickets,
+            'open_tickets': sum(tickets.values())
+        }
+
+    @staticmethod
+    def landlord_summary(user_id: int) -> Dict[str, Any]:
+        """
+        Establishments of a landlord and the portfolio totals, without per-establishment counts
+        (2 queries: the establishment list and the LandlordPortfolioSummary row).
+        :return: {"establishments", "total_rooms", "total_tenants", "open_tickets", "pending_payments"}
+        """
+        establishments = Establishment.query.join(EstablishmentOwner).filter(
+            EstablishmentOwner.user_id == user_id
+        ).all()
+        summary = PortfolioSummaryService.get(user_id)
+
+        return {
+            'establishments': establishments,
+            'total_rooms': summary.total_rooms,
+            'total_tenants': summary.occupied_rooms,
+            'open_tickets': summary.open_tickets,
+            'pending_payments': summary.pending_payments
+        }
+
+    @staticmethod
+    def occupancy_counts(establishment_ids: List[int]) -> Dict[int, Dict[str, int]]:
+        """Occupied / total room counts per establishment, in one aggregated query."""
+        if not establishment_ids:
+            return {}
+        rows = db.session.query(
+            Room.establishment_id,
+            func.count(Room.id),
+            func.sum(case((Room.is_vacant.is_(False), 1), else_=0))
+        ).filter(Room.establishment_id.in_(establishment_ids)).group_by(Room.establishment_id).all()
+
+        counts = {est_id: {'occupied': 0, 'total_rooms': 0} for est_id in establishment_ids}
+        for est_id, total_rooms, occupied in rows:
+            counts[est_id] = {'occupied': int(occupied or 0), 'total_rooms': total_rooms}
+        return counts
+
+    @staticmethod
+    def open_ticket_counts(establishment_ids: List[int]) -> Dict[int, int]:
+        """Open tickets per establishment, in one aggregated query."""
+        if not establishment_ids:
+            return {}
+        rows = db.session.query(Ticket.establishment_id, func.count(Ticket.id)).filter(
+            Ticket.establishment_id.in_(establishment_ids),
+            Ticket.status == 'Open'
+        ).group_by(Ticket.establishment_id).all()
+
+        counts = {est_id: 0 for est_id in establishment_ids}
+        counts.update({est_id: count for est_id, count in rows})
+        return counts
+
+    @staticmethod
+    def tenant_lease(user_id: int) -> Optional[Lease]:
+        """
+        The tenant's lease with its room, establishment and the establishment's rooms
+        eager-loaded (the cost split reads all of them).
+        """
+        return Lease.query.options(
+            joinedload(Lease.room).joinedload(Room.establishment).selectinload(Establishment.rooms)
+        ).filter_by(user_id=user_id).first()
+
+    @staticmethod
+    def roommates(room: Room) -> List[User]:
+        """
+        Tenants of the other occupied rooms of the establishment, taking the most recent lease
+        of each room, in a single query (ROW_NUMBER window over the leases).
+        """
+        latest = db.session.query(
+            Lease.user_id.label('user_id'),
+            Lease.room_id.label('room_id'),
+            func.row_number().over(
+                partition_by=Lease.room_id,
+                order_by=(Lease.start_date.desc(), Lease.id.desc())
+            ).label('rank')
+        ).join(Room, Room.id == Lease.room_id).filter(
+            Room.establishment_id == room.establishment_id,
+            Room.is_vacant.is_(False),
+            Room.id != room.id
+        ).subquery()
+
+        return User.query.join(latest, User.id == latest.c.user_id).filter(
+            latest.c.rank == 1
+        ).order_by(latest.c.room_id).all()
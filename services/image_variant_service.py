@@ -0,0 +1,105 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Service logic for image variant module.
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import io
+from PIL import Image, ImageOps, features
+from config.extensions import db
+from services.storage_backend import storage
+from services.blob_store import BlobStore
+
+class ImageVariantService:
+    """
+    Fixed renditions of uploaded images, stored as blobs like the uploads themselves (one
+    reference per rendition, dropped with release()):
+        {"thumb": {"webp": key, "jpeg": key}, "medium": {...}, "full": {...}}
+    The source is decoded a single time, at the reduced scale closest to the largest rendition
+    (Pillow draft mode, JPEG only), then each smaller rendition is resized from the previous one.
+    """
+    # Longest side in pixels, largest first
+    RENDITIONS = (('full', 2048), ('medium', 1024), ('thumb', 320))
+    QUALITY = {'webp': 75, 'jpeg': 75}
+    IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+
+    @staticmethod
+    def formats():
+        return ('webp', 'jpeg') if features.check('webp') else ('jpeg',)
+
+    @staticmethod
+    def is_image(path: str) -> bool:
+        ext = path.rsplit('.', 1)[1].lower() if '.' in path else ''
+        return ext in ImageVariantService.IMAGE_EXTENSIONS
+
+    @staticmethod
+    def generate(source_key: str) -> dict:
+        """
+        Stores every rendition of the stored `source_key` in the BlobStore and returns their keys.
+        The blob references are flushed, not committed: they belong to the caller's transaction.
+        """
+        largest = ImageVariantService.RENDITIONS[0][1]
+
+        variants = {}
+        with storage.local_copy(source_key) as source_path, Image.open(source_path) as img:
+            # JPEG: decode directly at 1/2, 1/4 or 1/8 scale when the target allows it
+            img.draft('RGB', (largest, largest))
+            img = ImageOps.exif_transpose(img)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            for size, max_side in ImageVariantService.RENDITIONS:
+                img.thumbnail((max_side, max_side), Image.LANCZOS)
+                variants[size] = {}
+                for fmt in ImageVariantService.formats():
+                    encoded = io.BytesIO()
+                    img.save(encoded, fmt.upper(), quality=ImageVariantService.QUALITY[fmt], optimize=True)
+                    encoded.seek(0)
+                    variants[size][fmt] = BlobStore.put(encoded, 'jpg' if fmt == 'jpeg' else fmt).path
+        return variants
+
+    @staticmethod
+    def release(variants):
+        """Drops the blob references of renditions returned by generate() (record deleted or image replaced)."""
+        for formats in (variants or {}).values():
+            for key in formats.values():
+                BlobStore.release(key)
+
+    @staticmethod
+    def url(variants, size: str = 'medium', fmt: str = 'jpeg', fallback: str = None):
+        """
+        Key of a rendition, or `fallback` (usually the original file) when the variants are not
+        generated yet. Unknown sizes fall back to the next larger rendition.
+        """
+        if variants:
+            names = [name for name, _ in ImageVariantService.RENDITIONS]
+            candidates = names[:names.index(size) + 1][::-1] if size in names else names
+            for name in candidates:
+                path = (variants.get(name) or {}).get(fmt)
+                if path:
+                    return path
+        return fallback
+
+    @staticmethod
+    def process(model, record_id: int, path_attr: str, variants_attr: str):
+        """
+        Media pipeline task: generates the renditions of an uploaded image stored on a model
+        (e.g. Ticket.photo_path -> Ticket.photo_variants) and records their keys.
+        """
+        record = db.session.get(model, record_id)
+        if record is None:
+            return
+        source = getattr(record, path_attr)
+        if not source or not ImageVariantService.is_image(source):
+            return
+        try:
+            variants = ImageVariantService.generate(source)
+        except Exception as e:
+            print(f"Image variants failed for {model.__name__} {record_id}: {e}")
+            db.session.rollback()
+            return
+        # Generated again: the previous renditions are no longer referenced by this record
+        ImageVariantService.release(getattr(record, variants_attr))
+        setattr(record, variants_attr, variants)
+        db.session.commit()
@@ -0,0 +1,44 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Service logic for lease module.
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from datetime import date, datetime
+from typing import Optional
+from sqlalchemy import or_
+from config.extensions import db
+from models.establishment import Room, Lease
+from services.portfolio_summary_service import PortfolioSummaryService
+
+class LeaseService:
+    """
+    Room occupancy over time. Room.is_vacant is what the cost split, the dashboard and the
+    portfolio summaries read; a lease ended with a future date frees its room only once that
+    date has passed, which release_ended_leases() does (daily: scripts/release_ended_leases.py).
+    """
+
+    @staticmethod
+    def release_ended_leases(today: Optional[date] = None) -> int:
+        """
+        Marks vacant the occupied rooms whose leases have all ended before `today` (no current
+        or upcoming lease left). Summaries of the landlords concerned follow in the same commit.
+
+        :return: Number of rooms freed.
+        """
+        today = today or datetime.now().date()
+        still_leased = db.session.query(Lease.room_id).filter(or_(Lease.end_date.is_(None), Lease.end_date >= today))
+        rooms = Room.query.join(Lease, Lease.room_id == Room.id).filter(
+            Room.is_vacant == False,
+            Lease.end_date < today,
+            ~Room.id.in_(still_leased)
+        ).distinct().all()
+        if not rooms:
+            return 0
+
+        for room in rooms:
+            room.is_vacant = True
+        PortfolioSummaryService.apply(PortfolioSummaryService.establishment_landlords({r.establishment_id for r in rooms}))
+        db.session.commit()
+        return len(rooms)
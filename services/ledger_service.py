@@ -0,0 +1,133 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Service logic for ledger module.
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from datetime import date, datetime
+from typing import Dict, Optional
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from config.extensions import db
+from models.finance import ChargeLedger, Invoice, ExpenseType
+from utils.money import to_cents
+
+class LedgerService:
+    """
+    Keeps ChargeLedger rows in sync with invoices, incrementally.
+
+    Calls are made in the same transaction as the invoice change (the caller commits),
+    with atomic "total = total + delta" updates so concurrent writers do not lose amounts.
+    """
+
+    @staticmethod
+    def period_of(day: Optional[date]) -> date:
+        """Ledger period (first day of the month) of an invoice date."""
+        if day is None:
+            day = datetime.utcnow().date()
+        return date(day.year, day.month, 1)
+
+    @staticmethod
+    def record_invoice(invoice: Invoice):
+        """Adds a new invoice to its ledger row."""
+        LedgerService._apply(invoice.establishment_id, LedgerService.period_of(invoice.date),
+                             invoice.type, to_cents(invoice.amount), 1)
+
+    @staticmethod
+    def record_invoice_change(invoice: Invoice, old_amount: float, old_type: ExpenseType, old_date: Optional[date]):
+        """
+        Moves an edited invoice from its previous values to its current ones.
+        Only the difference is applied when period and type did not change.
+        """
+        old_period = LedgerService.period_of(old_date)
+        new_period = LedgerService.period_of(invoice.date)
+        if old_period == new_period and old_type == invoice.type:
+            delta = to_cents(invoice.amount) - to_cents(old_amount)
+            if delta:
+                LedgerService._apply(invoice.establishment_id, new_period, invoice.type, delta, 0)
+            return
+
+        LedgerService._apply(invoice.establishment_id, old_period, old_type, -to_cents(old_amount), -1)
+        LedgerService.record_invoice(invoice)
+
+    @staticmethod
+    def remove_invoice(invoice: Invoice):
+        """Takes a deleted invoice out of its ledger row."""
+        LedgerService._apply(invoice.establishment_id, LedgerService.period_of(invoice.date),
+                             invoice.type, -to_cents(invoice.amount), -1)
+
+    @staticmethod
+    def get_totals(establishment_id: int, period: date) -> Dict[ExpenseType, int]:
+        """
+        Pre-aggregated invoice totals (in cents) by expense type for one period.
+        Reads at most one row per expense type through the unique index.
+        """
+        rows = db.session.query(ChargeLedger.type, ChargeLedger.total_cents).filter(
+            ChargeLedger.establishment_id == establishment_id,
+            ChargeLedger.period == LedgerService.period_of(period)
+        ).all()
+        return {expense_type: total for expense_type, total in rows}
+
+    @staticmethod
+    def get_establishment_totals(establishment_id: int) -> Dict[ExpenseType, int]:
+        """
+        Invoice totals (in cents) by expense type over every period of an establishment,
+        summed from its ledger rows (one row per period and type) instead of its invoices.
+        """
+        rows = db.session.query(ChargeLedger.type, func.sum(ChargeLedger.total_cents)).filter(
+            ChargeLedger.establishment_id == establishment_id
+        ).group_by(ChargeLedger.type).all()
+        return {expense_type: int(total or 0) for expense_type, total in rows}
+
+    @staticmethod
+    def rebuild(establishment_id: Optional[int] = None) -> int:
+        """
+        Recomputes the ledger from the invoices (repair / first deployment).
+        :return: Number of ledger rows written.
+        """
+        ledger_query = ChargeLedger.query
+        invoice_query = Invoice.query
+        if establishment_id is not None:
+            ledger_query = ledger_query.filter_by(establishment_id=establishment_id)
+            invoice_query = invoice_query.filter_by(establishment_id=establishment_id)
+        ledger_query.delete(synchronize_session=False)
+
+        aggregates: Dict[tuple, list] = {}
+        for invoice in invoice_query.yield_per(1000):
+            key = (invoice.establishment_id, LedgerService.period_of(invoice.date), invoice.type)
+            entry = aggregates.setdefault(key, [0, 0])
+            entry[0] += to_cents(invoice.amount)
+            entry[1] += 1
+
+        for (est_id, period, expense_type), (total, count) in aggregates.items():
+            db.session.add(ChargeLedger(establishment_id=est_id, period=period, type=expense_type,
+                                        total_cents=total, invoice_count=count))
+        db.session.commit()
+        return len(aggregates)
+
+    @staticmethod
+    def _apply(establishment_id: int, period: date, expense_type: ExpenseType, delta_cents: int, delta_count: int):
+        values = {
+            ChargeLedger.total_cents: ChargeLedger.total_cents + delta_cents,
+            ChargeLedger.invoice_count: ChargeLedger.invoice_count + delta_count,
+            ChargeLedger.updated_at: datetime.utcnow()
+        }
+        criteria = (
+            ChargeLedger.establishment_id == establishment_id,
+            ChargeLedger.period == period,
+            ChargeLedger.type == expense_type
+        )
+
+        updated = ChargeLedger.query.filter(*criteria).update(values, synchronize_session=False)
+        if updated:
+            return
+
+        # First invoice of this period/type: create the row. Another worker may create it
+        # concurrently; the unique constraint then makes us fall back to the update.
+        try:
+            with db.session.begin_nested():
+                db.session.add(ChargeLedger(establishment_id=establishment_id, period=period, type=expense_type,
+                                            total_cents=delta_cents, invoice_count=delta_count))
+        except IntegrityError:
+            ChargeLedger.query.filter(*criteria).update(values, synchronize_session=False)
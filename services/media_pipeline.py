@@ -0,0 +1,87 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: media_pipeline.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+class MediaPipeline:
+    """
+    Bounded background worker pool for media processing (image decode / re-encode).
+
+    Tasks run inside an application context of the app given to init_app. At most
+    `workers + queue_size` tasks are in flight; beyond that, submit() runs the task in the caller's
+    thread, so a burst of uploads slows its own requests down instead of piling up memory.
+    With `eager` (tests, scripts), every task runs synchronously.
+    """
+
+    def __init__(self, workers: int = 2, queue_size: int = 32, eager: bool = False):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.eager = eager
+        self.app = None
+        self._executor = None
+        self._slots = None
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('MEDIA_WORKERS', self.workers)
+        self.queue_size = app.config.get('MEDIA_QUEUE_SIZE', self.queue_size)
+        self.eager = app.config.get('MEDIA_PIPELINE_EAGER', self.eager)
+        self.shutdown(wait=False)
+
+    def submit(self, task, *args):
+        """Runs task(*args) in the background; returns True if it was queued, False if it ran inline."""
+        if self.eager:
+            self._run(task, args)
+            return False
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='media')
+                self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+            executor, slots = self._executor, self._slots
+
+        if not slots.acquire(blocking=False):
+            # Pool saturated: back-pressure on the caller
+            self._run(task, args)
+            return False
+
+        future = executor.submit(self._run, task, args)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(lambda f: self._done(f, slots))
+        return True
+
+    def join(self, timeout: float = None) -> bool:
+        """Waits for the queued tasks (scripts, tests). Returns True if none is left."""
+        with self._lock:
+            futures = list(self._futures)
+        _, not_done = wait(futures, timeout=timeout)
+        return not not_done
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._futures = set()
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _done(self, future, slots):
+        slots.release()
+        with self._lock:
+            self._futures.discard(future)
+
+    def _run(self, task, args):
+        try:
+            with self.app.app_context():
+                task(*args)
+        except Exception as e:
+            print(f"Media task {getattr(task, '__name__', task)} failed: {e}")
+
+media_pipeline = MediaPipeline()
@@ -30,18 +30,15 @@ class PDFService:
         Generates a PDF receipt for a transaction.
         Adapts format based on PlatformSettings (A4 vs Thermal).
         """
-        if output_buffer is None:
-            output_buffer = io.BytesIO()
-
         # Get Settings
         settings = PlatformSettings.query.first()
         fmt = settings.receipt_format if settings else ReceiptFormat.A4_Standard
 
-        # Extract data from ORM object
-        ticket_number = transaction.ticket_number
-        amount = transaction.amount
-        date = transaction.date
+        return PDFService.render_receipt(PDFService.receipt_context(transaction), fmt, output_buffer)
 
+    @staticmethod
+    def receipt_context(transaction) -> dict:
+        """Plain data of a receipt (no ORM object: it can be rendered in another process)."""
         # User info
         user_name = "Unknown User"
         if transaction.payer:
@@ -60,17 +57,22 @@ class PDFService:
             if transaction.invoice.establishment:
                 property_name = transaction.invoice.establishment.address
 
-        # Prepare context for rendering
-        ctx = {
-            'ticket_number': ticket_number,
-            'amount': amount,
-            'date': date,
+        return {
+            'ticket_number': transaction.ticket_number,
+            'amount': transaction.amount,
+            'date': transaction.date,
             'user_name': user_name,
             'property_name': property_name,
             'description': description
         }
 
-        qr_url = f"https://domaine.com/verify/receipt/{ticket_number}"
+    @staticmethod
+    def render_receipt(ctx: dict, fmt: ReceiptFormat, output_buffer: io.BytesIO = None) -> io.BytesIO:
+        """Draws a receipt from receipt_context() data. No database access."""
+        if output_buffer is None:
+            output_buffer = io.BytesIO()
+
+        qr_url = f"https://domaine.com/verify/receipt/{ctx['ticket_number']}"
 
         if fmt == ReceiptFormat.Thermal_80mm:
             return PDFService._generate_thermal_receipt(ctx, output_buffer, qr_url)
@@ -12,6 +12,7 @@ from flask_login import current_user
 from models.establishment import Establishment, EstablishmentOwner, EstablishmentOwnerRole
 from models.users import User, UserRole
 from config.extensions import db
+from services.portfolio_summary_service import PortfolioSummaryService
 
 def add_co_landlord(establishment_id, email):
     """
@@ -45,6 +46,7 @@ def add_co_landlord(establishment_id, email):
         role=EstablishmentOwnerRole.SECONDARY
     )
     db.session.add(new_owner)
+    PortfolioSummaryService.apply([user.id])
     db.session.commit()
 
     return True, "Co-bailleur ajouté avec succès."
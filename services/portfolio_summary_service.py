@@ -0,0 +1,78 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Service logic for portfolio_summary module.
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from typing import Iterable, Optional
+from config.extensions import db
+from models.establishment import EstablishmentOwner, Room, Lease
+from models.portfolio import LandlordPortfolioSummary, compute_summaries, refresh_summaries
+
+class PortfolioSummaryService:
+    """
+    Read / write access to LandlordPortfolioSummary.
+    Every route or service changing rooms, leases, tickets, transactions or ownerships calls
+    apply() with the landlords concerned before its commit; rebuild() recounts every landlord
+    and backfills the ones that existed before the table.
+    """
+
+    @staticmethod
+    def establishment_landlords(establishment_ids: Iterable[int]) -> set:
+        """Owners of the given establishments."""
+        ids = {i for i in establishment_ids if i is not None}
+        if not ids:
+            return set()
+        rows = db.session.query(EstablishmentOwner.user_id).filter(EstablishmentOwner.establishment_id.in_(ids))
+        return {user_id for user_id, in rows}
+
+    @staticmethod
+    def tenant_landlords(user_ids: Iterable[int]) -> set:
+        """Owners of the establishments where the given users hold a lease (their pending payments count there)."""
+        ids = {i for i in user_ids if i is not None}
+        if not ids:
+            return set()
+        rows = db.session.query(EstablishmentOwner.user_id)\
+            .join(Room, Room.establishment_id == EstablishmentOwner.establishment_id)\
+            .join(Lease, Lease.room_id == Room.id)\
+            .filter(Lease.user_id.in_(ids)).distinct()
+        return {user_id for user_id, in rows}
+
+    @staticmethod
+    def apply(landlord_ids: Iterable[int]):
+        """
+        Recounts the summaries of the given landlords in the current transaction (the caller
+        commits). Pending changes are flushed first so the counts include them.
+        """
+        landlord_ids = {i for i in landlord_ids if i is not None}
+        if not landlord_ids:
+            return
+        db.session.flush()
+        refresh_summaries(db.session.connection(), landlord_ids)
+
+    @staticmethod
+    def get(user_id: int) -> LandlordPortfolioSummary:
+        """
+        Summary of a landlord (single-row read). A missing row (landlord created before the
+        table existed, not backfilled yet) is computed for this read only: nothing is written.
+        """
+        summary = db.session.get(LandlordPortfolioSummary, user_id)
+        if summary is None:
+            values = compute_summaries(db.session.connection(), [user_id])[user_id]
+            summary = LandlordPortfolioSummary(user_id=user_id, **values)
+        return summary
+
+    @staticmethod
+    def rebuild(user_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        Recomputes the summaries of the given landlords, or of every landlord owning an establishment.
+        :return: Number of summaries written.
+        """
+        if user_ids is None:
+            LandlordPortfolioSummary.query.delete(synchronize_session=False)
+            user_ids = [row[0] for row in db.session.query(EstablishmentOwner.user_id).distinct()]
+        user_ids = list(user_ids)
+        refresh_summaries(db.session.connection(), user_ids)
+        db.session.commit()
+        return len(set(user_ids))
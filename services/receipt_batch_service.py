@@ -0,0 +1,153 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Service logic for receipt batch module.
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import multiprocessing
+import os
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy.orm import joinedload, selectinload
+from werkzeug.utils import secure_filename
+from models.finance import Transaction, Invoice
+from models.saas_config import PlatformSettings, ReceiptFormat
+from services.pdf_service import PDFService
+
+def _render_receipt(job):
+    """Worker process entry point: (filename, context, format) -> (filename, PDF bytes)."""
+    filename, ctx, fmt = job
+    return filename, PDFService.render_receipt(ctx, fmt).getvalue()
+
+class _ZipOutput:
+    """Write-only sink for zipfile: the archive is produced in pieces, taken with drain()."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+class ReceiptBatchService:
+    """
+    Month-end receipts: every receipt of a list of transactions, as one streamed ZIP.
+
+    The transactions, their payer, invoice and establishment are loaded in a few queries and
+    PlatformSettings once; the PDFs are then drawn in a process pool (reportlab is CPU-bound and
+    holds the GIL) from plain dicts, so the workers never touch the database. Receipts are
+    submitted in a sliding window of `window` jobs and written to the archive in order as they
+    come back: memory holds at most `window` PDFs, whatever the size of the batch.
+    """
+
+    def __init__(self, workers: int = None, window: int = None, inline_below: int = 4):
+        self.workers = workers
+        self.window = window
+        self.inline_below = inline_below
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.workers = app.config.get('RECEIPT_WORKERS', self.workers)
+        self.window = app.config.get('RECEIPT_BATCH_WINDOW', self.window)
+        self.shutdown(wait=False)
+
+    @property
+    def worker_count(self) -> int:
+        return self.workers or os.cpu_count() or 1
+
+    @staticmethod
+    def load_jobs(transaction_ids) -> list:
+        """Render jobs (filename, context, format) of the transactions, in the order of the ids."""
+        settings = PlatformSettings.query.first()
+        fmt = settings.receipt_format if settings else ReceiptFormat.A4_Standard
+
+        transactions = Transaction.query\
+            .options(joinedload(Transaction.payer),
+                     selectinload(Transaction.invoice).joinedload(Invoice.establishment))\
+            .filter(Transaction.id.in_(transaction_ids)).all()
+        by_id = {trx.id: trx for trx in transactions}
+
+        jobs = []
+        for trx_id in transaction_ids:
+            trx = by_id.get(trx_id)
+            if trx is not None:
+                filename = secure_filename(f"recu_{trx.ticket_number or trx.id}.pdf")
+                jobs.append((filename, PDFService.receipt_context(trx), fmt))
+        return jobs
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: the workers do not inherit the web worker's threads, locks and DB connections
+                self._executor = ProcessPoolExecutor(max_workers=self.worker_count,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def render(self, jobs):
+        """Yields (filename, PDF bytes or None on failure), in the order of the jobs."""
+        if len(jobs) < self.inline_below or self.worker_count <= 1:
+            # Not worth a round trip to the pool
+            for job in jobs:
+                yield self._render_inline(job)
+            return
+
+        pool = self._pool()
+        window = self.window or self.worker_count * 2
+        pending = deque()
+        jobs = iter(jobs)
+        for job in jobs:
+            pending.append((job[0], pool.submit(_render_receipt, job)))
+            if len(pending) >= window:
+                break
+        while pending:
+            filename, future = pending.popleft()
+            next_job = next(jobs, None)
+            if next_job is not None:
+                pending.append((next_job[0], pool.submit(_render_receipt, next_job)))
+            try:
+                yield future.result()
+            except Exception as e:
+                print(f"Receipt {filename} failed: {e}")
+                yield filename, None
+
+    @staticmethod
+    def _render_inline(job):
+        try:
+            return _render_receipt(job)
+        except Exception as e:
+            print(f"Receipt {job[0]} failed: {e}")
+            return job[0], None
+
+    def zip_stream(self, jobs):
+        """Yields the ZIP archive of the receipts piece by piece (one piece per receipt)."""
+        output = _ZipOutput()
+        failed = []
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for filename, pdf in self.render(jobs):
+                if pdf is None:
+                    failed.append(filename)
+                    continue
+                archive.writestr(filename, pdf)
+                yield output.drain()
+            if failed:
+                archive.writestr('ERREURS.txt', "Reçus non générés :\n" + "\n".join(failed) + "\n")
+        yield output.drain()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+receipt_batch = ReceiptBatchService()
@@ -0,0 +1,344 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: storage_backend.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+class LocalStorage:
+    """
+    Uploads in a directory of this node (single node, or a volume shared by every node).
+    Keys are relative paths (`blobs/ab/cd/<sha256>.jpg`); `base_url` is where the directory is served.
+    Work files go to `tmp_root`, outside of it: they have not been checked yet and must not be served.
+    """
+    COPY_BUFFER = 64 * 1024
+
+    def __init__(self, root: str, base_url: str = '/media', tmp_root: str = None):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+        self.tmp_root = tmp_root or os.path.join(tempfile.gettempdir(), 'rentpilot-uploads')
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def save(self, key: str, stream):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as tmp:
+            shutil.copyfileobj(stream, tmp, LocalStorage.COPY_BUFFER)
+        os.replace(tmp_path, path)
+
+    def save_file(self, key: str, local_path: str):
+        """Moves a local file (consumed) to `key`."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.move(local_path, path)
+
+    def open(self, key: str):
+        return open(self._path(key), 'rb')
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self._path(key))
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self._path(key))
+
+    def delete(self, key: str):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def list(self, prefix: str) -> list:
+        directory = self._path(prefix.rstrip('/'))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(f"{prefix.rstrip('/')}/{name}" for name in os.listdir(directory))
+
+    def delete_prefix(self, prefix: str):
+        """Deletes every object under `prefix/`, and its directory."""
+        shutil.rmtree(self._path(prefix.rstrip('/')), ignore_errors=True)
+
+    def local_path(self, key: str) -> str:
+        return self._path(key)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def scratch_dir(self) -> str:
+        return os.path.join(self.tmp_root, 'tmp')
+
+    def work_area(self):
+        """Storage for objects being assembled (resumable upload chunks), rooted in tmp_root."""
+        return LocalStorage(self.tmp_root, self.base_url, self.tmp_root)
+
+class S3Storage:
+    """
+    Uploads in an S3-compatible bucket (AWS, MinIO, Ceph...), shared by every web node.
+    The client is created with boto3 on first use unless one is given (InMemoryS3Client in tests).
+    """
+
+    def __init__(self, bucket: str, client=None, prefix: str = '', endpoint_url: str = None,
+                 region: str = None, public_url: str = None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                try:
+                    import boto3
+                except ImportError:
+                    raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+                self._client = boto3.client('s3', endpoint_url=self.endpoint_url, region_name=self.region)
+            return self._client
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    @staticmethod
+    def _is_missing(error) -> bool:
+        code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+        return code in ('404', 'NoSuchKey', 'NotFound')
+
+    def save(self, key: str, stream):
+        # Multipart upload above the client threshold: the stream is never read whole
+        self.client.upload_fileobj(stream, self.bucket, self._key(key))
+
+    def save_file(self, key: str, local_path: str):
+        """Uploads a local file (consumed) to `key`."""
+        self.client.upload_file(local_path, self.bucket, self._key(key))
+        os.remove(local_path)
+
+    def open(self, key: str):
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception as e:
+            if self._is_missing(e):
+                return False
+            raise
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=self._key(key))['ContentLength']
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def list(self, prefix: str) -> list:
+        keys, token = [], None
+        while True:
+            params = {'Bucket': self.bucket, 'Prefix': self._key(prefix)}
+            if token:
+                params['ContinuationToken'] = token
+            page = self.client.list_objects_v2(**params)
+            keys.extend(item['Key'][len(self.prefix):] for item in page.get('Contents', []))
+            if not page.get('IsTruncated'):
+                return sorted(keys)
+            token = page['NextContinuationToken']
+
+    def delete_prefix(self, prefix: str):
+        for key in self.list(prefix.rstrip('/') + '/'):
+            self.delete(key)
+
+    def local_path(self, key: str):
+        return None
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{self._key(key)}"
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{self._key(key)}"
+        return f"https://{self.bucket}.s3.amazonaws.com/{self._key(key)}"
+
+    def scratch_dir(self) -> str:
+        return os.path.join(tempfile.gettempdir(), 'rentpilot-uploads')
+
+    def work_area(self):
+        # The bucket is shared by every node: chunks stay there, under keys /media never serves
+        return self
+
+class ObjectNotFound(Exception):
+    """Raised by InMemoryS3Client like botocore's ClientError for a missing key."""
+
+    def __init__(self, key: str):
+        super().__init__(f"NoSuchKey: {key}")
+        self.response = {'Error': {'Code': 'NoSuchKey'}}
+
+class InMemoryS3Client:
+    """
+    Local emulator of the S3 client calls used by S3Storage, for tests and development without
+    a bucket (STORAGE_BACKEND=memory). Objects live in this process only.
+    """
+
+    def __init__(self, page_size: int = 1000):
+        self.page_size = page_size
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body=b''):
+        data = Body.read() if hasattr(Body, 'read') else bytes(Body)
+        with self._lock:
+            self.objects[(Bucket, Key)] = data
+
+    def upload_fileobj(self, Fileobj, Bucket, Key):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj)
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, 'rb') as f:
+            self.put_object(Bucket=Bucket, Key=Key, Body=f)
+
+    def _get(self, Bucket, Key):
+        with self._lock:
+            data = self.objects.get((Bucket, Key))
+        if data is None:
+            raise ObjectNotFound(Key)
+        return data
+
+    def get_object(self, Bucket, Key):
+        data = self._get(Bucket, Key)
+        return {'Body': io.BytesIO(data), 'ContentLength': len(data)}
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(self._get(Bucket, Key))}
+
+    def delete_object(self, Bucket, Key):
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None):
+        with self._lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + self.page_size]
+        with self._lock:
+            contents = [{'Key': key, 'Size': len(self.objects.get((Bucket, key), b''))} for key in page]
+        truncated = start + self.page_size < len(keys)
+        result = {'Contents': contents, 'IsTruncated': truncated}
+        if truncated:
+            result['NextContinuationToken'] = str(start + self.page_size)
+        return result
+
+class Storage:
+    """
+    Storage of every upload (proofs, tickets, chat media, branding), behind one backend chosen
+    by STORAGE_BACKEND: `local` (UPLOAD_FOLDER), `s3` (S3_BUCKET...) or `memory` (emulator).
+    Records store keys; url() turns a key into a public URL, on MEDIA_CDN_URL when it is set.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.cdn_url = None
+
+    def init_app(self, app):
+        kind = app.config.get('STORAGE_BACKEND', 'local')
+        if kind == 's3':
+            backend = S3Storage(
+                app.config['S3_BUCKET'],
+                prefix=app.config.get('S3_PREFIX') or '',
+                endpoint_url=app.config.get('S3_ENDPOINT_URL'),
+                region=app.config.get('S3_REGION'),
+                public_url=app.config.get('S3_PUBLIC_URL')
+            )
+        elif kind == 'memory':
+            # Nothing to redirect to: /media reads the objects from the emulator
+            backend = S3Storage('rentpilot', client=InMemoryS3Client(), public_url=app.config.get('MEDIA_BASE_URL', '/media'))
+        else:
+            backend = LocalStorage(app.config['UPLOAD_FOLDER'], app.config.get('MEDIA_BASE_URL', '/media'),
+                                   app.config.get('UPLOAD_TMP_FOLDER'))
+        self.set_backend(backend)
+        cdn_url = app.config.get('MEDIA_CDN_URL')
+        self.cdn_url = cdn_url.rstrip('/') if cdn_url else None
+
+    def set_backend(self, backend):
+        self.backend = backend
+
+    def save(self, key: str, stream):
+        self.backend.save(key, stream)
+
+    def save_file(self, key: str, local_path: str):
+        self.backend.save_file(key, local_path)
+
+    def open(self, key: str):
+        return self.backend.open(key)
+
+    def exists(self, key: str) -> bool:
+        return self.backend.exists(key)
+
+    def size(self, key: str) -> int:
+        return self.backend.size(key)
+
+    def delete(self, key: str):
+        self.backend.delete(key)
+
+    def list(self, prefix: str) -> list:
+        return self.backend.list(prefix)
+
+    def local_path(self, key: str):
+        """Path of the object on this node's disk, None when it lives in a bucket."""
+        return self.backend.local_path(key)
+
+    def work_area(self):
+        """
+        Backend for objects not checked yet (resumable upload chunks): a directory outside the
+        served uploads for the local backend, the bucket itself for S3.
+        """
+        return self.backend.work_area()
+
+    def scratch_dir(self) -> str:
+        """Local directory for files being assembled before they are stored."""
+        path = self.backend.scratch_dir()
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @contextmanager
+    def local_copy(self, key: str):
+        """Path of the content on this node's disk: the file itself, or a temporary download."""
+        path = self.backend.local_path(key)
+        if path is not None:
+            yield path
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.scratch_dir(), suffix=os.path.splitext(key)[1])
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                body = self.open(key)
+                shutil.copyfileobj(body, tmp, LocalStorage.COPY_BUFFER)
+            yield tmp_path
+        finally:
+            os.remove(tmp_path)
+
+    def url(self, key: str):
+        """
+        Public URL of a stored key. Content-addressed keys never change content, so the CDN can
+        cache them forever. Values that already are URLs or legacy `statics/...` paths pass through.
+        """
+        if not key:
+            return key
+        if key.startswith(('/', 'http://', 'https://')):
+            return key
+        if key.startswith('statics/'):
+            return '/' + key
+        if self.cdn_url:
+            return f"{self.cdn_url}/{key}"
+        return self.backend.url(key)
+
+storage = Storage()
@@ -0,0 +1,150 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: tenant_index.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, FrozenSet, Iterable, Optional
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from config.extensions import db
+from models.establishment import Room, Lease
+
+class ActiveTenantIndex:
+    """
+    In-process cache answering "who lives in this establishment today" (set of user ids).
+
+    Each entry is computed from all the leases of the establishment and stays valid between the
+    two lease boundaries (a start date, or the day after an end date) surrounding the day it was
+    computed for, so it rolls over by itself at midnight when a lease starts or ends.
+    Lease and Room changes invalidate the entries of their establishments (listener below);
+    `ttl` bounds the staleness of changes made by other processes.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('ACTIVE_TENANT_INDEX_SIZE', self.maxsize)
+        self.ttl = app.config.get('ACTIVE_TENANT_INDEX_TTL', self.ttl)
+        # A new application may point to another database
+        self.clear()
+
+    def get(self, establishment_id: int, day: Optional[date] = None) -> FrozenSet[int]:
+        """User ids of the tenants whose lease covers `day` (today by default)."""
+        return self.get_many([establishment_id], day)[establishment_id]
+
+    def get_many(self, establishment_ids: Iterable[int], day: Optional[date] = None) -> Dict[int, FrozenSet[int]]:
+        """Bulk variant: {establishment_id: user ids}, with a single query for all the misses."""
+        day = day or datetime.now().date()
+        now = time.monotonic()
+        result, missing = {}, []
+
+        with self._lock:
+            for est_id in dict.fromkeys(establishment_ids):
+                entry = self._entries.get(est_id)
+                if entry and entry[1] <= day < entry[2] and entry[3] > now:
+                    self._entries.move_to_end(est_id)
+                    result[est_id] = entry[0]
+                    self.hits += 1
+                else:
+                    missing.append(est_id)
+                    self.misses += 1
+
+        if missing:
+            computed = self._compute(missing, day)
+            with self._lock:
+                for est_id, entry in computed.items():
+                    self._entries[est_id] = entry + (now + self.ttl,)
+                    self._entries.move_to_end(est_id)
+                    result[est_id] = entry[0]
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return result
+
+    def invalidate(self, establishment_ids: Iterable[int]):
+        with self._lock:
+            for est_id in establishment_ids:
+                self._entries.pop(est_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @staticmethod
+    def _compute(establishment_ids, day):
+        """(tenants, valid_from, valid_until) per establishment, from one query over their leases."""
+        leases = {est_id: [] for est_id in establishment_ids}
+        rows = db.session.query(Room.establishment_id, Lease.user_id, Lease.start_date, Lease.end_date)\
+            .join(Lease, Lease.room_id == Room.id).filter(Room.establishment_id.in_(establishment_ids))
+        for est_id, user_id, start, end in rows:
+            leases[est_id].append((user_id, start, end))
+
+        computed = {}
+        for est_id, est_leases in leases.items():
+            tenants = frozenset(user_id for user_id, start, end in est_leases
+                                if start <= day and (end is None or end >= day))
+            boundaries = [start for _, start, _ in est_leases] + [end + timedelta(days=1) for _, _, end in est_leases if end]
+            valid_from = max((b for b in boundaries if b <= day), default=date.min)
+            valid_until = min((b for b in boundaries if b > day), default=date.max)
+            computed[est_id] = (tenants, valid_from, valid_until)
+        return computed
+
+tenant_index = ActiveTenantIndex()
+
+# Invalidation: establishments touched by Lease/Room rows are collected at flush time and
+# dropped from the index right away (same-transaction reads) and again after the commit, so an
+# entry rebuilt by another thread in between from the old data does not survive.
+_PENDING_KEY = 'tenant_index_pending'
+
+def _touched_establishments(connection, objects):
+    est_ids, room_ids = set(), set()
+    for obj in objects:
+        attr = 'establishment_id' if isinstance(obj, Room) else 'room_id'
+        history = inspect(obj).attrs[attr].history
+        values = [getattr(obj, attr)] + list(history.deleted or [])
+        (est_ids if isinstance(obj, Room) else room_ids).update(v for v in values if v is not None)
+    if room_ids:
+        est_ids.update(connection.execute(
+            select(Room.__table__.c.establishment_id).where(Room.__table__.c.id.in_(room_ids))
+        ).scalars())
+    return est_ids
+
+@event.listens_for(Session, 'after_flush')
+def _collect_lease_changes(session, flush_context):
+    changed = [obj for obj in (*session.new, *session.dirty, *session.deleted) if isinstance(obj, (Lease, Room))]
+    if not changed:
+        return
+    est_ids = _touched_establishments(session.connection(), changed)
+    session.info.setdefault(_PENDING_KEY, set()).update(est_ids)
+    tenant_index.invalidate(est_ids)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    est_ids = session.info.pop(_PENDING_KEY, None)
+    if est_ids:
+        tenant_index.invalidate(est_ids)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_after_rollback(session, previous_transaction):
+    est_ids = session.info.pop(_PENDING_KEY, None)
+    if est_ids:
+        # Entries rebuilt from the rolled back data must go as well
+        tenant_index.invalidate(est_ids)
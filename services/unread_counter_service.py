@@ -0,0 +1,91 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Service logic for unread counter module.
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+from config.extensions import db
+from models.communication import ChatRoom, Message, ChatReadState
+from services.chat_service import ChatService
+from sqlalchemy import and_, or_, func
+from sqlalchemy.exc import IntegrityError
+
+class UnreadCounterService:
+    """
+    Per-user, per-room unread counters kept on ChatReadState.unread_count:
+    incremented when a message is sent, recounted when the user's read mark moves (ChatService.mark_read_up_to).
+    """
+
+    @staticmethod
+    def on_message_sent(message: Message, recipient_ids):
+        """Adds the new message to the counters of its recipients (sender excluded). Does not commit."""
+        recipients = set(recipient_ids) - {message.sender_id}
+        if not recipients:
+            return
+        db.session.flush() # The message row must be visible to the counts below
+
+        room_id = message.chat_room_id
+        existing = {user_id for (user_id,) in db.session.query(ChatReadState.user_id).filter(
+            ChatReadState.chat_room_id == room_id, ChatReadState.user_id.in_(recipients)
+        )}
+        for user_id in recipients - existing:
+            # First counter of this user in the room: start from the history (new message included)
+            try:
+                with db.session.begin_nested():
+                    db.session.add(ChatReadState(user_id=user_id, chat_room_id=room_id,
+                                                 unread_count=ChatService.unread_count(room_id, user_id)))
+            except IntegrityError:
+                existing.add(user_id) # Created concurrently: increment it instead
+
+        if existing:
+            ChatReadState.query.filter(
+                ChatReadState.chat_room_id == room_id, ChatReadState.user_id.in_(existing)
+            ).update({ChatReadState.unread_count: ChatReadState.unread_count + 1}, synchronize_session=False)
+
+    @staticmethod
+    def counts_for_user(user_id: int) -> dict:
+        """{chat_room_id: unread count} for every room the user has a counter in, in one query."""
+        rows = db.session.query(ChatReadState.chat_room_id, ChatReadState.unread_count)\
+            .filter(ChatReadState.user_id == user_id)
+        return {room_id: count for room_id, count in rows}
+
+    @staticmethod
+    def rebuild(room_ids=None) -> int:
+        """
+        Repair / first deployment: creates the missing counters of the current participants and
+        recomputes every counter from the history in one grouped query. Returns the counters written.
+        """
+        rooms = ChatRoom.query
+        if room_ids:
+            rooms = rooms.filter(ChatRoom.id.in_(room_ids))
+        rooms = rooms.all()
+        if not rooms:
+            return 0
+
+        existing = set(db.session.query(ChatReadState.user_id, ChatReadState.chat_room_id)
+                       .filter(ChatReadState.chat_room_id.in_([room.id for room in rooms])))
+        for room in rooms:
+            for user_id in ChatService.participant_ids(room):
+                if (user_id, room.id) not in existing:
+                    db.session.add(ChatReadState(user_id=user_id, chat_room_id=room.id))
+        db.session.flush()
+
+        counts = db.session.query(ChatReadState.user_id, ChatReadState.chat_room_id, func.count(Message.id))\
+            .outerjoin(Message, and_(
+                Message.chat_room_id == ChatReadState.chat_room_id,
+                Message.sender_id != ChatReadState.user_id,
+                or_(ChatReadState.last_read_message_id.is_(None),
+                    Message.timestamp > ChatReadState.last_read_timestamp,
+                    and_(Message.timestamp == ChatReadState.last_read_timestamp,
+                         Message.id > ChatReadState.last_read_message_id))
+            ))\
+            .filter(ChatReadState.chat_room_id.in_([room.id for room in rooms]))\
+            .group_by(ChatReadState.user_id, ChatReadState.chat_room_id).all()
+
+        db.session.bulk_update_mappings(ChatReadState, [
+            {'user_id': user_id, 'chat_room_id': room_id, 'unread_count': count}
+            for user_id, room_id, count in counts
+        ])
+        db.session.commit()
+        return len(counts)
@@ -7,27 +7,113 @@
 * Auditer par : La CyberConfiance, www.cyberconfiance.com
 """
 import os
-import uuid
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from services.blob_store import BlobStore
+
+class UploadRejected(ValueError):
+    """Upload refused while it streams in; `status_code` is the HTTP answer (413 too large, 415 wrong type)."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class CheckedStream:
+    """
+    Read-through wrapper of an upload stream, consumed in fixed-size chunks by BlobStore.put.
+    The first bytes must match the magic number of the declared extension and the total may not
+    exceed `max_bytes`: either failure raises UploadRejected at the chunk where it is detected,
+    before the rest of the body is read.
+    """
+
+    def __init__(self, stream, ext: str, max_bytes: int = None, sniff: bool = True):
+        self.stream = stream
+        self.ext = ext.lower()
+        self.max_bytes = max_bytes
+        self.bytes_read = 0
+        self._head = b'' if sniff else None
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        if self.max_bytes is not None and self.bytes_read > self.max_bytes:
+            raise UploadRejected("File too large", 413)
+
+        if self._head is not None:
+            self._head += data[:UploadService.SNIFF_SIZE]
+            # Short reads are possible on a network stream: wait for enough bytes, or the end
+            if len(self._head) >= UploadService.SNIFF_SIZE or not data:
+                if not UploadService.matches_signature(self._head, self.ext):
+                    raise UploadRejected("File content does not match its type", 415)
+                self._head = None
+        return data
 
 class UploadService:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf', 'heic'}
-    UPLOAD_FOLDER = 'statics/uploads'
+    MAX_FILE_SIZE = 10 * 1024 * 1024
+
+    # Accepted leading bytes per extension: any of the alternatives, each a list of (offset, bytes)
+    SIGNATURES = {
+        'png': [[(0, b'\x89PNG\r\n\x1a\n')]],
+        'jpg': [[(0, b'\xff\xd8\xff')]],
+        'jpeg': [[(0, b'\xff\xd8\xff')]],
+        'pdf': [[(0, b'%PDF-')]],
+        'heic': [[(4, b'ftyp')]],
+        'wav': [[(0, b'RIFF'), (8, b'WAVE')]],
+        'mp3': [[(0, b'ID3')], [(0, b'\xff\xfb')], [(0, b'\xff\xf3')], [(0, b'\xff\xf2')]],
+        'webm': [[(0, b'\x1a\x45\xdf\xa3')]],
+        'ogg': [[(0, b'OggS')]],
+    }
+    SNIFF_SIZE = 16
 
     @staticmethod
     def allowed_file(filename: str) -> bool:
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in UploadService.ALLOWED_EXTENSIONS
 
+    @staticmethod
+    def matches_signature(head: bytes, ext: str) -> bool:
+        """True if `head` (the first bytes of a file) is a plausible `ext` file."""
+        alternatives = UploadService.SIGNATURES.get(ext.lower())
+        if alternatives is None:
+            return False
+        return any(
+            all(head[offset:offset + len(magic)] == magic for offset, magic in parts)
+            for parts in alternatives
+        )
+
+    @staticmethod
+    def checked_stream(stream, ext: str, max_bytes: int = None, sniff: bool = True) -> CheckedStream:
+        if max_bytes is None:
+            max_bytes = UploadService.MAX_FILE_SIZE
+        return CheckedStream(stream, ext, max_bytes, sniff)
+
+    @staticmethod
+    def validate_file(file_storage, ext: str, max_bytes: int = None):
+        """
+        Size and type checks for code that needs the whole file at once (Pillow): the multipart
+        parser has already spooled it, so this only peeks at the head and seeks to the end.
+        """
+        stream = file_storage.stream
+        stream.seek(0, os.SEEK_END)
+        if stream.tell() > (max_bytes or UploadService.MAX_FILE_SIZE):
+            raise UploadRejected("File too large", 413)
+        stream.seek(0)
+        head = stream.read(UploadService.SNIFF_SIZE)
+        stream.seek(0)
+        if not UploadService.matches_signature(head, ext):
+            raise UploadRejected("File content does not match its type", 415)
+
     @staticmethod
     def save_file(file_storage, subfolder: str = 'proofs') -> str:
         """
-        Saves a file with a secure, unique name.
+        Saves a file in the content-addressed store: an identical file uploaded before (here or in
+        the chat) is not stored twice, its path is returned with one more reference.
+        The content is streamed in chunks and refused (UploadRejected) as soon as it exceeds
+        MAX_FILE_SIZE or its first bytes do not match the extension.
 
         :param file_storage: The FileStorage object from Flask (request.files['...'])
-        :param subfolder: Subdirectory inside allowed upload folder (e.g., 'proofs', 'avatars')
-        :return: The relative path to the saved file (e.g. 'statics/uploads/proofs/abc-123.jpg')
+        :param subfolder: Kept for compatibility; blobs are shared by every kind of upload
+        :return: The storage key of the file (e.g. 'blobs/ab/cd/abcd...ef.jpg'), see storage.url()
         """
         if not file_storage or file_storage.filename == '':
             raise ValueError("No file provided")
@@ -35,16 +121,6 @@ class UploadService:
         if not UploadService.allowed_file(file_storage.filename):
             raise ValueError("File type not allowed")
 
-        # Create directory if not exists
-        target_dir = os.path.join(UploadService.UPLOAD_FOLDER, subfolder)
-        os.makedirs(target_dir, exist_ok=True)
-
-        # Generate unique filename
         ext = file_storage.filename.rsplit('.', 1)[1].lower()
-        unique_name = f"{uuid.uuid4().hex}_{int(datetime.now().timestamp())}.{ext}"
-
-        # Full path
-        file_path = os.path.join(target_dir, unique_name)
-        file_storage.save(file_path)
-
-        return file_path
\ No newline at end of file
+        stream = UploadService.checked_stream(file_storage.stream, ext)
+        return BlobStore.put(stream, ext).path
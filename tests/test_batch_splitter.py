@@ -0,0 +1,173 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: test_batch_splitter.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import sys
+import os
+import math
+import random
+import unittest
+from types import SimpleNamespace
+
+# Add root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from algorithms.cost_splitter import CostCalculator, VacancyStrategy
+from algorithms.batch_splitter import BatchCostCalculator
+from algorithms.vacancy_simulator import VacancySimulator
+from models.establishment import FinancialMode, SaaSBilledTo
+from utils.money import Money, allocate_cents
+
+
+def build_portfolio(n_establishments, seed=42):
+    """Synthetic duck-typed establishments, rooms and invoices."""
+    rng = random.Random(seed)
+    establishments, invoices = [], []
+    room_id = 1
+    for est_id in range(1, n_establishments + 1):
+        plan = SimpleNamespace(price_monthly=rng.choice([0.0, 9.99, 20.0]))
+        rooms = []
+        for _ in range(rng.randint(0, 8)):
+            rooms.append(SimpleNamespace(id=room_id, base_price=round(rng.uniform(200, 900), 2),
+                                         is_vacant=rng.random() < 0.3))
+            room_id += 1
+        est = SimpleNamespace(
+            id=est_id,
+            config_financial_mode=rng.choice([FinancialMode.EGAL, FinancialMode.INEGAL]),
+            saas_billed_to=rng.choice([SaaSBilledTo.LANDLORD, SaaSBilledTo.TENANTS]),
+            subscription_plan=plan,
+            syndic_cost=rng.choice([None, 0.0, 45.5]),
+            wifi_cost=rng.choice([None, 29.99]),
+            rooms=rooms
+        )
+        establishments.append(est)
+        for _ in range(rng.randint(0, 5)):
+            invoices.append(SimpleNamespace(establishment_id=est_id, amount=round(rng.uniform(10, 300), 2)))
+    return establishments, invoices
+
+
+class TestBatchCostCalculator(unittest.TestCase):
+
+    def assertResultsEqual(self, expected, actual):
+        self.assertEqual(expected.keys(), actual.keys())
+        for key, value in expected.items():
+            if isinstance(value, dict):
+                self.assertResultsEqual(value, actual[key])
+            elif isinstance(value, float):
+                self.assertAlmostEqual(value, actual[key], places=9)
+            else:
+                self.assertEqual(value, actual[key])
+
+    def test_matches_scalar_path(self):
+        establishments, invoices = build_portfolio(300)
+
+        for strategy in VacancyStrategy:
+            batch = BatchCostCalculator.from_models(establishments, invoices, vacancy_strategy=strategy)
+            results = batch.to_results()
+
+            for est in establishments:
+                est_invoices = [inv for inv in invoices if inv.establishment_id == est.id]
+                expected = CostCalculator(est, est.rooms, est_invoices, vacancy_strategy=strategy).calculate()
+                self.assertResultsEqual(expected, results[est.id])
+
+    def test_per_establishment_strategies(self):
+        establishments, invoices = build_portfolio(50, seed=7)
+        strategies = [VacancyStrategy.OWNER_PAYS if i % 2 else VacancyStrategy.REDISTRIBUTE
+                      for i in range(len(establishments))]
+
+        results = BatchCostCalculator.from_models(establishments, invoices, vacancy_strategy=strategies).to_results()
+
+        for est, strategy in zip(establishments, strategies):
+            est_invoices = [inv for inv in invoices if inv.establishment_id == est.id]
+            expected = CostCalculator(est, est.rooms, est_invoices, vacancy_strategy=strategy).calculate()
+            self.assertResultsEqual(expected, results[est.id])
+
+    def test_cents_matches_scalar_and_is_exact(self):
+        establishments, invoices = build_portfolio(300, seed=3)
+
+        for strategy in VacancyStrategy:
+            results = BatchCostCalculator.from_models(establishments, invoices, vacancy_strategy=strategy).to_cents_results()
+
+            for est in establishments:
+                est_invoices = [inv for inv in invoices if inv.establishment_id == est.id]
+                expected = CostCalculator(est, est.rooms, est_invoices, vacancy_strategy=strategy).calculate_cents()
+                self.assertEqual(expected, results[est.id])
+
+                if 'grand_total' in expected:
+                    collected = sum(room['total'] for room in expected['breakdown_per_room'].values())
+                    self.assertEqual(collected + expected['owner_absorbed'], expected['grand_total'])
+
+    def test_unknown_establishment_rejected(self):
+        with self.assertRaises(ValueError):
+            BatchCostCalculator([1], ['Egal'], [0.0], [0.0], [0.0], [0.0],
+                                room_ids=[10], room_establishment_ids=[2],
+                                room_prices=[100.0], room_vacant=[False])
+
+class TestVacancySimulator(unittest.TestCase):
+
+    def test_curves_match_scalar_calls(self):
+        prices = [400.0, 550.0, 620.5, 480.0]
+        sim = VacancySimulator(prices, invoice_total=310.0, syndic_cost=40.0, wifi_cost=29.99, saas_fee=9.99)
+        result = sim.simulate()
+        self.assertEqual(result["occupancy"].tolist(), [0, 1, 2, 3, 4])
+
+        for mode in (FinancialMode.EGAL, FinancialMode.INEGAL):
+            for strategy in VacancyStrategy:
+                curve = result["curves"][mode.value][strategy.value]
+                for k in range(len(prices) + 1):
+                    rooms = [SimpleNamespace(id=i + 1, base_price=p, is_vacant=i >= k) for i, p in enumerate(prices)]
+                    est = SimpleNamespace(id=1, config_financial_mode=mode, syndic_cost=40.0, wifi_cost=29.99,
+                                          saas_billed_to=SaaSBilledTo.TENANTS,
+                                          subscription_plan=SimpleNamespace(price_monthly=9.99))
+                    expected = CostCalculator(est, rooms, [SimpleNamespace(amount=310.0)], strategy).calculate()
+                    billed = expected["breakdown_per_room"]
+                    self.assertAlmostEqual(curve["collected_total"][k], sum(r["total"] for r in billed.values()))
+                    if k == 0:
+                        # The scalar path returns an empty result for an empty house
+                        self.assertTrue(math.isnan(curve["tenant_mean_total"][k]))
+                        owner_pays = mode == FinancialMode.INEGAL and strategy == VacancyStrategy.OWNER_PAYS
+                        self.assertAlmostEqual(curve["owner_absorbed"][k], 310.0 if owner_pays else 0.0)
+                    else:
+                        self.assertAlmostEqual(curve["owner_absorbed"][k],
+                                               expected["details"].get("owner_absorbed_vacancy_costs", 0.0))
+                        self.assertAlmostEqual(curve["tenant_mean_total"][k],
+                                               sum(r["total"] for r in billed.values()) / k)
+
+        # Fewer tenants: each pays more when vacancy is redistributed, the owner absorbs it otherwise
+        redistribute = result["curves"]["Inegal"]["redistribute"]["tenant_charges_share"]
+        owner_pays = result["curves"]["Inegal"]["owner_pays"]
+        self.assertGreater(redistribute[1], redistribute[4])
+        self.assertAlmostEqual(redistribute[1] - owner_pays["tenant_charges_share"][1], 310.0 * 3 / 4)
+        self.assertGreater(owner_pays["owner_absorbed"][1], owner_pays["owner_absorbed"][4])
+
+        payload = VacancySimulator.to_json(result)
+        self.assertIsNone(payload["curves"]["Egal"]["redistribute"]["tenant_mean_total"][0])
+
+    def test_non_finite_invoice_total_is_rejected(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.assertRaises(ValueError):
+                VacancySimulator([400.0, 550.0], invoice_total=value)
+
+
+class TestMoney(unittest.TestCase):
+
+    def test_largest_remainder(self):
+        self.assertEqual(allocate_cents(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(allocate_cents(10, [1, 2, 3]), [2, 3, 5])
+        self.assertEqual(allocate_cents(-100, [1, 1, 1]), [-34, -33, -33])
+        with self.assertRaises(ValueError):
+            allocate_cents(100, [0, 0])
+
+    def test_money(self):
+        total = Money.from_float(1000.01)
+        self.assertEqual(total.cents, 100001)
+        shares = total.split(3)
+        self.assertEqual(sum(shares, Money()), total)
+        self.assertEqual(str(shares[0]), "333.34")
+        self.assertEqual(Money.from_float(0.1) + Money.from_float(0.2), Money.from_float(0.3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,304 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: test_chat_hub.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import sys
+import os
+import io
+import json
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+
+# Add root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.init_app import create_app
+from config.extensions import db
+from models.establishment import Establishment, EstablishmentOwner, EstablishmentOwnerRole
+from models.users import User, UserRole
+from models.communication import Message, ChatRoom, MessageType, ChannelType, MediaStatus
+from services.chat_hub import ChatHub, ChatBroker, SocketBrokerBackend, chat_hub
+from services.chat_service import ChatService
+from services.media_pipeline import MediaPipeline, media_pipeline
+from services.storage_backend import storage, LocalStorage, S3Storage, InMemoryS3Client
+from services.chunked_upload_service import ChunkedUploadService
+from models.storage import UploadSession
+from PIL import Image
+from security.pwd_tools import hash_password
+
+class TestChatHub(unittest.TestCase):
+    def test_in_process_delivery_and_slow_clients(self):
+        hub = ChatHub(queue_size=2)
+        with hub.subscribe(1) as sub, hub.subscribe(2) as other:
+            hub.publish(1, {'n': 1})
+            self.assertEqual(sub.get(timeout=0), {'n': 1})
+            self.assertIsNone(other.get(timeout=0))
+
+            # A client that does not drain its queue is dropped
+            for n in range(3):
+                hub.publish(1, {'n': n})
+            self.assertTrue(sub.closed)
+            self.assertEqual(hub.subscriber_count(1), 0)
+        self.assertEqual(hub.subscriber_count(2), 0)
+
+    def test_broker_shares_events_between_workers(self):
+        broker = ChatBroker(('127.0.0.1', 0))
+        threading.Thread(target=broker.serve_forever, daemon=True).start()
+        workers = [ChatHub(), ChatHub()]
+        try:
+            for hub in workers:
+                hub.set_backend(SocketBrokerBackend(broker.url, reconnect_delay=0.05))
+                self.assertTrue(hub.backend.wait_connected(timeout=5))
+            deadline = time.monotonic() + 5
+            while broker.client_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            with workers[0].subscribe(7) as local, workers[1].subscribe(7) as remote:
+                workers[0].publish(7, {'type': 'message', 'message': {'id': 1}})
+                self.assertEqual(remote.get(timeout=5), {'type': 'message', 'message': {'id': 1}})
+                self.assertEqual(local.get(timeout=5), {'type': 'message', 'message': {'id': 1}})
+        finally:
+            for hub in workers:
+                hub.backend.close()
+            broker.shutdown()
+            broker.server_close()
+
+    def test_broker_drops_a_worker_that_stops_reading(self):
+        broker = ChatBroker(('127.0.0.1', 0), queue_size=2)
+        threading.Thread(target=broker.serve_forever, daemon=True).start()
+        hub = ChatHub()
+        stalled = socket.socket()
+        stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        try:
+            hub.set_backend(SocketBrokerBackend(broker.url, reconnect_delay=0.05))
+            self.assertTrue(hub.backend.wait_connected(timeout=5))
+            stalled.connect(broker.server_address)
+            deadline = time.monotonic() + 5
+            while broker.client_count < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            # Far more than the socket buffers: the never-read connection fills its own queue,
+            # while the worker that keeps up receives every frame
+            with hub.subscribe(0) as sub:
+                for n in range(300):
+                    hub.publish(0, {'n': n, 'pad': 'x' * 65536})
+                    self.assertEqual(sub.get(timeout=5)['n'], n)
+            deadline = time.monotonic() + 10
+            while broker.client_count > 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(broker.client_count, 1)
+
+        finally:
+            stalled.close()
+            hub.backend.close()
+            broker.shutdown()
+            broker.server_close()
+
+class TestChatStream(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.app.config['CHAT_STREAM_HEARTBEAT'] = 0.05
+        self.app.config['CHAT_STREAM_MAX_DURATION'] = 5
+
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        user = User(email="stream@test.com", role=UserRole.BAILLEUR, password_hash=hash_password("password"))
+        est = Establishment(address="Stream Est")
+        db.session.add_all([user, est])
+        db.session.flush()
+        db.session.add(EstablishmentOwner(user_id=user.id, establishment_id=est.id, role=EstablishmentOwnerRole.PRIMARY))
+        room = ChatRoom(establishment_id=est.id, type=ChannelType.GENERAL)
+        db.session.add(room)
+        db.session.commit()
+        self.user_id, self.room_id = user.id, room.id
+
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(self.user_id)
+            session['_fresh'] = True
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_send_message_publishes(self):
+        with chat_hub.subscribe(self.room_id) as sub:
+            resp = self.client.post(f'/chat/{self.room_id}/send', data={'content': 'Salut'})
+            self.assertEqual(resp.status_code, 302)
+            event = sub.get(timeout=1)
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['message']['content'], 'Salut')
+        self.assertEqual(event['message']['sender_id'], self.user_id)
+
+    def test_stream_replays_missed_messages_then_live_ones(self):
+        first, missed = [Message(chat_room_id=self.room_id, sender_id=self.user_id, content=text, type=MessageType.TEXT)
+                         for text in ("Avant", "Manqué")]
+        db.session.add_all([first, missed])
+        db.session.commit()
+        first_id = first.id
+
+        resp = self.client.get(f'/chat/{self.room_id}/stream', headers={'Last-Event-ID': str(first_id)}, buffered=False)
+        self.assertEqual(resp.mimetype, 'text/event-stream')
+        chunks = iter(resp.response)
+        self.assertTrue(next(chunks).startswith(b"retry:"))
+        frame = next(chunks).decode()
+        self.assertIn(f"id: {first_id + 1}", frame)
+        data = json.loads(frame.split("data: ", 1)[1])
+        self.assertEqual(data['message']['content'], "Manqué")
+        self.assertIn('data-message-id', data['html'])
+
+        self.assertEqual(next(chunks), b": keepalive\n\n")
+        live = Message(id=first_id + 2, chat_room_id=self.room_id, sender_id=self.user_id, content="En direct",
+                       type=MessageType.TEXT, timestamp=datetime.utcnow(), read_by_users=[])
+        chat_hub.publish(self.room_id, {'type': 'message', 'message': ChatService.serialize_message(live)})
+        frame = next(chunks).decode()
+        self.assertIn("En direct", frame)
+        resp.close()
+        self.assertEqual(chat_hub.subscriber_count(self.room_id), 0)
+
+    def test_outsider_cannot_reach_the_room(self):
+        outsider = User(email="outsider@test.com", role=UserRole.BAILLEUR, password_hash=hash_password("password"))
+        db.session.add(outsider)
+        db.session.commit()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(outsider.id)
+
+        self.assertEqual(self.client.get(f'/chat/{self.room_id}/messages').status_code, 403)
+        self.assertEqual(self.client.get(f'/chat/{self.room_id}/stream').status_code, 403)
+        self.assertEqual(self.client.post(f'/chat/{self.room_id}/send', data={'content': 'Intrus'}).status_code, 403)
+        resp = self.client.post(f'/chat/{self.room_id}/uploads', json={'filename': 'voice.webm', 'size': 16})
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(Message.query.count(), 0)
+
+    def test_image_processed_in_background(self):
+        backend = storage.backend
+        storage.set_backend(LocalStorage(tempfile.mkdtemp()))
+        try:
+            img_io = io.BytesIO()
+            Image.new('RGB', (1600, 1200), color='blue').save(img_io, 'PNG')
+            img_io.seek(0)
+
+            with chat_hub.subscribe(self.room_id) as sub:
+                resp = self.client.post(f'/chat/{self.room_id}/send', data={'file': (img_io, 'photo.png')},
+                                        content_type='multipart/form-data')
+                self.assertEqual(resp.status_code, 302)
+                posted = sub.get(timeout=1)
+                self.assertEqual(posted['message']['media_status'], 'pending')
+                self.assertTrue(media_pipeline.join(timeout=10))
+                processed = sub.get(timeout=1)
+
+            self.assertEqual(processed['type'], 'media')
+            db.session.expire_all()
+            msg = db.session.get(Message, posted['message']['id'])
+            self.assertEqual(msg.media_status, MediaStatus.READY)
+            self.assertEqual(msg.file_url, msg.media_variants['full']['jpeg'])
+            self.assertFalse(storage.exists(posted['message']['file_url'])) # raw upload removed
+            with storage.local_copy(msg.media_variants['thumb']['jpeg']) as path, Image.open(path) as thumb:
+                self.assertLessEqual(max(thumb.size), 320)
+        finally:
+            shutil.rmtree(storage.backend.root, ignore_errors=True)
+            storage.set_backend(backend)
+
+    def test_resumable_voice_upload(self):
+        # Chunks go to the shared object store: any web node can receive any of them
+        backend = storage.backend
+        object_store = InMemoryS3Client(page_size=2)
+        storage.set_backend(S3Storage('uploads', client=object_store))
+        chunk_size = ChunkedUploadService.CHUNK_SIZE
+        ChunkedUploadService.CHUNK_SIZE = 8
+        try:
+            voice = b"\x1a\x45\xdf\xa3 webm voice note"
+            resp = self.client.post(f'/chat/{self.room_id}/uploads', json={'filename': 'voice.webm', 'size': len(voice)})
+            self.assertEqual(resp.status_code, 201)
+            upload_id = resp.get_json()['upload_id']
+            url = f'/chat/uploads/{upload_id}'
+
+            resp = self.client.put(url, data=voice[:8], headers={'Upload-Offset': '0'})
+            self.assertEqual(resp.get_json()['offset'], 8)
+            # Resent chunk after a lost response: refused with the offset to resume from
+            resp = self.client.put(url, data=voice[:8], headers={'Upload-Offset': '0'})
+            self.assertEqual((resp.status_code, resp.get_json()['offset']), (409, 8))
+            resp = self.client.put(url, data=voice[8:20], headers={'Upload-Offset': '8'})
+            self.assertEqual(resp.status_code, 413) # larger than a chunk
+            self.assertEqual(self.client.get(url).get_json(), {'offset': 8, 'size': len(voice)})
+
+            for offset in range(8, len(voice), 8):
+                self.client.put(url, data=voice[offset:offset + 8], headers={'Upload-Offset': str(offset)})
+            # Every byte received: an extra chunk at the end offset cannot push the upload past its size
+            resp = self.client.put(url, data=b"\x00" * 5000, headers={'Upload-Offset': str(len(voice))})
+            self.assertEqual((resp.status_code, resp.get_json()['offset']), (409, len(voice)))
+            self.assertEqual(self.client.get(url).get_json(), {'offset': len(voice), 'size': len(voice)})
+            with chat_hub.subscribe(self.room_id) as sub:
+                resp = self.client.post(f'{url}/complete', json={'duration': 4})
+                self.assertTrue(resp.get_json()['success'])
+                self.assertEqual(sub.get(timeout=1)['message']['type'], 'voice')
+
+            msg = Message.query.filter_by(chat_room_id=self.room_id).one()
+            self.assertEqual(msg.duration, 4)
+            self.assertEqual(storage.open(msg.file_url).read(), voice)
+            self.assertEqual(list(object_store.objects), [('uploads', msg.file_url)]) # chunks deleted
+            self.assertIsNone(db.session.get(UploadSession, upload_id))
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+            # A disguised file stops at its first chunk
+            resp = self.client.post(f'/chat/{self.room_id}/uploads', json={'filename': 'photo.jpg', 'size': 16})
+            url = f"/chat/uploads/{resp.get_json()['upload_id']}"
+            resp = self.client.put(url, data=b"MZ\x90\x00 exe", headers={'Upload-Offset': '0'})
+            self.assertEqual(resp.status_code, 415)
+            self.assertEqual(self.client.get(url).get_json()['offset'], 0)
+        finally:
+            ChunkedUploadService.CHUNK_SIZE = chunk_size
+            storage.set_backend(backend)
+
+    def test_local_chunks_stay_out_of_the_served_folder(self):
+        backend = storage.backend
+        root, tmp_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        storage.set_backend(LocalStorage(root, tmp_root=tmp_root))
+        try:
+            voice = b"\x1a\x45\xdf\xa3 webm voice note"
+            resp = self.client.post(f'/chat/{self.room_id}/uploads', json={'filename': 'voice.webm', 'size': len(voice)})
+            url = f"/chat/uploads/{resp.get_json()['upload_id']}"
+            self.client.put(url, data=voice, headers={'Upload-Offset': '0'})
+
+            # Unchecked bytes: under UPLOAD_TMP_FOLDER, not reachable through /media or /statics
+            self.assertEqual(os.listdir(root), [])
+            self.assertTrue(os.listdir(os.path.join(tmp_root, 'parts')))
+            self.assertTrue(self.client.post(f'{url}/complete', json={}).get_json()['success'])
+            msg = Message.query.filter_by(chat_room_id=self.room_id).one()
+            with open(os.path.join(root, msg.file_url), 'rb') as f:
+                self.assertEqual(f.read(), voice)
+            self.assertEqual(storage.work_area().list('parts/'), [])
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+            shutil.rmtree(tmp_root, ignore_errors=True)
+            storage.set_backend(backend)
+
+    def test_saturated_pipeline_runs_inline(self):
+        pipeline = MediaPipeline(workers=1, queue_size=0)
+        pipeline.app = self.app
+        release, ran = threading.Event(), []
+        try:
+            self.assertTrue(pipeline.submit(release.wait, 5))
+            # No slot left: the second task runs in the caller's thread
+            self.assertFalse(pipeline.submit(lambda: ran.append(threading.current_thread().name)))
+            self.assertEqual(ran, [threading.current_thread().name])
+        finally:
+            release.set()
+            pipeline.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
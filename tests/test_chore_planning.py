@@ -0,0 +1,216 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: test_chore_planning.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import sys
+import os
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+# Add root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.init_app import create_app
+from config.extensions import db
+from models.establishment import Establishment, Room, Lease
+from models.users import User, UserRole
+from models.chores import ChoreType, ChoreEvent, ChoreStatus
+from services.chore_service import generate_planning, generate_planning_batch, plan_horizon, on_lease_change
+from algorithms.chore_scheduler import FairChoreScheduler
+
+class TestChorePlanning(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.establishments = []
+        for e in range(3):
+            est = Establishment(address=f"{e} Planning St")
+            db.session.add(est)
+            db.session.flush()
+            tenants = []
+            for i in range(3 if e else 0):
+                user = User(email=f"t{e}{i}@planning.test", role=UserRole.COLOCATAIRE, password_hash="x")
+                room = Room(establishment_id=est.id, name=f"R{i}", base_price=300.0, is_vacant=False)
+                db.session.add_all([user, room])
+                db.session.flush()
+                db.session.add(Lease(user_id=user.id, room_id=room.id, start_date=date.today() - timedelta(days=30)))
+                tenants.append(user)
+            for name, rotating in (("Poubelles", True), ("Cuisine", True), ("Jardin", False)):
+                chore = ChoreType(establishment_id=est.id, name=name, is_rotating=rotating, frequency_days=7)
+                db.session.add(chore)
+                db.session.flush()
+                if tenants and name == "Cuisine":
+                    # Rotation continues after the second tenant
+                    for days, tenant in ((14, tenants[0]), (7, tenants[1])):
+                        db.session.add(ChoreEvent(chore_type_id=chore.id, assigned_user_id=tenant.id,
+                                                  due_date=datetime.now() - timedelta(days=days)))
+            self.establishments.append(est.id)
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def planned(self, since_id):
+        return sorted((e.chore_type_id, e.assigned_user_id, e.status)
+                      for e in ChoreEvent.query.filter(ChoreEvent.id > since_id))
+
+    def test_batch_matches_per_establishment_planning(self):
+        last_id = max(e.id for e in ChoreEvent.query.all())
+
+        for est_id in self.establishments:
+            generate_planning(est_id)
+        expected = self.planned(last_id)
+        ChoreEvent.query.filter(ChoreEvent.id > last_id).delete()
+        db.session.commit()
+
+        created = generate_planning_batch(chunk_size=1)
+        self.assertEqual(created, 4)  # 2 rotating chores x 2 establishments with tenants
+        self.assertEqual(self.planned(last_id), expected)
+        self.assertTrue(all(status == ChoreStatus.PENDING for _, _, status in expected))
+
+        # Next run continues each rotation
+        before = dict((c, u) for c, u, _ in self.planned(last_id))
+        generate_planning_batch(establishment_ids=self.establishments[1:2])
+        newest = ChoreEvent.query.filter(ChoreEvent.id > last_id + 4).all()
+        self.assertEqual(len(newest), 2)
+        for event in newest:
+            self.assertNotEqual(event.assigned_user_id, before[event.chore_type_id])
+
+    def horizon_loads(self, chore_ids, since):
+        loads = {}
+        for event in ChoreEvent.query.filter(ChoreEvent.chore_type_id.in_(chore_ids), ChoreEvent.due_date >= since):
+            loads[event.assigned_user_id] = loads.get(event.assigned_user_id, 0) + event.chore_type.weight
+        return loads
+
+    def test_horizon_balances_weight_and_replans(self):
+        est_id = self.establishments[2]
+        chores = ChoreType.query.filter_by(establishment_id=est_id, is_rotating=True).all()
+        chores[0].weight = 3
+        db.session.commit()
+        chore_ids = [c.id for c in chores]
+        now = datetime.now()
+
+        created = plan_horizon(est_id, weeks=6, now=now)
+        # Poubelles: 5 occurrences (now+7 .. now+35); Cuisine resumes after its last event (now-7)
+        self.assertEqual(created, 11)
+        self.assertEqual(plan_horizon(est_id, weeks=6, now=now), 0)
+
+        loads = self.horizon_loads(chore_ids, now - timedelta(weeks=6))
+        self.assertEqual(len(loads), 3)
+        self.assertLessEqual(max(loads.values()) - min(loads.values()), 3)
+
+        # A tenant leaves: their future pending events go to the others, past ones are kept
+        lease = Lease.query.join(Room).filter(Room.establishment_id == est_id).order_by(Lease.id).first()
+        leaving = lease.user_id
+        # Two of the others swapped a chore: the replan must not undo it
+        others = [e for e in ChoreEvent.query.filter(ChoreEvent.chore_type_id.in_(chore_ids), ChoreEvent.due_date > now)
+                  .order_by(ChoreEvent.due_date) if e.assigned_user_id != leaving]
+        swapped = next(e for e in others if e.assigned_user_id != others[0].assigned_user_id)
+        others[0].assigned_user_id, swapped.assigned_user_id = swapped.assigned_user_id, others[0].assigned_user_id
+        kept = {e.id: e.assigned_user_id for e in others}
+        lease.end_date = date.today()
+        db.session.commit()
+        self.assertGreater(on_lease_change(lease), 0)
+        future = ChoreEvent.query.filter(ChoreEvent.chore_type_id.in_(chore_ids), ChoreEvent.due_date > now).all()
+        self.assertEqual(len(future), 11)
+        self.assertNotIn(leaving, {e.assigned_user_id for e in future})
+        self.assertEqual({e.id: e.assigned_user_id for e in future if e.id in kept}, kept)
+        before = {e.id: e.assigned_user_id for e in future}
+
+        # A newcomer gets a share of the future events
+        newcomer = User(email="new@planning.test", role=UserRole.COLOCATAIRE, password_hash="x")
+        db.session.add(newcomer)
+        db.session.flush()
+        room = Room.query.filter_by(establishment_id=est_id).first()
+        new_lease = Lease(user_id=newcomer.id, room_id=room.id, start_date=date.today())
+        db.session.add(new_lease)
+        db.session.commit()
+        self.assertGreater(on_lease_change(new_lease), 0)
+        future = ChoreEvent.query.filter(ChoreEvent.chore_type_id.in_(chore_ids), ChoreEvent.due_date > now).all()
+        self.assertIn(newcomer.id, {e.assigned_user_id for e in future})
+        # Only handed over to the newcomer: nothing is reshuffled between the others
+        moved = {e.assigned_user_id for e in future if e.assigned_user_id != before[e.id]}
+        self.assertEqual(moved, {newcomer.id})
+        loads = self.horizon_loads(chore_ids, now)
+        self.assertLessEqual(max(loads.values()) - min(loads.values()), 6)
+
+    def test_chore_type_weight_must_be_positive(self):
+        est_id = self.establishments[1]
+        tenant = Lease.query.join(Room).filter(Room.establishment_id == est_id).first().user_id
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(tenant)
+
+        for weight in (0, -2, 1.5, "lourd", True, [3]):
+            resp = client.post('/chores/type', json={'name': 'Vitres', 'weight': weight})
+            self.assertEqual((resp.status_code, resp.get_json()), (400, {'error': 'weight must be a positive number'}))
+        self.assertEqual(ChoreType.query.filter_by(name='Vitres').count(), 0)
+
+        resp = client.post('/chores/type', json={'name': 'Vitres', 'weight': 2})
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(db.session.get(ChoreType, resp.get_json()['id']).weight, 2)
+        resp = client.post('/chores/type', json={'name': 'Salon'})
+        self.assertEqual(db.session.get(ChoreType, resp.get_json()['id']).weight, 1)
+
+    def test_calendar_feed_etag(self):
+        est_id = self.establishments[1]
+        tenant = Lease.query.join(Room).filter(Room.establishment_id == est_id).first().user_id
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(tenant)
+            session['_fresh'] = True
+
+        today = date.today()
+        url = f"/chores/calendar?start={(today - timedelta(days=30)).isoformat()}&end={today.isoformat()}"
+        resp = client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        events = resp.get_json()
+        self.assertEqual([e['title'] for e in events], ["Cuisine", "Cuisine"])
+        # Validations against the active tenants, and against the quorum (every other tenant)
+        self.assertEqual(events[0]['extendedProps']['validation_status'], "0/3 validations")
+        self.assertEqual(events[0]['extendedProps']['quorum_status'], "0/2 validations")
+        etag = resp.headers['ETag']
+
+        # The 304 is decided on the range aggregate alone: the feed query never runs
+        with patch('routes.chore_routes.calendar_feed') as feed:
+            resp = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        feed.assert_not_called()
+
+        event = ChoreEvent.query.get(events[0]['id'])
+        event.status = ChoreStatus.DONE_WAITING_VALIDATION
+        db.session.commit()
+        resp = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers['ETag'], etag)
+
+        # Bulk counter updates change the ETag too
+        etag = resp.headers['ETag']
+        ChoreEvent.query.filter_by(id=event.id).update({ChoreEvent.validation_count: 1}, synchronize_session=False)
+        db.session.commit()
+        resp = client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(resp.get_json()[0]['extendedProps']['validation_status'], "1/3 validations")
+
+    def test_scheduler_skips_inactive_tenants(self):
+        periods = {1: [(date(2026, 1, 1), None)], 2: [(date(2026, 3, 1), None)]}
+        scheduler = FairChoreScheduler(periods)
+        self.assertEqual(scheduler.assign(datetime(2026, 2, 1)), 1)
+        self.assertEqual(scheduler.assign(datetime(2026, 2, 8)), 1)
+        # Tenant 2 arrives with a lower load and catches up first, then they alternate
+        self.assertEqual([scheduler.assign(datetime(2026, 3, d)) for d in (1, 8, 15, 22)], [2, 2, 1, 2])
+        self.assertIsNone(FairChoreScheduler({}).assign(datetime(2026, 1, 1)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,7 +17,7 @@ from models.saas_config import SubscriptionPlan
 from models.chores import ChoreType, ChoreEvent, ChoreValidation, ChoreStatus
 from algorithms.cost_splitter import CostCalculator, VacancyStrategy
 from services.permission_service import add_co_landlord
-from services.chore_service import mark_task_done, validate_task
+from services.chore_service import mark_task_done, validate_task, validate_tasks, recount_validations
 from services.i18n_service import i18n
 from main import create_app
 
@@ -271,6 +271,61 @@ class TestCoreLogic(unittest.TestCase):
         self.assertTrue(success)
         db.session.refresh(event)
         self.assertEqual(event.status, ChoreStatus.COMPLETED, "Should be completed (2/2)")
+        self.assertEqual((event.validation_count, event.required_validations), (2, 2))
+
+        # A second validation by the same tenant is rejected and not counted
+        success, msg = validate_task(event.id, tenants[2].id)
+        self.assertFalse(success)
+        db.session.refresh(event)
+        self.assertEqual(event.validation_count, 2)
+
+    def test_chores_bulk_validation(self):
+        est = Establishment(address="Bulk Chore Test")
+        db.session.add(est)
+        db.session.commit()
+        tenants = []
+        for i in range(3):
+            u = User(email=f"bulk{i}@test.com", password_hash="pwd", role=UserRole.COLOCATAIRE)
+            r = Room(establishment_id=est.id, name=f"R{i}", base_price=100)
+            db.session.add_all([u, r])
+            db.session.flush()
+            db.session.add(Lease(user_id=u.id, room_id=r.id, start_date=date.today()))
+            tenants.append(u)
+        ctype = ChoreType(name="Vaisselle", establishment_id=est.id)
+        db.session.add(ctype)
+        db.session.commit()
+
+        events = []
+        for assignee in (tenants[0], tenants[0], tenants[1]):
+            e = ChoreEvent(chore_type_id=ctype.id, assigned_user_id=assignee.id, due_date=date.today())
+            db.session.add(e)
+            db.session.flush()
+            events.append(e)
+        db.session.commit()
+        for e in events:
+            mark_task_done(e.id, e.assigned_user_id)
+
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(tenants[2].id)
+            session['_fresh'] = True
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        resp = client.post('/chores/confirm', json={'event_ids': [e.id for e in events] + [99999]})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.get_json()
+        self.assertEqual(data['validated'], 3)
+        self.assertFalse(data['results']['99999']['success'])
+
+        # One more validation each completes the events of tenant 0 (quorum 2)
+        results = validate_tasks([e.id for e in events], tenants[1].id)
+        self.assertEqual([ok for ok, _ in results.values()], [True, True, False])
+        statuses = [db.session.get(ChoreEvent, e.id).status for e in events]
+        self.assertEqual(statuses, [ChoreStatus.COMPLETED, ChoreStatus.COMPLETED, ChoreStatus.DONE_WAITING_VALIDATION])
+
+        ChoreEvent.query.update({ChoreEvent.validation_count: 0})
+        db.session.commit()
+        recount_validations()
+        self.assertEqual([db.session.get(ChoreEvent, e.id).validation_count for e in events], [2, 2, 1])
 
     def test_internationalization(self):
         """
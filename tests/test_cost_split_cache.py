@@ -0,0 +1,108 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: test_cost_split_cache.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import sys
+import os
+import unittest
+from datetime import date
+
+# Add root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.init_app import create_app
+from config.extensions import db
+from models.establishment import Establishment, Room, FinancialMode
+from models.finance import Invoice, ExpenseType
+from models.saas_config import SubscriptionPlan
+from algorithms.cost_splitter import CostCalculator
+from services.cost_split_cache import CostSplitCache
+
+class TestCostSplitCache(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.est = Establishment(address="Cache St", config_financial_mode=FinancialMode.EGAL)
+        db.session.add(self.est)
+        db.session.commit()
+        self.room = Room(establishment_id=self.est.id, name="R1", base_price=500.0, is_vacant=False)
+        db.session.add(self.room)
+        db.session.commit()
+
+        self.cache = CostSplitCache(maxsize=2)
+        self.computations = 0
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def compute(self, est):
+        def _compute():
+            self.computations += 1
+            invoices = Invoice.query.filter_by(establishment_id=est.id).all()
+            return CostCalculator(est, est.rooms, invoices).calculate()
+        return _compute
+
+    def split(self):
+        est = db.session.get(Establishment, self.est.id)
+        return self.cache.get_or_compute(est, self.compute(est))
+
+    def test_version_bumps_on_changes(self):
+        v0 = self.est.data_version
+
+        db.session.add(Invoice(establishment_id=self.est.id, type=ExpenseType.EAU, amount=50.0, date=date.today()))
+        db.session.commit()
+        self.assertEqual(self.est.data_version, v0 + 1)
+
+        self.room.base_price = 600.0
+        db.session.commit()
+        self.assertEqual(self.est.data_version, v0 + 2)
+
+        self.est.wifi_cost = 25.0
+        db.session.commit()
+        self.assertEqual(self.est.data_version, v0 + 3)
+
+        plan = SubscriptionPlan(name="Basic", price_monthly=10.0)
+        db.session.add(plan)
+        db.session.commit()
+        self.est.subscription_plan_id = plan.id
+        db.session.commit()
+        plan.price_monthly = 12.0
+        db.session.commit()
+        self.assertEqual(self.est.data_version, v0 + 5)
+
+    def test_hits_and_invalidation(self):
+        first = self.split()
+        second = self.split()
+        self.assertIs(first, second)
+        self.assertEqual(self.computations, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+        db.session.add(Invoice(establishment_id=self.est.id, type=ExpenseType.ELEC, amount=100.0, date=date.today()))
+        db.session.commit()
+
+        third = self.split()
+        self.assertEqual(self.computations, 2)
+        self.assertAlmostEqual(third['per_person_share'], 600.0)
+
+    def test_lru_eviction(self):
+        self.split()
+        for i in range(2):
+            db.session.add(Invoice(establishment_id=self.est.id, type=ExpenseType.EAU, amount=1.0, date=date.today()))
+            db.session.commit()
+            self.split()
+        self.assertEqual(self.cache.stats()['size'], 2)
+        self.assertEqual(self.computations, 3)
+
+if __name__ == '__main__':
+    unittest.main()
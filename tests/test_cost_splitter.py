@@ -0,0 +1,96 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: test_cost_splitter.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import sys
+import os
+import unittest
+from datetime import date
+from types import SimpleNamespace
+
+# Add root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from algorithms.cost_splitter import CostCalculator, VacancyStrategy
+from algorithms.occupancy import occupancy_days, merge_intervals
+from models.establishment import FinancialMode, SaaSBilledTo
+
+
+def make_establishment(mode, rooms, syndic=60.0, wifi=30.0):
+    return SimpleNamespace(
+        id=1,
+        config_financial_mode=mode,
+        saas_billed_to=SaaSBilledTo.LANDLORD,
+        subscription_plan=None,
+        syndic_cost=syndic,
+        wifi_cost=wifi,
+        rooms=rooms
+    )
+
+
+def lease(room_id, start, end=None):
+    return SimpleNamespace(room_id=room_id, start_date=start, end_date=end)
+
+
+class TestPeriodSplit(unittest.TestCase):
+    """
+    Billing window: November 2026 (30 days).
+    """
+    start = date(2026, 11, 1)
+    end = date(2026, 11, 30)
+
+    def setUp(self):
+        self.rooms = [SimpleNamespace(id=i, base_price=300.0, is_vacant=False, leases=[]) for i in (1, 2, 3)]
+        self.invoices = [SimpleNamespace(amount=90.0)]
+
+    def test_occupancy_days_merges_overlaps(self):
+        leases = [
+            lease(1, date(2026, 10, 1)),                        # whole month
+            lease(2, date(2026, 11, 20)),                       # moves in on the 20th -> 11 days
+            lease(3, date(2026, 11, 1), date(2026, 11, 10)),    # 10 days
+            lease(3, date(2026, 11, 5), date(2026, 11, 15)),    # overlaps -> merged to 1..15
+            lease(3, date(2026, 12, 1)),                        # outside of the window
+        ]
+        self.assertEqual(occupancy_days(leases, self.start, self.end), {1: 30, 2: 11, 3: 15})
+        self.assertEqual(merge_intervals([(5, 9), (1, 3), (4, 4)]), [(1, 9)])
+
+    def test_full_month_matches_calculate_cents(self):
+        leases = [lease(r.id, date(2026, 1, 1)) for r in self.rooms]
+        for mode in FinancialMode:
+            for strategy in VacancyStrategy:
+                est = make_establishment(mode, self.rooms)
+                calculator = CostCalculator(est, self.rooms, self.invoices, vacancy_strategy=strategy)
+                period = calculator.calculate_period_cents(self.start, self.end, leases)
+                expected = calculator.calculate_cents()
+                self.assertEqual(period['breakdown_per_room'], expected['breakdown_per_room'])
+                self.assertEqual(period['grand_total'], expected['grand_total'])
+
+    def test_late_move_in_pays_pro_rata(self):
+        leases = [lease(1, date(2026, 1, 1)), lease(2, date(2026, 1, 1)), lease(3, date(2026, 11, 20))]
+        est = make_establishment(FinancialMode.INEGAL, self.rooms)
+        result = CostCalculator(est, self.rooms, self.invoices).calculate_period_cents(self.start, self.end, leases)
+
+        late = result['breakdown_per_room'][3]
+        self.assertEqual(late['rent'], 11000)  # 300 * 11 / 30
+        # Syndic+Wifi (90) and invoices (90) split by occupancy-days 30/30/11: 2 x 13.94
+        self.assertEqual(late['charges'], 2788)
+        collected = sum(r['total'] for r in result['breakdown_per_room'].values())
+        self.assertEqual(collected + result['owner_absorbed'], result['grand_total'])
+
+    def test_owner_pays_absorbs_vacant_days(self):
+        leases = [lease(1, date(2026, 1, 1)), lease(2, date(2026, 11, 16))]
+        est = make_establishment(FinancialMode.INEGAL, self.rooms, syndic=0.0, wifi=0.0)
+        calculator = CostCalculator(est, self.rooms, self.invoices, vacancy_strategy=VacancyStrategy.OWNER_PAYS)
+        result = calculator.calculate_period_cents(self.start, self.end, leases)
+
+        # 90 EUR over 3 rooms * 30 days: 1 EUR per room-day
+        self.assertEqual(result['breakdown_per_room'][1]['charges'], 3000)
+        self.assertEqual(result['breakdown_per_room'][2]['charges'], 1500)
+        self.assertEqual(result['owner_absorbed'], 4500)
+        self.assertNotIn(3, result['breakdown_per_room'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: test_dashboard_service.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import sys
+import os
+import unittest
+from contextlib import contextmanager
+from datetime import date
+from flask import g
+from sqlalchemy import event
+
+# Add root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.init_app import create_app
+from config.extensions import db
+from models.establishment import Establishment, Room, Lease, EstablishmentOwner, EstablishmentOwnerRole
+from models.users import User, UserRole
+from models.maintenance import Ticket
+from services.dashboard_service import DashboardService
+from services.cost_split_cache import cost_split_cache
+
+class TestDashboardService(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        cost_split_cache.clear()
+
+        self.landlord = User(email="landlord@dash.test", role=UserRole.BAILLEUR, password_hash="x")
+        db.session.add(self.landlord)
+        db.session.commit()
+        self.landlord_id = self.landlord.id
+        self.tenant_count = 0
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_establishment(self, n_rooms, n_occupied):
+        est = Establishment(address=f"{n_rooms} Dashboard St")
+        db.session.add(est)
+        db.session.flush()
+        db.session.add(EstablishmentOwner(user_id=self.landlord_id, establishment_id=est.id,
+                                          role=EstablishmentOwnerRole.PRIMARY))
+        tenants = []
+        for i in range(n_rooms):
+            room = Room(establishment_id=est.id, name=f"R{i}", base_price=400.0, is_vacant=i >= n_occupied)
+            db.session.add(room)
+            db.session.flush()
+            if i < n_occupied:
+                self.tenant_count += 1
+                # An older lease of another tenant must be ignored
+                former = User(email=f"former{self.tenant_count}@dash.test", role=UserRole.COLOCATAIRE, password_hash="x")
+                tenant = User(email=f"tenant{self.tenant_count}@dash.test", role=UserRole.COLOCATAIRE, password_hash="x")
+                db.session.add_all([former, tenant])
+                db.session.flush()
+                db.session.add(Lease(user_id=former.id, room_id=room.id, start_date=date(2025, 1, 1), end_date=date(2025, 12, 31)))
+                db.session.add(Lease(user_id=tenant.id, room_id=room.id, start_date=date(2026, 1, 1)))
+                tenants.append(tenant.id)
+        db.session.add(Ticket(requester_id=self.landlord_id, establishment_id=est.id, title="Leak", description="Leak"))
+        db.session.add(Ticket(requester_id=self.landlord_id, establishment_id=est.id, title="Done", description="Done", status='Closed'))
+        db.session.commit()
+        return est, tenants
+
+    @contextmanager
+    def count_queries(self):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    def get_dashboard(self, user_id):
+        # The request shares the test's app context: start from an empty identity map
+        # and let Flask-Login load the user again
+        db.session.expunge_all()
+        g.pop('_login_user', None)
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        with self.count_queries() as statements:
+            response = self.client.get('/dashboard')
+        self.assertEqual(response.status_code, 200)
+        return len(statements)
+
+    def test_landlord_overview(self):
+        self.add_establishment(3, 2)
+        self.add_establishment(2, 0)
+
+        overview = DashboardService.landlord_overview(self.landlord_id)
+        self.assertEqual(len(overview['establishments']), 2)
+        self.assertEqual(overview['total_tenants'], 2)
+        self.assertEqual(overview['open_tickets'], 2)
+        self.assertEqual(sorted(c['total_rooms'] for c in overview['occupancy'].values()), [2, 3])
+
+    def test_landlord_summary_matches_overview(self):
+        self.add_establishment(3, 2)
+        self.add_establishment(2, 1)
+
+        overview = DashboardService.landlord_overview(self.landlord_id)
+        summary = DashboardService.landlord_summary(self.landlord_id)
+        self.assertEqual(summary['establishments'], overview['establishments'])
+        self.assertEqual(summary['total_tenants'], overview['total_tenants'])
+        self.assertEqual(summary['open_tickets'], overview['open_tickets'])
+        self.assertEqual(summary['total_rooms'], sum(c['total_rooms'] for c in overview['occupancy'].values()))
+
+    def test_roommates_use_latest_lease(self):
+        est, tenants = self.add_establishment(4, 3)
+        lease = DashboardService.tenant_lease(tenants[0])
+        roommates = DashboardService.roommates(lease.room)
+        self.assertEqual([u.id for u in roommates], tenants[1:])
+
+    def test_query_count_is_constant(self):
+        _, small_tenants = self.add_establishment(2, 2)
+        landlord_small = self.get_dashboard(self.landlord_id)
+        tenant_small = self.get_dashboard(small_tenants[0])
+
+        for _ in range(5):
+            self.add_establishment(8, 6)
+        _, big_tenants = self.add_establishment(12, 12)
+        cost_split_cache.clear()
+
+        self.assertEqual(self.get_dashboard(self.landlord_id), landlord_small)
+        self.assertEqual(self.get_dashboard(big_tenants[0]), tenant_small)
+
+if __name__ == '__main__':
+    unittest.main()
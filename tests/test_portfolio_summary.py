@@ -0,0 +1,175 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: test_portfolio_summary.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import sys
+import os
+import unittest
+from datetime import date, timedelta
+
+# Add root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.init_app import create_app
+from config.extensions import db
+from models.establishment import Establishment, Room, Lease, EstablishmentOwner, EstablishmentOwnerRole
+from models.users import User, UserRole
+from models.maintenance import Ticket
+from models.finance import Transaction, ValidationStatus
+from models.portfolio import LandlordPortfolioSummary, compute_summaries
+from services.portfolio_summary_service import PortfolioSummaryService
+from services.lease_service import LeaseService
+
+class TestPortfolioSummary(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.landlord = User(email="owner@summary.test", role=UserRole.BAILLEUR, password_hash="x")
+        self.tenant = User(email="tenant@summary.test", role=UserRole.COLOCATAIRE, password_hash="x")
+        self.est = Establishment(address="Summary St")
+        db.session.add_all([self.landlord, self.tenant, self.est])
+        db.session.commit()
+        db.session.add(EstablishmentOwner(user_id=self.landlord.id, establishment_id=self.est.id,
+                                          role=EstablishmentOwnerRole.PRIMARY))
+        PortfolioSummaryService.apply([self.landlord.id])
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def summary(self):
+        db.session.expire_all()
+        row = db.session.get(LandlordPortfolioSummary, self.landlord.id)
+        return (row.establishment_count, row.total_rooms, row.occupied_rooms, row.open_tickets, row.pending_payments)
+
+    def assert_matches_recount(self, *landlords):
+        db.session.expire_all()
+        recount = compute_summaries(db.session.connection(), [landlord.id for landlord in landlords])
+        for landlord in landlords:
+            row = db.session.get(LandlordPortfolioSummary, landlord.id)
+            self.assertEqual({name: getattr(row, name) for name in recount[landlord.id]}, recount[landlord.id])
+
+    def login_as(self, user):
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+
+    def test_routes_keep_the_summary_up_to_date(self):
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.client = self.app.test_client()
+        co_owner = User(email="co@summary.test", role=UserRole.BAILLEUR, password_hash="x")
+        db.session.add(co_owner)
+        db.session.commit()
+
+        self.login_as(self.landlord)
+        self.client.post('/establishment/create', data={'address': 'Second St'})
+        self.assertEqual(self.summary(), (2, 0, 0, 0, 0))
+        for i in range(3):
+            self.client.post(f'/establishment/{self.est.id}/add-room', data={'name': f'R{i}', 'base_price': '400'})
+        self.assertEqual(self.summary(), (2, 3, 0, 0, 0))
+
+        room = Room.query.filter_by(establishment_id=self.est.id).first()
+        self.client.post(f'/establishment/{self.est.id}/assign-tenant',
+                         data={'room_id': room.id, 'user_email': self.tenant.email, 'start_date': '2026-01-01'})
+        self.assertEqual(self.summary(), (2, 3, 1, 0, 0))
+
+        self.client.post('/tickets/create', data={'title': 'Leak', 'description': 'Leak', 'establishment_id': self.est.id})
+        self.assertEqual(self.summary(), (2, 3, 1, 1, 0))
+
+        # Services without a route of their own call apply() the same way
+        trx = Transaction(user_id=self.tenant.id, amount=400.0)
+        db.session.add(trx)
+        PortfolioSummaryService.apply(PortfolioSummaryService.tenant_landlords([self.tenant.id]))
+        db.session.commit()
+        self.assertEqual(self.summary(), (2, 3, 1, 1, 1))
+
+        self.client.post(f'/finance/validate-payment/{trx.id}', data={'action': 'validate'})
+        self.assertEqual(self.summary(), (2, 3, 1, 1, 0))
+
+        self.client.post(f'/establishment/{self.est.id}/co-owners', json={'email': co_owner.email})
+        self.assert_matches_recount(self.landlord, co_owner)
+        self.assertEqual(db.session.get(LandlordPortfolioSummary, co_owner.id).total_rooms, 3)
+        self.client.delete(f'/establishment/{self.est.id}/co-owners/{co_owner.id}')
+        self.assertEqual(db.session.get(LandlordPortfolioSummary, co_owner.id).establishment_count, 0)
+
+        lease = Lease.query.filter_by(user_id=self.tenant.id).one()
+        self.client.post(f'/lease/{lease.id}/end', data={'end_date': date.today().isoformat()})
+        self.assertEqual(self.summary(), (2, 3, 0, 1, 0))
+        self.assert_matches_recount(self.landlord, co_owner)
+
+    def test_lease_ended_in_the_future_frees_the_room_later(self):
+        self.app.config['WTF_CSRF_ENABLED'] = False
+        self.client = self.app.test_client()
+        self.login_as(self.landlord)
+        rooms = [Room(establishment_id=self.est.id, name=f"R{i}", base_price=400.0, is_vacant=False) for i in range(2)]
+        db.session.add_all(rooms)
+        db.session.flush()
+        leases = [Lease(user_id=self.tenant.id, room_id=room.id, start_date=date(2026, 1, 1)) for room in rooms]
+        # The second room already has its next tenant
+        leases.append(Lease(user_id=self.landlord.id, room_id=rooms[1].id, start_date=date.today() + timedelta(days=40)))
+        db.session.add_all(leases)
+        PortfolioSummaryService.apply([self.landlord.id])
+        db.session.commit()
+
+        end = date.today() + timedelta(days=30)
+        for lease in leases[:2]:
+            self.client.post(f'/lease/{lease.id}/end', data={'end_date': end.isoformat()})
+        self.assertEqual(LeaseService.release_ended_leases(end), 0)
+        self.assertEqual(self.summary()[2], 2)
+
+        self.assertEqual(LeaseService.release_ended_leases(end + timedelta(days=1)), 1)
+        db.session.expire_all()
+        self.assertEqual([room.is_vacant for room in rooms], [True, False])
+        self.assertEqual(self.summary()[2], 1)
+        self.assertEqual(LeaseService.release_ended_leases(end + timedelta(days=1)), 0)
+
+    def test_apply_recounts_only_the_given_landlords(self):
+        other = User(email="other@summary.test", role=UserRole.BAILLEUR, password_hash="x")
+        other_est = Establishment(address="Other St")
+        db.session.add_all([other, other_est])
+        db.session.flush()
+        db.session.add(EstablishmentOwner(user_id=other.id, establishment_id=other_est.id,
+                                          role=EstablishmentOwnerRole.PRIMARY))
+        db.session.add_all([Room(establishment_id=est.id, name="R", base_price=400.0, is_vacant=False)
+                            for est in (self.est, other_est)])
+        PortfolioSummaryService.apply(PortfolioSummaryService.establishment_landlords([self.est.id]))
+        db.session.commit()
+
+        self.assertEqual(self.summary(), (1, 1, 1, 0, 0))
+        self.assertIsNone(db.session.get(LandlordPortfolioSummary, other.id))
+
+    def test_missing_row_is_computed_on_read(self):
+        db.session.add(Room(establishment_id=self.est.id, name="R1", base_price=400.0, is_vacant=False))
+        db.session.commit()
+        LandlordPortfolioSummary.query.delete()
+        db.session.commit()
+
+        summary = PortfolioSummaryService.get(self.landlord.id)
+        self.assertEqual((summary.establishment_count, summary.total_rooms), (1, 1))
+        # Not stored by the read: rebuild() backfills the table
+        db.session.rollback()
+        self.assertIsNone(db.session.get(LandlordPortfolioSummary, self.landlord.id))
+
+    def test_rebuild_repairs_drift(self):
+        db.session.add(Room(establishment_id=self.est.id, name="R1", base_price=400.0, is_vacant=False))
+        db.session.commit()
+        LandlordPortfolioSummary.query.update({'total_rooms': 42})
+        db.session.commit()
+
+        self.assertEqual(PortfolioSummaryService.rebuild(), 1)
+        self.assertEqual(self.summary(), (1, 1, 1, 0, 0))
+        self.assertEqual(PortfolioSummaryService.get(self.landlord.id).total_rooms, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,12 +16,29 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from config.init_app import create_app
 from config.extensions import db
-from models.establishment import Establishment, FinancialMode, EstablishmentOwner, EstablishmentOwnerRole
+from models.establishment import Establishment, Room, Lease, FinancialMode, EstablishmentOwner, EstablishmentOwnerRole
 from models.users import User, UserRole
-from models.finance import Transaction, SaaSInvoice
-from models.communication import Message, ChatRoom, MessageType, ChannelType
-from datetime import datetime
+from models.finance import Transaction, SaaSInvoice, Invoice, ExpenseType, ValidationStatus
+from models.communication import Message, MessageRead, ChatReadState, ChatRoom, MessageType, ChannelType
+from services.chat_service import ChatService
+from services.unread_counter_service import UnreadCounterService
+from services.blob_store import BlobStore
+from models.storage import StoredBlob
+from models.saas_config import PlatformSettings
+from services.receipt_batch_service import ReceiptBatchService
+from services.ledger_service import LedgerService
+from init_db import backfill_aggregates
+from services.image_variant_service import ImageVariantService
+from services.media_pipeline import media_pipeline
+from models.maintenance import Ticket
+from PIL import Image
+from services.storage_backend import storage, LocalStorage
+from datetime import datetime, timedelta, date
 from security.pwd_tools import hash_password
+import io
+import shutil
+import tempfile
+import zipfile
 
 class TestRoutes(unittest.TestCase):
     def setUp(self):
@@ -110,7 +127,10 @@ class TestRoutes(unittest.TestCase):
         db.session.commit()
 
         # Create Message
-        msg = Message(chat_room_id=room.id, sender_id=self.user.id, content="Hello", type=MessageType.TEXT)
+        sender = User(email="sender@test.com", role=UserRole.COLOCATAIRE, password_hash="x")
+        db.session.add(sender)
+        db.session.flush()
+        msg = Message(chat_room_id=room.id, sender_id=sender.id, content="Hello", type=MessageType.TEXT)
         db.session.add(msg)
         db.session.commit()
 
@@ -120,9 +140,390 @@ class TestRoutes(unittest.TestCase):
         self.assertIn(b"true", resp.data)
 
         # Check DB
-        msg_check = Message.query.get(msg.id)
-        self.assertTrue(len(msg_check.read_by_users) > 0)
-        self.assertEqual(msg_check.read_by_users[0]['user_id'], self.user.id)
+        receipts = MessageRead.query.filter_by(message_id=msg.id).all()
+        self.assertEqual([r.user_id for r in receipts], [self.user.id])
+        self.assertEqual(db.session.get(ChatReadState, (self.user.id, room.id)).last_read_message_id, msg.id)
+
+        # A second read is not recorded twice
+        resp = self.client.post(f'/chat/read/{msg.id}')
+        self.assertIn(b"false", resp.data)
+        self.assertEqual(MessageRead.query.filter_by(message_id=msg.id).count(), 1)
+
+    def test_chat_mark_read_up_to(self):
+        self.login()
+
+        est = Establishment(address="Unread Est")
+        other = User(email="tenant@test.com", role=UserRole.COLOCATAIRE, password_hash="x")
+        db.session.add_all([est, other])
+        db.session.commit()
+        db.session.add(EstablishmentOwner(user_id=self.user.id, establishment_id=est.id, role=EstablishmentOwnerRole.PRIMARY))
+        room = ChatRoom(establishment_id=est.id, type=ChannelType.GENERAL)
+        db.session.add(room)
+        db.session.commit()
+
+        start = datetime(2026, 1, 1, 12, 0)
+        msgs = []
+        for i in range(6):
+            sender = self.user if i == 2 else other
+            m = Message(chat_room_id=room.id, sender_id=sender.id, content=f"m{i}", type=MessageType.TEXT,
+                        timestamp=start + timedelta(minutes=i))
+            db.session.add(m)
+            msgs.append(m)
+        db.session.commit()
+        self.assertEqual(ChatService.unread_count(room.id, self.user.id), 5)
+
+        # Reading message 1 alone also covers message 0 and moves the mark and counter
+        self.assertTrue(ChatService.mark_message_as_read(msgs[1].id, self.user.id))
+        self.assertEqual(db.session.get(ChatReadState, (self.user.id, room.id)).unread_count, 3)
+        self.assertFalse(ChatService.mark_message_as_read(msgs[0].id, self.user.id))
+        resp = self.client.post(f'/chat/{room.id}/read', json={'up_to': msgs[3].id})
+        data = resp.get_json()
+        self.assertEqual((data['marked'], data['unread']), (1, 2))
+        read = {r.message_id for r in MessageRead.query.filter_by(user_id=self.user.id)}
+        self.assertEqual(read, {msgs[0].id, msgs[1].id, msgs[3].id})
+
+        # Moving back does not lower the high-water mark
+        resp = self.client.post(f'/chat/{room.id}/read', json={'up_to': msgs[0].id})
+        self.assertEqual(resp.get_json()['unread'], 2)
+        self.assertEqual(ChatService.unread_count(room.id, other.id), 1)
+
+        resp = self.client.post(f'/chat/{room.id}/read', json={'up_to': 99999})
+        self.assertEqual(resp.status_code, 404)
+
+    def test_chat_unread_counters(self):
+        self.login()
+
+        est = Establishment(address="Badge Est")
+        tenant = User(email="badge@test.com", role=UserRole.COLOCATAIRE, password_hash="x")
+        db.session.add_all([est, tenant])
+        db.session.commit()
+        flat = Room(establishment_id=est.id, name="R1", base_price=300.0)
+        db.session.add_all([flat, EstablishmentOwner(user_id=self.user.id, establishment_id=est.id,
+                                                     role=EstablishmentOwnerRole.PRIMARY)])
+        db.session.commit()
+        db.session.add(Lease(user_id=tenant.id, room_id=flat.id, start_date=datetime.utcnow().date()))
+        room = ChatRoom(establishment_id=est.id, type=ChannelType.GENERAL)
+        db.session.add(room)
+        db.session.commit()
+
+        # A message from before the counters existed is picked up when the counter is created
+        db.session.add(Message(chat_room_id=room.id, sender_id=self.user.id, content="old", type=MessageType.TEXT))
+        db.session.commit()
+        for i in range(3):
+            self.client.post(f'/chat/{room.id}/send', data={'content': f"hello {i}"})
+        self.assertEqual(UnreadCounterService.counts_for_user(tenant.id), {room.id: 4})
+        self.assertEqual(UnreadCounterService.counts_for_user(self.user.id), {})
+
+        # Reading moves the counter to the exact remaining count
+        second = Message.query.filter_by(content="hello 1").first()
+        ChatService.mark_read_up_to(room.id, tenant.id, second.id)
+        self.assertEqual(UnreadCounterService.counts_for_user(tenant.id), {room.id: 1})
+
+        reply = Message(chat_room_id=room.id, sender_id=tenant.id, content="reply", type=MessageType.TEXT)
+        db.session.add(reply)
+        UnreadCounterService.on_message_sent(reply, ChatService.participant_ids(room))
+        db.session.commit()
+        data = self.client.get('/chat/unread').get_json()
+        self.assertEqual(data, {'rooms': {str(room.id): 1}, 'total': 1})
+
+        # Rebuild from history gives the same counters
+        db.session.query(ChatReadState).update({ChatReadState.unread_count: 0})
+        db.session.commit()
+        self.assertEqual(UnreadCounterService.rebuild(), 2)
+        self.assertEqual(UnreadCounterService.counts_for_user(tenant.id), {room.id: 1})
+        self.assertEqual(UnreadCounterService.counts_for_user(self.user.id), {room.id: 1})
+
+    def test_legacy_receipts_migration(self):
+        est = Establishment(address="Legacy Est")
+        db.session.add(est)
+        db.session.commit()
+        room = ChatRoom(establishment_id=est.id, type=ChannelType.GENERAL)
+        db.session.add(room)
+        db.session.commit()
+        other = User(email="legacy@test.com", role=UserRole.COLOCATAIRE, password_hash="x")
+        db.session.add(other)
+        db.session.commit()
+        for i in range(3):
+            db.session.add(Message(chat_room_id=room.id, sender_id=other.id, content=f"old {i}", type=MessageType.TEXT,
+                                   timestamp=datetime(2025, 1, 1, 10, i),
+                                   read_by_users=[{"user_id": self.user.id, "read_at": "2025-01-02T00:00:00"}] if i < 2 else []))
+        db.session.commit()
+
+        self.assertEqual(ChatService.migrate_legacy_receipts(), 2)
+        self.assertEqual(ChatService.migrate_legacy_receipts(), 0)
+        self.assertEqual(ChatService.unread_count(room.id, self.user.id), 1)
+
+    def test_chat_history_pagination(self):
+        self.login()
+
+        est = Establishment(address="History Est")
+        db.session.add(est)
+        db.session.commit()
+        db.session.add(EstablishmentOwner(user_id=self.user.id, establishment_id=est.id, role=EstablishmentOwnerRole.PRIMARY))
+        room = ChatRoom(establishment_id=est.id, type=ChannelType.GENERAL)
+        db.session.add(room)
+        db.session.commit()
+
+        # 120 messages, with timestamp ties to exercise the id tie-break
+        start = datetime(2026, 1, 1, 12, 0)
+        for i in range(120):
+            db.session.add(Message(chat_room_id=room.id, sender_id=self.user.id, content=f"msg {i}",
+                                   type=MessageType.TEXT, timestamp=start + timedelta(minutes=i // 3)))
+        db.session.commit()
+
+        resp = self.client.get(f'/chat/{room.id}')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b"msg 119", resp.data)
+        self.assertIn(b"msg 70", resp.data)
+        self.assertNotIn(b"msg 69<", resp.data)
+
+        contents, cursor, pages = [], None, 0
+        while True:
+            url = f'/chat/{room.id}/messages?limit=50' + (f'&before={cursor}' if cursor else '')
+            data = self.client.get(url).get_json()
+            contents = [m['content'] for m in data['messages']] + contents
+            pages += 1
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(pages, 3)
+        self.assertEqual(contents, [f"msg {i}" for i in range(120)])
+        self.assertIn("msg 0", data['html'])
+
+        resp = self.client.get(f'/chat/{room.id}/messages?before=garbage')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_media_serving(self):
+        backend = storage.backend
+        storage.set_backend(LocalStorage(tempfile.mkdtemp()))
+        try:
+            voice = b"ID3" + bytes(range(256)) * 40
+            blob = BlobStore.put(io.BytesIO(voice), 'mp3')
+            db.session.commit()
+            url = storage.url(blob.path)
+            self.assertEqual(url, f"/media/{blob.path}")
+
+            resp = self.client.get(url)
+            self.assertEqual((resp.status_code, resp.data), (200, voice))
+            self.assertEqual(resp.headers['ETag'], f'"{blob.sha256}"')
+            self.assertIn('immutable', resp.headers['Cache-Control'])
+            self.assertEqual(resp.headers['Accept-Ranges'], 'bytes')
+
+            # Seeking in a voice note: only the requested bytes
+            resp = self.client.get(url, headers={'Range': 'bytes=100-199'})
+            self.assertEqual(resp.status_code, 206)
+            self.assertEqual(resp.data, voice[100:200])
+            self.assertEqual(resp.headers['Content-Range'], f"bytes 100-199/{len(voice)}")
+
+            resp = self.client.get(url, headers={'If-None-Match': f'"{blob.sha256}"'})
+            self.assertEqual(resp.status_code, 304)
+
+            # Offloaded to Nginx: headers only
+            self.app.config['MEDIA_ACCEL_REDIRECT'] = '/_protected_media'
+            resp = self.client.get(url)
+            self.assertEqual(resp.headers['X-Accel-Redirect'], f"/_protected_media/{blob.path}")
+            self.assertEqual(resp.data, b'')
+            self.assertEqual(resp.headers['ETag'], f'"{blob.sha256}"')
+
+            self.assertEqual(self.client.get('/media/tmp/upload').status_code, 404)
+            self.assertEqual(self.client.get('/media/blobs/../../secret').status_code, 404)
+        finally:
+            shutil.rmtree(storage.backend.root, ignore_errors=True)
+            storage.set_backend(backend)
+
+
+    def test_batch_receipts_zip(self):
+        self.login()
+        own, other = Establishment(address="12 rue des Lilas"), Establishment(address="Ailleurs")
+        db.session.add_all([own, other])
+        db.session.flush()
+        db.session.add(EstablishmentOwner(user_id=self.user.id, establishment_id=own.id, role=EstablishmentOwnerRole.PRIMARY))
+        own_invoice = Invoice(establishment_id=own.id, type=ExpenseType.EAU, amount=600.0, description="Eau septembre")
+        other_invoice = Invoice(establishment_id=other.id, type=ExpenseType.ELEC, amount=50.0)
+        db.session.add_all([own_invoice, other_invoice])
+        db.session.flush()
+        paid = [Transaction(user_id=self.user.id, invoice_id=own_invoice.id, amount=100.0 + i,
+                            date=datetime(2026, 9, 1 + i), validation_status=ValidationStatus.VALIDATED)
+                for i in range(6)]
+        db.session.add_all(paid + [
+            Transaction(user_id=self.user.id, invoice_id=own_invoice.id, amount=5.0, date=datetime(2026, 9, 20)), # pending
+            Transaction(user_id=self.user.id, invoice_id=own_invoice.id, amount=7.0, date=datetime(2026, 10, 1),
+                        validation_status=ValidationStatus.VALIDATED),
+            Transaction(user_id=self.user.id, invoice_id=other_invoice.id, amount=9.0, date=datetime(2026, 9, 2),
+                        validation_status=ValidationStatus.VALIDATED)
+        ])
+        db.session.commit()
+        tickets = [trx.ticket_number for trx in paid]
+        paid_ids, other_invoice_id = [trx.id for trx in paid], other_invoice.id
+        pending_id = Transaction.query.filter_by(amount=5.0).one().id
+
+        resp = self.client.get('/finance/receipts/batch?month=2026-09')
+        self.assertEqual(resp.mimetype, 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(resp.data)) as archive:
+            self.assertEqual(archive.namelist(), [f"recu_{t}.pdf" for t in tickets])
+            self.assertTrue(archive.read(f"recu_{tickets[0]}.pdf").startswith(b"%PDF"))
+
+        # Receipts of other landlords are never included
+        foreign = Transaction.query.filter_by(invoice_id=other_invoice_id).one()
+        self.assertEqual(self.client.get(f'/finance/receipts/batch?ids={foreign.id}').status_code, 404)
+        # Nor payments that are not validated
+        self.assertEqual(self.client.get(f'/finance/receipts/batch?ids={pending_id}').status_code, 404)
+
+        # Process pool with a sliding window smaller than the batch: same archive order
+        renderer = ReceiptBatchService(workers=2, window=2, inline_below=0)
+        try:
+            rendered = list(renderer.render(ReceiptBatchService.load_jobs(paid_ids)))
+        finally:
+            renderer.shutdown()
+        self.assertEqual([name for name, _ in rendered], [f"recu_{t}.pdf" for t in tickets])
+        self.assertTrue(all(pdf.startswith(b"%PDF") for _, pdf in rendered))
+
+    def test_edit_and_delete_expense_update_ledger(self):
+        est = Establishment(address="Ledger House", config_financial_mode=FinancialMode.EGAL)
+        db.session.add(est)
+        db.session.flush()
+        room = Room(establishment_id=est.id, name="R1", base_price=300.0, is_vacant=False)
+        manager = User(email="resp@test.com", role=UserRole.TENANT_RESPONSABLE, password_hash=hash_password("password"))
+        db.session.add_all([room, manager])
+        db.session.flush()
+        db.session.add(Lease(user_id=manager.id, room_id=room.id, start_date=date(2026, 1, 1)))
+        invoices = [Invoice(establishment_id=est.id, type=ExpenseType.EAU, amount=amount, date=date(2026, 10, 3))
+                    for amount in (40.0, 60.0)]
+        db.session.add_all(invoices)
+        for inv in invoices:
+            LedgerService.record_invoice(inv)
+        db.session.commit()
+        edited_id, deleted_id, est_id = invoices[0].id, invoices[1].id, est.id
+        self.client.post('/login', data=dict(email="resp@test.com", password="password"))
+
+        # Edit: new amount, type and month
+        self.client.post(f'/finance/expense/{edited_id}/edit',
+                         data={'amount': '25.5', 'type': 'Elec', 'date': '2026-11-02'})
+        self.assertEqual(LedgerService.get_totals(est_id, date(2026, 10, 1)), {ExpenseType.EAU: 6000})
+        self.assertEqual(LedgerService.get_totals(est_id, date(2026, 11, 1)), {ExpenseType.ELEC: 2550})
+        self.client.post(f'/finance/expense/{edited_id}/edit', data={'amount': 'nan'})
+        self.assertEqual(LedgerService.get_totals(est_id, date(2026, 11, 1)), {ExpenseType.ELEC: 2550})
+
+        self.client.post(f'/finance/expense/{deleted_id}/delete')
+        self.assertIsNone(db.session.get(Invoice, deleted_id))
+        self.assertEqual(LedgerService.get_establishment_totals(est_id), {ExpenseType.EAU: 0, ExpenseType.ELEC: 2550})
+
+        # The dashboard split reads the ledger: rent 300 + charges 25.50 for the only tenant
+        resp = self.client.get('/dashboard')
+        self.assertIn(b"325.50", resp.data)
+
+        # Invoices of other establishments stay out of reach
+        other = Establishment(address="Elsewhere")
+        db.session.add(other)
+        db.session.flush()
+        foreign = Invoice(establishment_id=other.id, type=ExpenseType.EAU, amount=10.0)
+        db.session.add(foreign)
+        db.session.commit()
+        self.assertEqual(self.client.post(f'/finance/expense/{foreign.id}/delete').status_code, 403)
+
+    def test_init_db_backfills_the_ledger_from_existing_invoices(self):
+        est = Establishment(address="Before Ledger")
+        db.session.add(est)
+        db.session.flush()
+        db.session.add_all([Invoice(establishment_id=est.id, type=ExpenseType.EAU, amount=amount, date=date(2026, 9, 12))
+                            for amount in (30.0, 12.5)])
+        db.session.commit()
+        self.assertEqual(LedgerService.get_establishment_totals(est.id), {})
+
+        backfill_aggregates(set())
+        self.assertEqual(LedgerService.get_establishment_totals(est.id), {})
+        backfill_aggregates({'charge_ledgers'})
+        self.assertEqual(LedgerService.get_establishment_totals(est.id), {ExpenseType.EAU: 4250})
+
+    def test_replaced_branding_image_is_released(self):
+        backend = storage.backend
+        storage.set_backend(LocalStorage(tempfile.mkdtemp()))
+        try:
+            with self.client.session_transaction() as session:
+                session['is_super_admin'] = True
+
+            def upload_logo(content):
+                self.client.post('/admin/settings', data={
+                    'logo_file': (io.BytesIO(b"\x89PNG\r\n\x1a\n" + content), 'logo.png')
+                }, content_type='multipart/form-data')
+                db.session.expire_all()
+                return PlatformSettings.query.first().logo_url
+
+            first = upload_logo(b"first logo")
+            first_key = BlobStore.KEY_PATTERN.search(first).group(0)
+            self.assertTrue(storage.exists(first_key))
+
+            second = upload_logo(b"second logo")
+            self.assertNotEqual(first, second)
+            self.assertFalse(storage.exists(first_key))
+            self.assertIsNone(StoredBlob.query.filter_by(path=first_key).first())
+
+            # Same image uploaded again: still one reference
+            self.assertEqual(upload_logo(b"second logo"), second)
+            self.assertEqual(StoredBlob.query.filter_by(path=BlobStore.KEY_PATTERN.search(second).group(0)).one().ref_count, 1)
+        finally:
+            shutil.rmtree(storage.backend.root, ignore_errors=True)
+            storage.set_backend(backend)
+
+    def test_ticket_form_uploads_photo_renditions(self):
+        backend = storage.backend
+        storage.set_backend(LocalStorage(tempfile.mkdtemp()))
+        try:
+            self.login()
+            est = Establishment(address="Tickets")
+            db.session.add(est)
+            db.session.flush()
+            db.session.add(EstablishmentOwner(user_id=self.user.id, establishment_id=est.id, role=EstablishmentOwnerRole.PRIMARY))
+            db.session.commit()
+
+            form = self.client.get('/tickets').get_data(as_text=True)
+            self.assertIn('enctype="multipart/form-data"', form)
+            self.assertIn('name="photo"', form)
+
+            photo = io.BytesIO()
+            Image.new('RGB', (1600, 1200), color='orange').save(photo, 'JPEG')
+            photo.seek(0)
+            resp = self.client.post('/tickets/create', data={
+                'title': 'Fuite', 'description': "Sous l'évier", 'establishment_id': est.id,
+                'photo': (photo, 'fuite.jpg')
+            }, content_type='multipart/form-data')
+            self.assertEqual(resp.status_code, 302)
+            self.assertTrue(media_pipeline.join(timeout=10))
+
+            db.session.expire_all()
+            ticket = Ticket.query.one()
+            self.assertTrue(storage.exists(ticket.photo_path))
+            keys = [key for formats in ticket.photo_variants.values() for key in formats.values()]
+            self.assertTrue(keys)
+            for key in keys:
+                self.assertEqual(StoredBlob.query.filter_by(path=key).one().ref_count, 1)
+
+            # Renditions are released like the other uploads
+            ImageVariantService.release(ticket.photo_variants)
+            db.session.commit()
+            self.assertFalse(any(storage.exists(key) for key in keys))
+            self.assertEqual(StoredBlob.query.filter(StoredBlob.path.in_(keys)).count(), 0)
+        finally:
+            shutil.rmtree(storage.backend.root, ignore_errors=True)
+            storage.set_backend(backend)
+
+    def test_vacancy_simulation_rejects_non_finite_invoice_total(self):
+        self.login()
+        est = Establishment(address="Simulation")
+        db.session.add(est)
+        db.session.flush()
+        db.session.add(EstablishmentOwner(user_id=self.user.id, establishment_id=est.id, role=EstablishmentOwnerRole.PRIMARY))
+        db.session.add_all([Room(establishment_id=est.id, name=f"S{i}", base_price=400.0) for i in range(2)])
+        db.session.commit()
+        url = f'/establishment/{est.id}/vacancy-simulation'
+
+        for value in ('nan', 'inf', '-Infinity', 'abc'):
+            resp = self.client.get(url, query_string={'invoice_total': value})
+            self.assertEqual((resp.status_code, resp.get_json()), (400, {'error': 'invoice_total invalide'}), value)
+        resp = self.client.get(url, query_string={'invoice_total': '120.5'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.get_json()['invoice_total'], 120.5)
+
 
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
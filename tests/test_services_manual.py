@@ -19,12 +19,24 @@ from config.init_app import create_app
 from config.extensions import db
 from models.establishment import Establishment, SaaSBilledTo, EstablishmentOwner, EstablishmentOwnerRole
 from models.finance import SaaSInvoice, Invoice, ExpenseType, SaaSInvoiceStatus, PaymentMethod
+from models.establishment import Room, FinancialMode
+from algorithms.cost_splitter import CostCalculator
+from services.ledger_service import LedgerService
+from datetime import date
 from models.saas_config import SubscriptionPlan, PlatformSettings
 from models.users import User, UserRole
 from services.billing_service import BillingService
 from services.branding_service import BrandingService
 from services.seo_manager import SEOManager
 from services.chat_media_service import ChatMediaService
+from services.image_variant_service import ImageVariantService
+from models.maintenance import Ticket
+from models.storage import StoredBlob
+from services.upload_service import UploadService, UploadRejected
+from services.blob_store import BlobStore
+from services.storage_backend import storage, LocalStorage, S3Storage, InMemoryS3Client
+import tempfile
+import shutil
 from werkzeug.datastructures import FileStorage
 
 class TestServices(unittest.TestCase):
@@ -86,11 +98,138 @@ class TestServices(unittest.TestCase):
 
         path = ChatMediaService.process_and_save(file)
         self.assertTrue(path.endswith('.jpg'))
-        self.assertTrue(os.path.exists(path))
+        self.assertTrue(storage.exists(path))
 
         # Cleanup
-        if os.path.exists(path):
-            os.remove(path)
+        storage.delete(path)
+
+    def test_image_variants(self):
+        workdir = tempfile.mkdtemp()
+        backend = storage.backend
+        storage.set_backend(LocalStorage(workdir))
+        try:
+            source = 'tickets/photo.jpg'
+            os.makedirs(os.path.join(workdir, 'tickets'))
+            Image.new('RGB', (4000, 3000), color='green').save(os.path.join(workdir, source), 'JPEG')
+
+            variants = ImageVariantService.generate(source)
+            self.assertEqual(set(variants), {'thumb', 'medium', 'full'})
+            for size, max_side in ImageVariantService.RENDITIONS:
+                self.assertEqual(set(variants[size]), set(ImageVariantService.formats()))
+                with storage.local_copy(variants[size]['jpeg']) as path, Image.open(path) as img:
+                    self.assertEqual(max(img.size), max_side)
+
+            # Template helper: requested size, next larger one, or the original
+            self.assertEqual(ImageVariantService.url(variants, 'thumb'), variants['thumb']['jpeg'])
+            self.assertEqual(ImageVariantService.url({'full': variants['full']}, 'medium'), variants['full']['jpeg'])
+            self.assertEqual(ImageVariantService.url(None, 'thumb', fallback=source), source)
+
+            ticket = Ticket(requester_id=self.user.id, title="Fuite", description="Sous l'évier", photo_path=source)
+            db.session.add(ticket)
+            db.session.commit()
+            ImageVariantService.process(Ticket, ticket.id, 'photo_path', 'photo_variants')
+            self.assertEqual(db.session.get(Ticket, ticket.id).photo_variants['thumb']['jpeg'], variants['thumb']['jpeg'])
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+            storage.set_backend(backend)
+
+    def test_blob_store_deduplicates(self):
+        backend = storage.backend
+        # Work files are not checked yet: never under the served uploads or static directories
+        for directory in (backend.scratch_dir(), self.app.config['UPLOAD_TMP_FOLDER']):
+            for served in (self.app.config['UPLOAD_FOLDER'], self.app.static_folder):
+                self.assertFalse(os.path.abspath(directory).startswith(os.path.abspath(served) + os.sep))
+        tmp_root = tempfile.mkdtemp()
+        storage.set_backend(LocalStorage(tempfile.mkdtemp(), tmp_root=tmp_root))
+        try:
+            content = b"%PDF-1.4 receipt " * 10000
+            proof = UploadService.save_file(FileStorage(stream=io.BytesIO(content), filename="recu.pdf"))
+            again = UploadService.save_file(FileStorage(stream=io.BytesIO(content), filename="copie.PDF"))
+            forwarded = ChatMediaService.save_raw(FileStorage(stream=io.BytesIO(b"RIFF\x24\x00\x00\x00WAVE voice"), filename="note.wav"))
+            db.session.commit()
+
+            self.assertEqual(proof, again)
+            self.assertNotEqual(proof, forwarded)
+            blob = StoredBlob.query.filter_by(path=proof).one()
+            self.assertEqual((blob.ref_count, blob.size), (2, len(content)))
+            with storage.open(proof) as f:
+                self.assertEqual(f.read(), content)
+            self.assertEqual(os.listdir(storage.scratch_dir()), [])
+
+            self.assertFalse(BlobStore.release(proof))
+            self.assertTrue(storage.exists(proof))
+            self.assertTrue(BlobStore.release(proof))
+            db.session.commit()
+            self.assertFalse(storage.exists(proof))
+            self.assertIsNone(StoredBlob.query.filter_by(path=proof).first())
+        finally:
+            shutil.rmtree(storage.backend.root, ignore_errors=True)
+            shutil.rmtree(tmp_root, ignore_errors=True)
+            storage.set_backend(backend)
+
+    def test_upload_rejected_while_streaming(self):
+        class CountingStream(io.BytesIO):
+            bytes_read = 0
+            def read(self, size=-1):
+                data = super().read(size)
+                CountingStream.bytes_read += len(data)
+                return data
+
+        backend, max_size = storage.backend, UploadService.MAX_FILE_SIZE
+        storage.set_backend(LocalStorage(tempfile.mkdtemp()))
+        UploadService.MAX_FILE_SIZE = 3 * BlobStore.CHUNK_SIZE
+        try:
+            # Oversized: stops at the first chunk over the limit, not at the end of the body
+            big = CountingStream(b"%PDF-1.4" + b"0" * (10 * BlobStore.CHUNK_SIZE))
+            with self.assertRaises(UploadRejected) as ctx:
+                UploadService.save_file(FileStorage(stream=big, filename="bail.pdf"))
+            self.assertEqual(ctx.exception.status_code, 413)
+            self.assertEqual(CountingStream.bytes_read, 4 * BlobStore.CHUNK_SIZE)
+
+            # Wrong content for the extension: refused at the first chunk
+            CountingStream.bytes_read = 0
+            disguised = CountingStream(b"\x89PNG\r\n\x1a\n" + b"0" * (2 * BlobStore.CHUNK_SIZE))
+            with self.assertRaises(UploadRejected) as ctx:
+                UploadService.save_file(FileStorage(stream=disguised, filename="facture.pdf"))
+            self.assertEqual(ctx.exception.status_code, 415)
+            self.assertEqual(CountingStream.bytes_read, BlobStore.CHUNK_SIZE)
+
+            self.assertEqual(os.listdir(storage.scratch_dir()), [])
+            self.assertEqual(StoredBlob.query.count(), 0)
+        finally:
+            shutil.rmtree(storage.backend.root, ignore_errors=True)
+            storage.set_backend(backend)
+            UploadService.MAX_FILE_SIZE = max_size
+
+    def test_s3_storage_emulator(self):
+        backend, cdn_url = storage.backend, storage.cdn_url
+        object_store = InMemoryS3Client()
+        storage.set_backend(S3Storage('rentpilot', client=object_store, prefix='prod', endpoint_url='http://localhost:9000'))
+        try:
+            img_io = io.BytesIO()
+            Image.new('RGB', (1200, 900), color='red').save(img_io, 'JPEG')
+            photo = lambda: FileStorage(stream=io.BytesIO(img_io.getvalue()), filename="fuite.jpg")
+            key = UploadService.save_file(photo())
+            self.assertEqual(UploadService.save_file(photo()), key)
+            db.session.commit()
+            self.assertEqual(list(object_store.objects), [('rentpilot', 'prod/' + key)])
+
+            # Renditions are decoded from a temporary local copy and stored back in the bucket
+            variants = ImageVariantService.generate(key)
+            with Image.open(storage.open(variants['thumb']['jpeg'])) as thumb:
+                self.assertEqual(max(thumb.size), 320)
+
+            self.assertEqual(storage.url(key), f"http://localhost:9000/rentpilot/prod/{key}")
+            storage.cdn_url = 'https://cdn.example.com'
+            self.assertEqual(storage.url(key), f"https://cdn.example.com/{key}")
+            self.assertEqual(storage.url('statics/uploads/old.png'), '/statics/uploads/old.png') # legacy path
+
+            BlobStore.release(key)
+            self.assertTrue(BlobStore.release(key))
+            self.assertFalse(storage.exists(key))
+        finally:
+            storage.set_backend(backend)
+            storage.cdn_url = cdn_url
 
     def test_billing_service_landlord(self):
         # Create Establishment
@@ -144,6 +283,51 @@ class TestServices(unittest.TestCase):
         self.assertIsNotNone(internal_inv)
         self.assertEqual(internal_inv.amount, 50.0)
 
+        # Ledger updated in the same run
+        totals = LedgerService.get_totals(est.id, internal_inv.date)
+        self.assertEqual(totals, {ExpenseType.SAAS: 5000})
+
+    def test_ledger_service(self):
+        est = Establishment(address="Ledger", config_financial_mode=FinancialMode.EGAL)
+        db.session.add(est)
+        db.session.commit()
+        rooms = [Room(establishment_id=est.id, name=f"R{i}", base_price=300.0, is_vacant=False) for i in range(2)]
+        db.session.add_all(rooms)
+        db.session.commit()
+
+        invoices = []
+        for amount, expense_type in [(40.10, ExpenseType.EAU), (59.90, ExpenseType.EAU), (80.0, ExpenseType.ELEC)]:
+            inv = Invoice(establishment_id=est.id, type=expense_type, amount=amount, date=date(2026, 10, 3))
+            db.session.add(inv)
+            LedgerService.record_invoice(inv)
+            invoices.append(inv)
+        db.session.commit()
+
+        totals = LedgerService.get_totals(est.id, date(2026, 10, 1))
+        self.assertEqual(totals, {ExpenseType.EAU: 10000, ExpenseType.ELEC: 8000})
+
+        # Edit: amount change then move to next month
+        inv = invoices[2]
+        inv.amount = 70.0
+        LedgerService.record_invoice_change(inv, 80.0, ExpenseType.ELEC, inv.date)
+        old_date = inv.date
+        inv.date = date(2026, 11, 2)
+        LedgerService.record_invoice_change(inv, 70.0, ExpenseType.ELEC, old_date)
+        db.session.commit()
+        self.assertEqual(LedgerService.get_totals(est.id, date(2026, 10, 1))[ExpenseType.ELEC], 0)
+        self.assertEqual(LedgerService.get_totals(est.id, date(2026, 11, 1)), {ExpenseType.ELEC: 7000})
+
+        # Calculator reads the ledger instead of the invoice list
+        october = LedgerService.get_totals(est.id, date(2026, 10, 1))
+        from_ledger = CostCalculator.from_ledger(est, rooms, october).calculate()
+        from_invoices = CostCalculator(est, rooms, invoices[:2]).calculate()
+        self.assertAlmostEqual(from_ledger['per_person_share'], from_invoices['per_person_share'])
+
+        # Rebuild gives the same aggregates
+        LedgerService.rebuild(est.id)
+        self.assertEqual(LedgerService.get_totals(est.id, date(2026, 10, 1)), {ExpenseType.EAU: 10000})
+        self.assertEqual(LedgerService.get_totals(est.id, date(2026, 11, 1)), {ExpenseType.ELEC: 7000})
+
     def test_offline_payment(self):
         est = Establishment(
             address="Test3",
@@ -158,7 +342,7 @@ class TestServices(unittest.TestCase):
         saas_inv = SaaSInvoice.query.filter_by(establishment_id=est.id).first()
 
         # Mock Proof
-        proof_io = io.BytesIO(b"dummy pdf content")
+        proof_io = io.BytesIO(b"%PDF-1.4 dummy pdf content")
         file = FileStorage(stream=proof_io, filename="proof.pdf", content_type="application/pdf")
 
         updated_inv = BillingService.handle_offline_payment(saas_inv.id, file)
@@ -167,8 +351,7 @@ class TestServices(unittest.TestCase):
         self.assertEqual(updated_inv.payment_method, PaymentMethod.OFFLINE)
         self.assertTrue(updated_inv.proof_file_path.endswith('.pdf'))
 
-        if os.path.exists(updated_inv.proof_file_path):
-            os.remove(updated_inv.proof_file_path)
+        storage.delete(updated_inv.proof_file_path)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
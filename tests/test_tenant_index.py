@@ -0,0 +1,96 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: test_tenant_index.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import sys
+import os
+import unittest
+from datetime import date, timedelta
+
+# Add root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config.init_app import create_app
+from config.extensions import db
+from models.establishment import Establishment, Room, Lease
+from models.users import User, UserRole
+from services.tenant_index import ActiveTenantIndex, tenant_index
+
+class TestActiveTenantIndex(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.app.config['TESTING'] = True
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        self.today = date.today()
+        self.est_ids, self.users, self.rooms = [], [], []
+        for e in range(2):
+            est = Establishment(address=f"{e} Index St")
+            db.session.add(est)
+            db.session.flush()
+            room = Room(establishment_id=est.id, name="R1", base_price=300.0)
+            user = User(email=f"u{e}@index.test", role=UserRole.COLOCATAIRE, password_hash="x")
+            db.session.add_all([room, user])
+            db.session.flush()
+            self.est_ids.append(est.id)
+            self.rooms.append(room.id)
+            self.users.append(user.id)
+        # Tenant of the first house leaves in 10 days
+        db.session.add(Lease(user_id=self.users[0], room_id=self.rooms[0], start_date=self.today - timedelta(days=30),
+                             end_date=self.today + timedelta(days=10)))
+        db.session.add(Lease(user_id=self.users[1], room_id=self.rooms[1], start_date=self.today - timedelta(days=5)))
+        db.session.commit()
+
+        self.index = ActiveTenantIndex()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_cached_lookup_and_rollover(self):
+        self.assertEqual(self.index.get(self.est_ids[0]), {self.users[0]})
+        self.assertEqual(self.index.get(self.est_ids[0], self.today + timedelta(days=10)), {self.users[0]})
+        self.assertEqual(self.index.stats()['hits'], 1)
+
+        # The day after the end date crosses a lease boundary: recomputed
+        self.assertEqual(self.index.get(self.est_ids[0], self.today + timedelta(days=11)), frozenset())
+        self.assertEqual(self.index.stats()['misses'], 2)
+
+    def test_get_many(self):
+        result = self.index.get_many(self.est_ids + [9999])
+        self.assertEqual(result, {self.est_ids[0]: {self.users[0]}, self.est_ids[1]: {self.users[1]}, 9999: frozenset()})
+        self.assertEqual(self.index.stats()['misses'], 3)
+        self.index.get_many(self.est_ids)
+        self.assertEqual(self.index.stats()['hits'], 2)
+
+    def test_invalidated_by_lease_changes(self):
+        self.assertEqual(tenant_index.get(self.est_ids[1]), {self.users[1]})
+
+        newcomer = User(email="new@index.test", role=UserRole.COLOCATAIRE, password_hash="x")
+        db.session.add(newcomer)
+        db.session.flush()
+        lease = Lease(user_id=newcomer.id, room_id=self.rooms[1], start_date=self.today)
+        db.session.add(lease)
+        db.session.commit()
+        self.assertEqual(tenant_index.get(self.est_ids[1]), {self.users[1], newcomer.id})
+
+        lease.end_date = self.today - timedelta(days=1)
+        db.session.commit()
+        self.assertEqual(tenant_index.get(self.est_ids[1]), {self.users[1]})
+
+        # A rolled back change does not leave a stale entry behind
+        db.session.delete(Lease.query.filter_by(user_id=self.users[1]).first())
+        db.session.flush()
+        self.assertEqual(tenant_index.get(self.est_ids[1]), frozenset())
+        db.session.rollback()
+        self.assertEqual(tenant_index.get(self.est_ids[1]), {self.users[1]})
+
+if __name__ == '__main__':
+    unittest.main()
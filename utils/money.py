@@ -0,0 +1,121 @@
+"""
+* Nom de l'application : RentPilot
+* Description : Source file: money.py
+* Produit de : MOA Digital Agency, www.myoneart.com
+* Fait par : Aisance KALONJI, www.aisancekalonji.com
+* Auditer par : La CyberConfiance, www.cyberconfiance.com
+"""
+import functools
+from typing import List, Sequence
+
+def to_cents(amount) -> int:
+    """
+    Converts a float amount (e.g. Invoice.amount) to integer cents, rounded to the nearest cent.
+    The same rule (round(amount * 100), half-even) is used by the NumPy batch path (np.rint),
+    so both paths always agree.
+    """
+    if amount is None:
+        return 0
+    return int(round(float(amount) * 100))
+
+def from_cents(cents: int) -> float:
+    """Converts integer cents back to a float amount (for display / legacy columns)."""
+    return cents / 100
+
+def allocate_cents(total: int, weights: Sequence[int]) -> List[int]:
+    """
+    Splits `total` cents proportionally to integer `weights` using the largest-remainder rule.
+
+    Every share gets floor(total * w / W); the cents left over are handed out one by one to the
+    shares with the largest remainders. Ties are broken by position (first come first served),
+    so the result is deterministic and always sums exactly to `total`.
+    """
+    weights = [int(w) for w in weights]
+    weight_sum = sum(weights)
+    if weight_sum <= 0 or any(w < 0 for w in weights):
+        raise ValueError("Weights must be non-negative and not all zero")
+
+    if total < 0:
+        return [-share for share in allocate_cents(-total, weights)]
+
+    shares = []
+    remainders = []
+    for i, w in enumerate(weights):
+        quota, remainder = divmod(total * w, weight_sum)
+        shares.append(quota)
+        remainders.append((-remainder, i))
+
+    leftover = total - sum(shares)
+    for _, i in sorted(remainders)[:leftover]:
+        shares[i] += 1
+
+    return shares
+
+@functools.total_ordering
+class Money:
+    """
+    Immutable amount stored as integer cents.
+    Arithmetic between Money values is exact; use `allocate` to split without losing cents.
+    """
+    __slots__ = ('cents',)
+
+    def __init__(self, cents: int = 0):
+        object.__setattr__(self, 'cents', int(cents))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Money is immutable")
+
+    @classmethod
+    def from_float(cls, amount) -> 'Money':
+        return cls(to_cents(amount))
+
+    def to_float(self) -> float:
+        return from_cents(self.cents)
+
+    def allocate(self, weights: Sequence[int]) -> List['Money']:
+        """Largest-remainder split, see allocate_cents."""
+        return [Money(c) for c in allocate_cents(self.cents, weights)]
+
+    def split(self, parts: int) -> List['Money']:
+        """Equal split in `parts` shares; the first shares receive the remainder cents."""
+        return self.allocate([1] * parts)
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents + other.cents)
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.cents - other.cents)
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.cents == other.cents
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.cents < other.cents
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.cents)
+
+    def __int__(self):
+        return self.cents
+
+    def __float__(self):
+        return self.to_float()
+
+    def __repr__(self):
+        return f"Money({self.cents})"
+
+    def __str__(self):
+        sign = '-' if self.cents < 0 else ''
+        units, cents = divmod(abs(self.cents), 100)
+        return f"{sign}{units}.{cents:02d}"